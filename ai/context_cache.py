@@ -0,0 +1,58 @@
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from utils.cache import LRUCache
+
+DEFAULT_PROMPT_CACHE_SIZE = 1024
+
+class PromptContextCache:
+    """
+    Caches each user's rendered /start_chat/ prefix prompt until their data changes.
+
+    What is cached is whatever `build` returns, such as the prompt together with the
+    dates of the journal entries it shows.
+
+    Prompts are keyed on user ID. While a prompt is being built, invalidating the user
+    bumps a version number, and the finished prompt is only stored if the version is
+    unchanged, so a prompt built from the old data when the write landed is dropped.
+    Versions are only kept while a build for the user is in flight.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_PROMPT_CACHE_SIZE, ttl: Optional[float] = None):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._building: Dict[str, int] = {}  # user_id -> builds in flight
+        self._versions: Dict[str, int] = {}  # user_id -> invalidations since the first of them began
+        self._lock = threading.Lock()
+
+    def get_or_build(self, user_id: str, build: Callable[[], Any]) -> Any:
+        """Returns the cached prompt for the user, calling `build` to render it on a miss."""
+        prompt = self._cache.get(user_id)
+        if prompt is not None:
+            return prompt
+        with self._lock:
+            self._building[user_id] = self._building.get(user_id, 0) + 1
+            version = self._versions.get(user_id, 0)
+        prompt = None
+        try:
+            prompt = build()
+        finally:
+            with self._lock:
+                current = self._versions.get(user_id, 0)
+                self._building[user_id] -= 1
+                if not self._building[user_id]:
+                    del self._building[user_id]
+                    self._versions.pop(user_id, None)
+                if prompt is not None and current == version:
+                    self._cache.set(user_id, prompt)
+        return prompt
+
+    def invalidate(self, user_id: str):
+        """Drops the user's cached prompt; intended as a DatabaseManager change listener."""
+        with self._lock:
+            if user_id in self._building:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._cache.pop(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the cache size and its hit, miss and eviction counters."""
+        return self._cache.stats()
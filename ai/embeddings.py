@@ -0,0 +1,98 @@
+import asyncio
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+DEFAULT_EMBEDDING_DIMENSIONS = 1024
+DEFAULT_EMBEDDING_MODEL = "text-embedding-004"
+DEFAULT_EMBEDDING_BATCH = 100  # texts per embed_content request, the API's limit
+
+# An embedding function maps texts to a (len(texts), dimensions) array, one row per text.
+Embedder = Callable[[Sequence[str]], np.ndarray]
+
+_WORD = re.compile(r"[a-z0-9']+")
+_SUFFIXES = ("ing", "ed", "ly", "es", "s")
+_STOP_WORDS = frozenset(
+    "a about after again all am an and any are as at be because been before being but by can could "
+    "did do does doing don't for from had has have having he her here him his how i i'm i've if in "
+    "into is it it's its just me more most my myself no not now of off on once only or other our out "
+    "over own same she should so some such than that the their them then there these they this those "
+    "through to too under until up very was we were what when where which while who why will with "
+    "would you your".split()
+)
+
+
+def _stem(word: str) -> str:
+    """Strips a common inflection, so 'sleeping' and 'sleeps' share features with 'sleep'."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+class HashingEmbedder:
+    """
+    A local, deterministic bag-of-words embedder.
+
+    Each word other than stop words, after light stemming, and each pair of adjacent
+    such words is hashed into one of `dimensions` buckets with a hashed sign, weighted
+    by 1 + log of its count. Texts sharing words get similar vectors; there is no model,
+    no network call and nothing to download, and CRC32 rather than Python's salted
+    hash() makes the vectors the same in every process. It is meant for tests and
+    benchmarks, and as a fallback when no embedding model is configured.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def features(self, text: str) -> List[str]:
+        """Returns the words and word pairs a text is embedded from."""
+        words = [_stem(word) for word in _WORD.findall(text.lower()) if word not in _STOP_WORDS]
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in Counter(self.features(text)).items():
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                matrix[row, hashed % self.dimensions] += sign * (1 + math.log(count))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1)
+
+
+class GeminiEmbedder:
+    """
+    Embeds texts with a Gemini embedding model, `batch_size` texts per request.
+
+    Requests are made by an AsyncGemini client on the event loop `loop`, so they get
+    its timeouts, retries and circuit breaker. The embedder itself is synchronous and
+    must be called from a worker thread, which waits for each request to finish.
+    """
+
+    def __init__(self, gemini, loop: asyncio.AbstractEventLoop, model: str = DEFAULT_EMBEDDING_MODEL,
+                 batch_size: int = DEFAULT_EMBEDDING_BATCH):
+        self.gemini = gemini
+        self.loop = loop
+        self.model = model
+        self.batch_size = batch_size
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            raise RuntimeError("GeminiEmbedder must be called from a worker thread, not from its event loop")
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = list(texts[start:start + self.batch_size])
+            request = asyncio.run_coroutine_threadsafe(self.gemini.embed_content(batch, self.model), self.loop)
+            rows.extend(request.result())
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(rows, dtype=np.float32).reshape(len(texts), -1)
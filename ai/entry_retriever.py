@@ -0,0 +1,149 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Collection, Dict, List, Optional, Set
+
+from ai.embeddings import Embedder, HashingEmbedder
+from ai.prompt_builder import DEFAULT_RETRIEVED_ENTRIES
+from utils.cache import LRUCache
+from utils.vector_index import VectorIndex
+
+DEFAULT_MAX_INDEXED_USERS = 256
+DEFAULT_INDEX_TTL = 3600.0
+EMBED_BATCH = 500  # entries embedded at once while an index is built
+TEXT_FIELD = "dailyJournal"
+
+
+class EntryRetriever:
+    """
+    Finds the journal entries most related to a piece of text, through a vector index of
+    each user's `dailyJournal` texts keyed by entry date.
+
+    A user's index is built on their first search from one paged read of the entry texts
+    alone, and is then kept up to date as entries are written: register `entries_written`
+    with DatabaseManager.add_entry_listener. Written entries are embedded on a background
+    thread, so the embedder's model calls stay out of the write path; a search waits for
+    its user's queued updates, and an update that fails drops the user's index, to be
+    rebuilt on their next search. Later searches read nothing from Firestore and embed
+    only the query. The indexes of at most `max_users` users are kept, least recently
+    used out first. `ttl` bounds how long one is trusted, since entries written
+    through other worker processes do not reach it.
+    """
+
+    def __init__(self, db_manager, embed: Optional[Embedder] = None, max_users: int = DEFAULT_MAX_INDEXED_USERS,
+                 ttl: Optional[float] = DEFAULT_INDEX_TTL, approximate: bool = False):
+        """
+        Initializes the EntryRetriever.
+
+        `embed` defaults to the local HashingEmbedder. With `approximate`, each index
+        narrows a search to candidates by their hyperplane signatures first (see
+        VectorIndex), which is faster on long histories but can miss a related entry.
+        """
+        self.db_manager = db_manager
+        self.embed = embed if embed is not None else HashingEmbedder()
+        self.approximate = approximate
+        self._indexes = LRUCache(maxsize=max_users, ttl=ttl)
+        self._lock = threading.Lock()
+        self._building: Dict[str, List[Dict]] = {}  # user_id -> entries written while their index is built
+        self._pending: Dict[str, Set[Future]] = {}  # user_id -> queued updates of their index
+        self._updater = ThreadPoolExecutor(max_workers=1, thread_name_prefix="entry-index")
+        self.builds = 0
+        self.searches = 0
+        self.updates = 0
+
+    def search(self, user_id: str, text: str, k: int = DEFAULT_RETRIEVED_ENTRIES,
+               exclude: Collection[str] = ()) -> List[str]:
+        """
+        Finds the user's entries whose journal text is most related to `text`.
+
+        Args:
+            user_id: The user whose entries are searched.
+            text: The text to match, such as a chat message.
+            k: The most entries returned.
+            exclude: Entry dates to leave out, such as those already shown.
+
+        Returns:
+            The dates of the matching entries, most related first; entries sharing
+            nothing with the text are never returned.
+        """
+        if k <= 0 or not text.strip():
+            return []
+        with self._lock:
+            pending = list(self._pending.get(user_id, ()))
+        wait(pending)
+        index = self._index_for(user_id)
+        self.searches += 1
+        return [date for date, _ in index.search(self.embed([text])[0], k, exclude=set(exclude))]
+
+    def entries_written(self, user_id: str, journal_entries: List[Dict]):
+        """Queues written entries to be added to the user's index, if it is loaded; a DatabaseManager entry listener."""
+        with self._lock:
+            if user_id in self._building:
+                self._building[user_id].extend(journal_entries)
+            index = self._indexes.get(user_id)
+            if index is None:
+                return
+            future = self._updater.submit(self._update, user_id, index, journal_entries)
+            self._pending.setdefault(user_id, set()).add(future)
+        future.add_done_callback(lambda done: self._updated(user_id, done))
+
+    def _update(self, user_id: str, index: VectorIndex, journal_entries: List[Dict]):
+        try:
+            self._add(index, journal_entries)
+            self.updates += 1
+        except Exception as e:
+            print(f"Warning: dropping the entry index of user {user_id}, update failed: {e}")
+            self.forget(user_id)
+
+    def _updated(self, user_id: str, future: Future):
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is not None:
+                pending.discard(future)
+                if not pending:
+                    del self._pending[user_id]
+
+    def forget(self, user_id: str):
+        """Drops the user's index; it is rebuilt on their next search."""
+        self._indexes.pop(user_id)
+
+    def _index_for(self, user_id: str) -> VectorIndex:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+        index = VectorIndex(approximate=self.approximate)
+        with self._lock:
+            self._building.setdefault(user_id, [])
+        try:
+            batch = []
+            for entry in self.db_manager.iter_user_journal_entries(user_id, fields=[TEXT_FIELD]):
+                batch.append(entry)
+                if len(batch) == EMBED_BATCH:
+                    self._add(index, batch)
+                    batch = []
+            self._add(index, batch)
+        finally:
+            with self._lock:
+                written = self._building.pop(user_id, [])
+        # entries written during the read may or may not be in it; adding them again is harmless
+        self._add(index, written)
+        self._indexes.set(user_id, index)
+        self.builds += 1
+        return index
+
+    def _add(self, index: VectorIndex, journal_entries: List[Dict]):
+        texts = {entry["date"]: entry.get(TEXT_FIELD) for entry in journal_entries if entry.get("date")}
+        dates = [date for date, text in texts.items() if text]
+        for date, text in texts.items():
+            if not text:
+                index.remove(date)
+        if dates:
+            index.add(dates, self.embed([texts[date] for date in dates]))
+
+    def close(self):
+        """Waits for the queued index updates and stops the background thread."""
+        self._updater.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the indexes built, searches and incremental updates made, and the users indexed."""
+        return {"builds": self.builds, "searches": self.searches, "updates": self.updates,
+                "indexed_users": self._indexes.stats()["size"]}
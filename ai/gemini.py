@@ -1,50 +1,406 @@
 from google import genai
+import asyncio
 import os
 import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
 from google.genai import types
+from ai.history_compactor import HistoryCompactor
+from ai.resilience import CircuitBreaker, ModelUnavailableError, ResilientCaller
+from ai.response_cache import ResponseCache
+from ai.session_store import InMemorySessionStore, SessionStore
+from utils.keyed_lock import KeyedLock
+from utils.metrics import record_token_usage, span
+from utils.single_flight import SingleFlight
+
+DEFAULT_MAX_IN_FLIGHT = 16
+
+def load_api_key() -> Optional[str]:
+    """Returns the key from the untracked key.py, or None to fall back on GEMINI_API_KEY."""
+    try:
+        from key import getKey
+    except ImportError:
+        return None
+    return getKey()
+
+def dump_history(history: List[types.Content]) -> List[Dict]:
+    """Converts SDK chat history into JSON-serialisable dictionaries for a SessionStore."""
+    return [content.model_dump(mode="json", exclude_none=True) for content in history]
+
+def load_history(history: List[Dict]) -> List[types.Content]:
+    """Rebuilds SDK chat history from the dictionaries produced by dump_history."""
+    return [types.Content.model_validate(content) for content in history]
 
 class Gemini:
     """A class to interact with the Gemini language model."""
 
-    def __init__(self, api_key: str = None, model_name: str = 'gemini-1.5-flash'):
+    def __init__(self, api_key: str = None, model_name: str = 'gemini-1.5-flash', client: genai.Client = None,
+                 session_store: SessionStore = None, compactor: HistoryCompactor = None):
         """
         Initializes the Gemini class.
+
+        A pre-built `client` (for example a fake backend in load tests) can be passed
+        instead of an API key. Chat sessions live in `session_store`, which defaults to a
+        bounded in-memory store. With a `compactor`, long session histories are rolled
+        into a summary after the reply that takes them over its threshold.
         """
-        if api_key is None:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key:
-                raise ValueError("API key not provided and GEMINI_API_KEY environment variable not set.")
+        if client is None:
+            if api_key is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("API key not provided and GEMINI_API_KEY environment variable not set.")
+            client = genai.Client(api_key=api_key,  http_options=types.HttpOptions(api_version='v1alpha'))
 
-        self.model = genai.Client(api_key=api_key,  http_options=types.HttpOptions(api_version='v1alpha'))
+        self.model = client
         self.model_name = model_name
-        self.chat_sessions = {}  # Store chat sessions here
+        self.sessions = session_store if session_store is not None else InMemorySessionStore()
+        self.compactor = compactor
 
-    def start_chat(self) -> str:
+    def start_chat(self, user_id: Optional[str] = None) -> str:
         """Starts a new chat session and returns the session ID."""
         session_id = str(uuid.uuid4())
-        self.chat_sessions[session_id] = self.model.chats.create(model=self.model_name)
+        self.sessions.put(session_id, {"user_id": user_id, "history": []})
         return session_id
 
     def send_message(self, session_id: str, message: str) -> str:
         """Sends a message to an existing chat session."""
-        if session_id not in self.chat_sessions:
-            raise ValueError("Session not found")
-
-        chat = self.chat_sessions[session_id]
-        response = chat.send_message(message)
+        record = self._get_session(session_id)
+        chat = self.model.chats.create(model=self.model_name, history=load_history(record["history"]))
+        with span("model", "send_message"):
+            response = chat.send_message(message)
+        record_token_usage(response)
+        self._save_session(session_id, record, chat)
+        if self._should_compact(record):
+            self._compact_session(session_id, record)
         return response.text
-    
+
     def generate_content(self, message: str) -> str:
-        """Generates a single response from Gemini without a chat session (async)."""
+        """Generates a single response from Gemini without a chat session."""
         try:
-            response =  self.model.models.generate_content(model=self.model_name, contents=message)
+            with span("model", "generate_content"):
+                response =  self.model.models.generate_content(model=self.model_name, contents=message)
+            record_token_usage(response)
             return response.text
         except Exception as e:
             raise ValueError(f"Error generating content: {e}")
 
     def end_chat(self, session_id: str):
         """Ends a chat session."""
-        if session_id in self.chat_sessions:
-            del self.chat_sessions[session_id]
-        else:
+        if not self.sessions.delete(session_id):
+            raise ValueError("Session not found")
+
+    def get_session_history(self, session_id: str) -> List[Dict]:
+        """Returns the stored history of a chat session, raising ValueError if it is unknown."""
+        return self._get_session(session_id)["history"]
+
+    def get_session_user_id(self, session_id: str) -> Optional[str]:
+        """Returns the user a chat session was started for, raising ValueError if it is unknown."""
+        return self._get_session(session_id)["user_id"]
+
+    def get_shown_entries(self, session_id: str) -> List[str]:
+        """Returns the dates of the journal entries added to a session's messages so far."""
+        return self._get_session(session_id).get("shown_entries", [])
+
+    def _get_session(self, session_id: str) -> Dict:
+        """Returns the stored session record, raising ValueError if it is unknown or expired."""
+        record = self.sessions.get(session_id)
+        if record is None:
             raise ValueError("Session not found")
+        return record
+
+    def _save_session(self, session_id: str, record: Dict, chat, shown_entries: Sequence[str] = ()):
+        """
+        Writes the chat's history back to the session store so any worker can resume it,
+        recording the dates of the journal entries the message just sent carried.
+        """
+        record["history"] = dump_history(chat.get_history(curated=True))
+        if shown_entries:
+            record["shown_entries"] = record.get("shown_entries", []) + list(shown_entries)
+        self.sessions.put(session_id, record)
+
+    def _compact_session(self, session_id: str, record: Dict):
+        """
+        Rolls the older turns of a session into a summary.
+
+        A failure only logs a warning: the full history has already been saved, and
+        compaction is attempted again after the next reply.
+        """
+        try:
+            opening, older, recent = self.compactor.split(record["history"])
+            with span("model", "compact_history"):
+                summary = self.model.models.generate_content(
+                    model=self.model_name, contents=self.compactor.summary_prompt(older)
+                )
+            record_token_usage(summary)
+            self._store_compacted(session_id, record, opening, summary.text, recent)
+        except Exception as e:
+            print(f"Warning: failed to compact history of session {session_id}: {e}")
+
+    def _should_compact(self, record: Dict) -> bool:
+        return self.compactor is not None and self.compactor.needs_compaction(record["history"])
+
+    def _store_compacted(self, session_id: str, record: Dict, opening: List[Dict], summary: Optional[str],
+                         recent: List[Dict]):
+        """Replaces the summarised part of a session's history; the next message recreates the chat from it."""
+        if not summary:
+            raise ValueError("Model returned an empty summary")
+        record["history"] = self.compactor.compacted(opening, summary, recent)
+        self.sessions.put(session_id, record)
+
+
+class AsyncGemini(Gemini):
+    """
+    Non-blocking variant of Gemini built on the SDK's async client (`client.aio`).
+
+    At most `max_in_flight` model calls run at once per process; further callers wait
+    on the semaphore without blocking the event loop. A hedged call holds one slot
+    while it may have two requests upstream, so hedging can briefly exceed that.
+    Every model call goes through `resilience`, which bounds how long it may take,
+    retries transient errors and stops calling a failing model; when it gives up,
+    ModelUnavailableError is raised.
+
+    Session store reads and writes run in a thread, since a shared store does file
+    I/O. Each session's history is loaded, extended and saved under a per-session lock,
+    so concurrent messages to one chat take turns instead of overwriting each other's
+    replies; the lock is per process, so a session should be served by one worker at a
+    time. History compaction runs in the background after the reply that calls for it.
+    """
+
+    def __init__(self, api_key: str = None, model_name: str = 'gemini-1.5-flash',
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, client: genai.Client = None,
+                 session_store: SessionStore = None, response_cache: ResponseCache = None,
+                 compactor: HistoryCompactor = None, resilience: ResilientCaller = None,
+                 coalescer: SingleFlight = None):
+        """
+        Initializes the AsyncGemini class.
+
+        When a `response_cache` is given, generate_content answers repeated prompts from
+        it. `resilience` defaults to the module's default timeouts and retries with a
+        circuit breaker and no hedging. `coalescer` lets identical concurrent
+        generate_content calls share one model call, and can be shared with other callers.
+        """
+        super().__init__(api_key, model_name, client, session_store, compactor)
+        self.response_cache = response_cache
+        self.max_in_flight = max_in_flight
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.resilience = resilience if resilience is not None else ResilientCaller(breaker=CircuitBreaker())
+        self.coalescer = coalescer if coalescer is not None else SingleFlight()
+        self._session_locks = KeyedLock()
+        self._compactions: Dict[str, asyncio.Task] = {}
+
+    async def start_chat(self, user_id: Optional[str] = None) -> str:
+        """Starts a new chat session and returns the session ID."""
+        return await asyncio.to_thread(super().start_chat, user_id)
+
+    async def end_chat(self, session_id: str):
+        """Ends a chat session."""
+        async with self._session_locks.hold(session_id):
+            await asyncio.to_thread(super().end_chat, session_id)
+
+    async def get_session_history(self, session_id: str) -> List[Dict]:
+        """Returns the stored history of a chat session, raising ValueError if it is unknown."""
+        return (await self._load_session(session_id))["history"]
+
+    async def get_session_user_id(self, session_id: str) -> Optional[str]:
+        """Returns the user a chat session was started for, raising ValueError if it is unknown."""
+        return (await self._load_session(session_id))["user_id"]
+
+    async def get_shown_entries(self, session_id: str) -> List[str]:
+        """Returns the dates of the journal entries added to a session's messages so far."""
+        return (await self._load_session(session_id)).get("shown_entries", [])
+
+    async def _load_session(self, session_id: str) -> Dict:
+        return await asyncio.to_thread(self._get_session, session_id)
+
+    async def send_message(self, session_id: str, message: str, shown_entries: Sequence[str] = ()) -> str:
+        """
+        Sends a message to an existing chat session.
+
+        `shown_entries` are the dates of the journal entries the message carries; they
+        are recorded with the reply, so a message that fails leaves them unshown.
+        """
+        async with self._session_locks.hold(session_id):
+            record = await self._load_session(session_id)
+
+            async def attempt():
+                chat = self.model.aio.chats.create(model=self.model_name, history=load_history(record["history"]))
+                return chat, await chat.send_message(message)
+
+            # the slot is held across retries, so a retry never adds upstream load beyond
+            # max_in_flight callers; chat messages are not hedged, since a hedge would be a
+            # second upstream request on the same slot
+            async with self._semaphore:
+                with span("model", "send_message"):
+                    chat, response = await self.resilience.call("send_message", attempt)
+            record_token_usage(response)
+            await asyncio.to_thread(self._save_session, session_id, record, chat, shown_entries)
+        if self._should_compact(record):
+            self._schedule_compaction(session_id)
+        return response.text
+
+    def send_message_stream(self, session_id: str, message: str,
+                            shown_entries: Sequence[str] = ()) -> AsyncIterator[str]:
+        """
+        Sends a message to an existing chat session and yields the reply text as it arrives.
+
+        The session is looked up before anything is streamed, so an unknown session raises
+        ValueError from the first iteration rather than mid-stream. Opening the stream is
+        retried until the first chunk arrives; after that, each chunk must follow the
+        previous one within the per-attempt timeout. The session stays locked until the
+        full reply has been written to its history, once the stream has been consumed or
+        closed. `shown_entries` are recorded with the reply, as in send_message.
+        """
+        return self._stream_reply(session_id, message, shown_entries)
+
+    async def _stream_reply(self, session_id: str, message: str, shown_entries: Sequence[str]) -> AsyncIterator[str]:
+        async with self._session_locks.hold(session_id):
+            record = await self._load_session(session_id)
+
+            async def attempt():
+                chat = self.model.aio.chats.create(model=self.model_name, history=load_history(record["history"]))
+                stream = await chat.send_message_stream(message)
+                try:
+                    first = await stream.__anext__()
+                except StopAsyncIteration:
+                    first = None
+                return chat, stream, first
+
+            async with self._semaphore:
+                with span("model", "send_message_stream"):
+                    chat, stream, chunk = await self.resilience.call("send_message_stream", attempt)
+                    last_chunk = chunk
+                    while chunk is not None:
+                        if chunk.text:
+                            yield chunk.text
+                        last_chunk = chunk
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), self.resilience.timeout)
+                        except StopAsyncIteration:
+                            chunk = None
+            # streamed usage counts are running totals, so only the final chunk's are recorded
+            record_token_usage(last_chunk)
+            await asyncio.to_thread(self._save_session, session_id, record, chat, shown_entries)
+        if self._should_compact(record):
+            self._schedule_compaction(session_id)
+
+    def _schedule_compaction(self, session_id: str):
+        """Starts compacting the session's history in the background, unless that is already under way."""
+        if session_id in self._compactions:
+            return
+        task = asyncio.ensure_future(self._compact_in_background(session_id))
+        self._compactions[session_id] = task
+        task.add_done_callback(lambda done: self._compactions.pop(session_id, None))
+
+    async def join_compactions(self):
+        """Waits for the background compactions under way, for example before shutting down."""
+        if self._compactions:
+            await asyncio.gather(*self._compactions.values(), return_exceptions=True)
+
+    async def _compact_in_background(self, session_id: str):
+        """
+        Rolls the older turns of a session into a summary.
+
+        The session is locked from reading its history until the compacted one is
+        saved, so a message sent meanwhile waits and then continues from the compacted
+        history. A failure only logs a warning: the full history is kept, and compaction
+        is attempted again after the next reply.
+        """
+        try:
+            async with self._session_locks.hold(session_id):
+                record = await asyncio.to_thread(self.sessions.get, session_id)
+                # the session may have ended, or been compacted by an earlier task
+                if record is None or not self._should_compact(record):
+                    return
+                opening, older, recent = self.compactor.split(record["history"])
+                prompt = self.compactor.summary_prompt(older)
+
+                async def attempt():
+                    return await self.model.aio.models.generate_content(model=self.model_name, contents=prompt)
+
+                # not retried: the reply has been saved already, and the next one tries again
+                async with self._semaphore:
+                    with span("model", "compact_history"):
+                        summary = await self.resilience.call("compact_history", attempt, retry=False)
+                record_token_usage(summary)
+                await asyncio.to_thread(self._store_compacted, session_id, record, opening, summary.text, recent)
+        except Exception as e:
+            print(f"Warning: failed to compact history of session {session_id}: {e}")
+
+    async def generate_content(self, message: str, user_id: Optional[str] = None,
+                               throttle: Optional[Callable[[], Awaitable[None]]] = None) -> str:
+        """
+        Generates a single response from Gemini without a chat session.
+
+        Responses are cached by prompt when a response cache is configured; `user_id` tags
+        the cached response so it is dropped when that user's data changes. Concurrent
+        calls with the same prompt and user share one model call. `throttle`, such as a
+        rate limit, is awaited only by a call that is neither cached nor shared, just
+        before it goes to the model; what it raises is propagated. The call is hedged when
+        the resilience layer has hedging enabled. Errors the layer does not retry are
+        raised as ValueError.
+        """
+        if self.response_cache is not None:
+            cached = await asyncio.to_thread(self.response_cache.get, self.model_name, message)
+            if cached is not None:
+                return cached
+        key = ("generate_content", self.model_name, message, user_id)
+        if throttle is not None and not self.coalescer.running(key):
+            await throttle()
+        return await self.coalescer.do(key, lambda: self._generate_content(message, user_id))
+
+    async def _generate_content(self, message: str, user_id: Optional[str]) -> str:
+        async def attempt():
+            return await self.model.aio.models.generate_content(model=self.model_name, contents=message)
+
+        try:
+            async with self._semaphore:
+                with span("model", "generate_content"):
+                    response = await self.resilience.call("generate_content", attempt, hedge=True)
+        except ModelUnavailableError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Error generating content: {e}")
+        record_token_usage(response)
+        if self.response_cache is not None and response.text is not None:
+            await asyncio.to_thread(self.response_cache.put, self.model_name, message, response.text, user_id)
+        return response.text
+
+    async def embed_content(self, texts: List[str], model: str) -> List[List[float]]:
+        """
+        Embeds texts with a Gemini embedding model, one vector per text.
+
+        The call takes a slot from the semaphore and goes through the resilience layer
+        like the chat calls; errors the layer does not retry are raised as ValueError.
+        """
+        async def attempt():
+            return await self.model.aio.models.embed_content(model=model, contents=texts)
+
+        try:
+            async with self._semaphore:
+                with span("model", "embed_content"):
+                    response = await self.resilience.call("embed_content", attempt)
+        except ModelUnavailableError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Error embedding text: {e}")
+        return [embedding.values for embedding in response.embeddings]
+
+    async def generate_json(self, history: List[Dict], message: str, response_schema) -> str:
+        """
+        Asks Gemini for a JSON reply matching `response_schema`, continuing from a stored chat history.
+
+        Used by background jobs, which bound their own concurrency and retry failed jobs,
+        so the call does not take a slot from the request-serving semaphore and is not
+        retried here.
+        """
+        contents = load_history(history) + [types.Content(role="user", parts=[types.Part(text=message)])]
+        config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=response_schema)
+
+        async def attempt():
+            return await self.model.aio.models.generate_content(
+                model=self.model_name, contents=contents, config=config
+            )
+
+        with span("model", "generate_json"):
+            response = await self.resilience.call("generate_json", attempt, retry=False)
+        record_token_usage(response)
+        return response.text
@@ -0,0 +1,114 @@
+from typing import Dict, List, Tuple
+
+from ai.prompt import get_history_summary_prompt
+from ai.prompt_builder import estimate_tokens
+
+DEFAULT_KEEP_RECENT_TURNS = 6
+
+SUMMARY_PREFIX = "Briefing on our session so far (replaces the earlier conversation):\n\n"
+SUMMARY_ACK = "Thank you, I have the context and will continue the session from here."
+
+
+def content_tokens(content: Dict) -> int:
+    """Estimates the tokens in one history item as stored by ai.gemini.dump_history."""
+    return sum(estimate_tokens(part.get("text") or "") for part in content.get("parts", []))
+
+
+def history_tokens(history: List[Dict]) -> int:
+    """
+    Estimates the tokens a stored chat history adds to every message sent in its session.
+
+    Args:
+        history: The history dictionaries as stored in the session store.
+
+    Returns:
+        The approximate token count.
+    """
+    return sum(content_tokens(content) for content in history)
+
+
+def split_turns(history: List[Dict]) -> List[List[Dict]]:
+    """
+    Groups a chat history into turns, each a user message followed by the model's reply.
+
+    Args:
+        history: The history dictionaries as stored in the session store.
+
+    Returns:
+        The turns in order; the items of every turn after the first start with a user message.
+    """
+    turns: List[List[Dict]] = []
+    for content in history:
+        if content.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def _is_summary(turn: List[Dict]) -> bool:
+    """Returns True for the turn a previous compaction put in place of the turns it summarised."""
+    text = "".join(part.get("text") or "" for part in turn[0].get("parts", []))
+    return text.startswith(SUMMARY_PREFIX)
+
+
+def render_transcript(history: List[Dict]) -> str:
+    """Renders history items as a 'User: ... / Coach: ...' transcript for the summary prompt."""
+    lines = []
+    for content in history:
+        speaker = "User" if content.get("role") == "user" else "Coach"
+        text = "".join(part.get("text") or "" for part in content.get("parts", []))
+        lines.append(f"{speaker}: {text.strip()}")
+    return "\n\n".join(lines)
+
+
+class HistoryCompactor:
+    """
+    Keeps chat histories under a token threshold by rolling older turns into a summary.
+
+    The opening turn, which carries the coach's instructions and the user's journal
+    entries, is always kept verbatim and is not counted against `threshold_tokens`, since
+    summarising cannot shrink it. Once the rest of a session's history is estimated
+    above the threshold, everything between the opening turn and the last
+    `keep_recent_turns` turns (including any earlier summary) is summarised by the
+    model. The history then becomes the opening turn, the summary and the recent turns.
+    Later compactions fold the previous summary into the new one, so it acts as a
+    running summary of the conversation.
+    """
+
+    def __init__(self, threshold_tokens: int, keep_recent_turns: int = DEFAULT_KEEP_RECENT_TURNS):
+        self.threshold_tokens = threshold_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.compactions = 0
+
+    def needs_compaction(self, history: List[Dict]) -> bool:
+        """Returns True if the history after its opening turn is over the threshold and has turns to summarise."""
+        turns = split_turns(history)[1:]
+        new_turns = [turn for turn in turns if not _is_summary(turn)]
+        return (sum(history_tokens(turn) for turn in turns) > self.threshold_tokens
+                and len(new_turns) > self.keep_recent_turns)
+
+    def split(self, history: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """Splits a history into the opening turn, the items to summarise and the recent turns kept verbatim."""
+        turns = split_turns(history)
+        if not turns:
+            return [], [], []
+        cut = max(len(turns) - self.keep_recent_turns, 1)
+        older = [content for turn in turns[1:cut] for content in turn]
+        recent = [content for turn in turns[cut:] for content in turn]
+        return turns[0], older, recent
+
+    def summary_prompt(self, older: List[Dict]) -> str:
+        """Returns the prompt asking the model to summarise the older part of a history."""
+        return get_history_summary_prompt(render_transcript(older))
+
+    def compacted(self, opening: List[Dict], summary: str, recent: List[Dict]) -> List[Dict]:
+        """Returns the history that replaces the summarised turns with the summary."""
+        self.compactions += 1
+        return opening + [
+            {"role": "user", "parts": [{"text": SUMMARY_PREFIX + summary.strip()}]},
+            {"role": "model", "parts": [{"text": SUMMARY_ACK}]},
+        ] + recent
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the threshold and the number of compactions performed by this process."""
+        return {"threshold_tokens": self.threshold_tokens, "compactions": self.compactions}
@@ -0,0 +1,170 @@
+"""
+Nightly correlation reports for every user.
+
+Streams the user IDs, and for up to `--concurrency` users at a time reads their
+entries for the last `--days` days, finds the correlations locally, asks Gemini to
+phrase them and stores the report in users/{user_id}/insights/correlations, where
+/get_insights/ serves it with a single document read. Progress is checkpointed per
+run ID in a SQLite file, so rerunning an interrupted run only processes the users it
+has not finished (including those that failed):
+
+    python -m ai.insights_job --service-account serviceAccountKey.json [--days 30] [--run-id 2024-06-01]
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Set
+
+from ai.prompt import get_correlation_findings_prompt, get_correlation_prompt_cot
+from utils.correlation_engine import FIELDS, find_correlations
+from utils.sqlite import SQLiteDatabase
+
+if TYPE_CHECKING:
+    from ai.gemini import AsyncGemini
+    from db.database_manager import DatabaseManager
+
+DEFAULT_INSIGHT_DAYS = 30
+DEFAULT_JOB_CONCURRENCY = 8
+DEFAULT_CHECKPOINT_PATH = "insights_checkpoint.db"
+
+class InsightsCheckpoint:
+    """Records which users each run has finished, in a SQLite file."""
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH):
+        self._db = SQLiteDatabase(path, [
+            "CREATE TABLE IF NOT EXISTS insights_progress ("
+            "run_id TEXT NOT NULL, user_id TEXT NOT NULL, status TEXT NOT NULL, error TEXT, "
+            "finished_at REAL NOT NULL, PRIMARY KEY (run_id, user_id))",
+        ], name="Insights checkpoint")
+
+    def finished_users(self, run_id: str) -> Set[str]:
+        """Returns the users the run has already written a report for."""
+        rows = self._db.fetchall(
+            "SELECT user_id FROM insights_progress WHERE run_id = ? AND status = 'done'", (run_id,)
+        )
+        return {row[0] for row in rows}
+
+    def record(self, run_id: str, user_id: str, status: str, error: Optional[str] = None):
+        """Records the outcome for one user ('done' or 'failed')."""
+        self._db.execute(
+            "INSERT OR REPLACE INTO insights_progress (run_id, user_id, status, error, finished_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (run_id, user_id, status, error, time.time()),
+        )
+
+    def summary(self, run_id: str) -> Dict[str, int]:
+        """Returns the number of users per status for the run."""
+        rows = self._db.fetchall(
+            "SELECT status, COUNT(*) FROM insights_progress WHERE run_id = ? GROUP BY status", (run_id,)
+        )
+        summary = {"done": 0, "failed": 0}
+        summary.update(dict(rows))
+        return summary
+
+
+async def build_report(db_manager: "DatabaseManager", gemini_client: "AsyncGemini", user_id: str,
+                       start_date: str, end_date: str) -> Dict:
+    """
+    Runs the correlation pipeline for one user.
+
+    Args:
+        db_manager: Reads the user's entries.
+        gemini_client: Phrases the findings; not called when the user has no entries in range.
+        user_id: The user to report on.
+        start_date: The first 'yyyy-mm-dd' date covered.
+        end_date: The last 'yyyy-mm-dd' date covered.
+
+    Returns:
+        The report document.
+    """
+    # only the fields the correlations use; whole entries are read just for the fallback prompt
+    entry_store = await asyncio.to_thread(db_manager.get_user_entry_store, user_id, start_date, end_date, FIELDS)
+    findings = find_correlations(entry_store)
+    summary = None
+    if len(entry_store):
+        if findings:
+            prompt = get_correlation_findings_prompt(findings)
+        else:
+            full_store = await asyncio.to_thread(db_manager.get_user_entry_store, user_id, start_date, end_date)
+            prompt = get_correlation_prompt_cot(full_store.to_dicts())
+        summary = await gemini_client.generate_content(prompt, user_id=user_id)
+    return {
+        "startDate": start_date,
+        "endDate": end_date,
+        "entryCount": len(entry_store),
+        "findings": findings,
+        "summary": summary,
+        "generatedAt": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def run_insights_job(db_manager: "DatabaseManager", gemini_client: "AsyncGemini",
+                           checkpoint: InsightsCheckpoint, run_id: str, user_ids: Iterable[str],
+                           start_date: str, end_date: str,
+                           concurrency: int = DEFAULT_JOB_CONCURRENCY) -> Dict[str, int]:
+    """
+    Builds and stores a report for every user the run has not finished yet.
+
+    `concurrency` workers pull user IDs from `user_ids` as they go, so at most that many
+    users are in flight and the IDs are not all needed up front; `user_ids` may read
+    them lazily, such as DatabaseManager.iter_user_ids, and is advanced in a thread by
+    one worker at a time. A failure is recorded in the checkpoint and the run carries
+    on with the next user.
+
+    Returns:
+        The number of users per status for the run, including earlier attempts.
+    """
+    finished = await asyncio.to_thread(checkpoint.finished_users, run_id)
+    pending = (user_id for user_id in user_ids if user_id not in finished)
+    pending_lock = asyncio.Lock()
+
+    async def next_user() -> Optional[str]:
+        async with pending_lock:
+            return await asyncio.to_thread(next, pending, None)
+
+    async def work():
+        while (user_id := await next_user()) is not None:
+            try:
+                report = await build_report(db_manager, gemini_client, user_id, start_date, end_date)
+                await asyncio.to_thread(db_manager.store_insights_report, user_id, report)
+            except Exception as e:
+                print(f"Warning: insights for user {user_id} failed: {e}")
+                await asyncio.to_thread(checkpoint.record, run_id, user_id, "failed", str(e))
+            else:
+                await asyncio.to_thread(checkpoint.record, run_id, user_id, "done")
+
+    await asyncio.gather(*(work() for _ in range(concurrency)))
+    return checkpoint.summary(run_id)
+
+
+def main():
+    from ai.gemini import AsyncGemini, load_api_key
+    from db.database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Generate correlation reports for every user.")
+    parser.add_argument("--service-account", default="serviceAccountKey.json", help="Firebase service account key")
+    parser.add_argument("--user", action="append", dest="users", help="User ID to report on (default: every user)")
+    parser.add_argument("--days", type=int, default=DEFAULT_INSIGHT_DAYS, help="Days of entries per report")
+    parser.add_argument("--end-date", default=date.today().isoformat(), help="Last day covered (yyyy-mm-dd)")
+    parser.add_argument("--run-id", help="Checkpoint key; rerun with the same ID to resume (default: the end date)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="SQLite checkpoint file")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_JOB_CONCURRENCY, help="Users processed at once")
+    args = parser.parse_args()
+
+    end_date = date.fromisoformat(args.end_date)
+    start_date = (end_date - timedelta(days=args.days - 1)).isoformat()
+    run_id = args.run_id or end_date.isoformat()
+
+    db_manager = DatabaseManager(args.service_account)
+    gemini_client = AsyncGemini(load_api_key(), max_in_flight=args.concurrency)
+    user_ids = args.users or db_manager.iter_user_ids()
+    summary = asyncio.run(run_insights_job(
+        db_manager, gemini_client, InsightsCheckpoint(args.checkpoint), run_id, user_ids,
+        start_date, end_date.isoformat(), concurrency=args.concurrency,
+    ))
+    print(f"run {run_id}: {summary['done']} users done, {summary['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
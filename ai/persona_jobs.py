@@ -0,0 +1,154 @@
+import asyncio
+import json
+import random
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from ai.prompt import get_closing_chat_prompt
+from models.user_profile import UserPersonaData
+from utils.sqlite import SQLiteDatabase
+
+if TYPE_CHECKING:  # the clients pull in the Gemini and Firestore SDKs, which the queue does not need
+    from ai.gemini import AsyncGemini
+    from db.database_manager import DatabaseManager
+
+DEFAULT_PERSONA_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE_DELAY = 5.0  # seconds; doubled on every further attempt
+DEFAULT_LEASE_SECONDS = 300.0  # a claimed job is handed out again if its worker goes quiet this long
+DEFAULT_POLL_INTERVAL = 1.0
+
+class PersonaJobQueue:
+    """
+    Durable queue of persona updates backed by a SQLite file.
+
+    A job holds the user ID and the finished chat's history, so it survives restarts and
+    does not depend on the chat session still existing. Claimed jobs carry a lease; a job
+    whose worker died is picked up again once the lease expires.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._db = SQLiteDatabase(path, [
+            "CREATE TABLE IF NOT EXISTS persona_jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, history TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+            "run_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS persona_jobs_status_run_at ON persona_jobs (status, run_at)",
+        ], name="Persona job queue")
+
+    def enqueue(self, user_id: str, history: List[Dict]) -> int:
+        """Adds a persona update for the user and returns the job ID."""
+        now = time.time()
+        cursor = self._db.execute(
+            "INSERT INTO persona_jobs (user_id, history, run_at, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, json.dumps(history), now, now),
+        )
+        return cursor.lastrowid
+
+    def claim(self) -> Optional[Dict]:
+        """Leases the next due job to the caller, or returns None if nothing is due."""
+        now = time.time()
+        with self._db.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, user_id, history, attempts FROM persona_jobs "
+                "WHERE status IN ('pending', 'running') AND run_at <= ? ORDER BY run_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE persona_jobs SET status = 'running', attempts = attempts + 1, run_at = ? WHERE id = ?",
+                    (now + self.lease_seconds, row[0]),
+                )
+        if row is None:
+            return None
+        return {"id": row[0], "user_id": row[1], "history": json.loads(row[2]), "attempts": row[3] + 1}
+
+    def complete(self, job_id: int):
+        """Removes a job that finished successfully."""
+        self._db.execute("DELETE FROM persona_jobs WHERE id = ?", (job_id,))
+
+    def retry(self, job_id: int, error: str, delay: float):
+        """Puts a failed job back in the queue to run again after `delay` seconds."""
+        self._db.execute(
+            "UPDATE persona_jobs SET status = 'pending', run_at = ?, last_error = ? WHERE id = ?",
+            (time.time() + delay, error, job_id),
+        )
+
+    def fail(self, job_id: int, error: str):
+        """Marks a job as permanently failed; it stays in the table for inspection."""
+        self._db.execute("UPDATE persona_jobs SET status = 'failed', last_error = ? WHERE id = ?", (error, job_id))
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of jobs in each status."""
+        rows = self._db.fetchall("SELECT status, COUNT(*) FROM persona_jobs GROUP BY status")
+        stats = {"pending": 0, "running": 0, "failed": 0}
+        stats.update(dict(rows))
+        return stats
+
+
+class PersonaUpdater:
+    """
+    Pool of asyncio workers that refresh user personas from finished chats.
+
+    Each job asks Gemini for JSON matching UserPersonaData, continuing from the chat
+    history with the closing prompt, validates it and stores the new persona. Failures
+    are retried with jittered exponential backoff. The number of workers bounds how many
+    persona updates run at once, independently of request serving.
+    """
+
+    def __init__(self, queue: PersonaJobQueue, db_manager: "DatabaseManager", gemini_client: "AsyncGemini",
+                 workers: int = DEFAULT_PERSONA_WORKERS, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 retry_base_delay: float = DEFAULT_RETRY_BASE_DELAY, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.queue = queue
+        self.db_manager = db_manager
+        self.gemini_client = gemini_client
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """Starts the workers on the running event loop."""
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._work()))
+
+    async def stop(self):
+        """Cancels the workers; jobs they were holding are retried once their lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        while True:
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self.process(job["user_id"], job["history"])
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if job["attempts"] >= self.max_attempts:
+                    print(f"Persona update for user {job['user_id']} failed permanently: {error}")
+                    await asyncio.to_thread(self.queue.fail, job["id"], error)
+                    self.failed += 1
+                else:
+                    delay = self.retry_base_delay * 2 ** (job["attempts"] - 1) * random.uniform(0.5, 1.5)
+                    await asyncio.to_thread(self.queue.retry, job["id"], error, delay)
+            else:
+                await asyncio.to_thread(self.queue.complete, job["id"])
+                self.completed += 1
+
+    async def process(self, user_id: str, history: List[Dict]):
+        """Generates, validates and stores an updated persona for the user."""
+        current_persona = await asyncio.to_thread(self.db_manager.get_user_persona, user_id)
+        closing_prompt = get_closing_chat_prompt(current_persona)
+        response = await self.gemini_client.generate_json(history, closing_prompt, UserPersonaData)
+        persona_data = UserPersonaData.model_validate_json(response)
+        await asyncio.to_thread(self.db_manager.store_user_persona, persona_data.userProfile.model_dump(), user_id)
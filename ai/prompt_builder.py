@@ -0,0 +1,160 @@
+from datetime import date
+from typing import Dict, List, Optional
+
+CHARS_PER_TOKEN = 4  # rough average for English text with Gemini's tokenizer
+DEFAULT_ENTRY_TOKEN_BUDGET = 8000
+DEFAULT_WEEKLY_SUMMARIES = False  # summarize weeks left out of the budget from their weekly rollups
+SUMMARY_BUDGET_SHARE = 0.25  # of an overflowing entries block, kept free for weekly summaries
+DEFAULT_RECENT_ENTRIES = 7  # latest entries shown at chat start in retrieval mode
+DEFAULT_RETRIEVED_ENTRIES = 5  # related entries added at chat start and to each message in retrieval mode
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of model tokens in a string without calling the tokenizer.
+
+    Args:
+        text: The text to measure.
+
+    Returns:
+        The approximate token count.
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def week_key(date_str: str) -> str:
+    """
+    Returns the ISO week a 'yyyy-mm-dd' date falls in, formatted like '2024-W05'.
+
+    Args:
+        date_str: The date in 'yyyy-mm-dd' format.
+
+    Returns:
+        The ISO year and week number of the date.
+    """
+    year, week, _ = date.fromisoformat(date_str).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def summarize_rollup(rollup: Dict) -> str:
+    """
+    Renders a rollup document (see db/rollups.py) as a one-line summary.
+
+    Args:
+        rollup: The rollup document, with the sum, count, min and max of each field.
+
+    Returns:
+        The entry count and each field's average and range, such as
+        '7 entries; sleep hours avg 6.4 (5-8); mood stressLevel avg 3.1 (1-6)'.
+    """
+    parts = [f"{rollup.get('entryCount', 0)} entries"]
+    for name, stats in sorted(rollup.get("fields", {}).items()):
+        if stats.get("count"):
+            average = stats["sum"] / stats["count"]
+            parts.append(f"{name.replace('_', ' ')} avg {average:.1f} ({stats['min']:g}-{stats['max']:g})")
+    return "; ".join(parts)
+
+
+def rollup_summaries(rollups: List[Dict]) -> Dict[str, str]:
+    """
+    Summarizes weekly rollup documents for build_journal_entries_block.
+
+    Args:
+        rollups: Weekly rollup documents, whose periods are ISO weeks like '2024-W05'.
+
+    Returns:
+        The summaries keyed by period, leaving out weeks with no entries.
+    """
+    return {rollup["period"]: summarize_rollup(rollup) for rollup in rollups if rollup.get("entryCount")}
+
+
+def append_dict_lines(parts: List[str], data: dict, indent: int = 0):
+    """
+    Appends the 'key: value' lines for a (possibly nested) dictionary to a list of parts.
+
+    Nested dictionaries are written under their key with two extra spaces of indentation.
+    Collecting parts and joining once avoids re-copying the string on every line.
+
+    Args:
+        parts: The list the lines are appended to.
+        data: The dictionary to render.
+        indent: The current indentation level.
+    """
+    indent_str = "  " * indent
+    for key, value in data.items():
+        if isinstance(value, dict):
+            parts.append(f"{indent_str}{key}:\n")
+            append_dict_lines(parts, value, indent + 1)
+        else:
+            parts.append(f"{indent_str}{key}: {value}\n")
+
+
+def build_journal_entries_block(
+    journal_entries: Optional[List[Dict]],
+    max_tokens: Optional[int] = DEFAULT_ENTRY_TOKEN_BUDGET,
+    max_chars: Optional[int] = None,
+    weekly_summaries: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Renders journal entries newest first until a size budget is used up.
+
+    Entries that no longer fit are replaced by their week's summary when one is given in
+    `weekly_summaries`, newest weeks first; anything still left out is counted in a
+    closing note. When the entries overflow and summaries are given, the entries stop at
+    all but SUMMARY_BUDGET_SHARE of the budget, so the summaries have room.
+
+    Args:
+        journal_entries: The user's journal entry dictionaries, in any order.
+        max_tokens: The token budget for the block, or None for no token limit.
+        max_chars: The character budget for the block, or None for no character limit.
+        weekly_summaries: Optional precomputed summaries keyed by ISO week (see week_key).
+
+    Returns:
+        The rendered block of journal entries.
+    """
+    if not journal_entries:
+        return ""
+    budgets = [limit for limit in (max_chars, max_tokens * CHARS_PER_TOKEN if max_tokens else None) if limit]
+    budget = min(budgets) if budgets else None
+
+    entries = sorted(journal_entries, key=lambda entry: entry.get("date") or "", reverse=True)
+    parts: List[str] = []
+    used = 0
+    included = 0
+    for entry in entries:
+        entry_parts: List[str] = []
+        append_dict_lines(entry_parts, entry)
+        entry_parts.append("\n")
+        rendered = "".join(entry_parts)
+        if budget is not None and used + len(rendered) > budget:
+            break
+        parts.append(rendered)
+        used += len(rendered)
+        included += 1
+    if weekly_summaries and included < len(entries):
+        # make room for the summaries by dropping the oldest entries shown
+        entry_budget = budget - int(budget * SUMMARY_BUDGET_SHARE)
+        while parts and used > entry_budget:
+            used -= len(parts.pop())
+            included -= 1
+
+    omitted = 0
+    summarized_weeks: Dict[str, bool] = {}
+    for entry in entries[included:]:
+        week = week_key(entry["date"]) if weekly_summaries and entry.get("date") else None
+        if week is None or week not in weekly_summaries:
+            omitted += 1
+            continue
+        if week not in summarized_weeks:
+            rendered = f"Summary of week {week}: {weekly_summaries[week]}\n\n"
+            fits = budget is None or used + len(rendered) <= budget
+            if fits:
+                parts.append(rendered)
+                used += len(rendered)
+            summarized_weeks[week] = fits
+        if not summarized_weeks[week]:
+            omitted += 1
+
+    if omitted:
+        parts.append(f"({omitted} older entries omitted)\n")
+    return "".join(parts)
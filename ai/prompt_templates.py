@@ -0,0 +1,163 @@
+import json
+import os
+import string
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+DEFAULT_RELOAD_INTERVAL = 2.0  # seconds between checks for edited template files
+
+# Each template file and the placeholders its callers fill in.
+TEMPLATE_FIELDS = {
+    "initial_chat": ("journal_entries", "persona_data"),
+    "closing_chat": ("user_profile",),
+    "correlation_cot": ("articles",),
+    "correlation_findings": ("findings",),
+    "history_summary": ("transcript",),
+    "relevant_entries": ("journal_entries", "message"),
+}
+
+# Few-shot example files, bound once into the placeholder of the same name.
+EXAMPLE_FILES = {"examples": "COT_example_entries.json"}
+
+
+def render_examples(examples: List[Dict]) -> str:
+    """Renders few-shot example entries one per line, as they appear in the prompt."""
+    return "\n".join(str(example) for example in examples)
+
+
+class PromptTemplate:
+    """
+    A prompt split once into its static text and the named slots between it.
+
+    Placeholders use str.format syntax (`{name}`, with `{{` and `}}` for literal braces)
+    but only plain names are allowed, so rendering is a single join.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        literals: List[str] = []
+        slots: List[str] = []
+        pending = ""
+        for literal, field, format_spec, conversion in string.Formatter().parse(text):
+            pending += literal
+            if field is None:
+                continue
+            if not field.isidentifier() or format_spec or conversion:
+                raise ValueError(f"Template {name}: unsupported placeholder {{{field}}}")
+            literals.append(pending)
+            slots.append(field)
+            pending = ""
+        literals.append(pending)
+        self._literals = tuple(literals)
+        self._slots = tuple(slots)
+
+    @property
+    def fields(self) -> set:
+        return set(self._slots)
+
+    def bind(self, **values: str) -> "PromptTemplate":
+        """Returns a template with the given slots filled in and merged into the static text."""
+        bound = PromptTemplate.__new__(PromptTemplate)
+        bound.name = self.name
+        literals = [self._literals[0]]
+        slots = []
+        for slot, literal in zip(self._slots, self._literals[1:]):
+            if slot in values:
+                literals[-1] += values[slot] + literal
+            else:
+                slots.append(slot)
+                literals.append(literal)
+        bound._literals = tuple(literals)
+        bound._slots = tuple(slots)
+        return bound
+
+    def render(self, **values: str) -> str:
+        """Fills in every slot; raises KeyError if a value is missing."""
+        parts = [self._literals[0]]
+        for slot, literal in zip(self._slots, self._literals[1:]):
+            parts.append(values[slot])
+            parts.append(literal)
+        return "".join(parts)
+
+
+class TemplateRegistry:
+    """
+    Loads the prompt templates and few-shot example files from the package once.
+
+    Every template must use exactly the placeholders in TEMPLATE_FIELDS, plus any example
+    placeholders, which are bound at load time. Loading fails loudly, so a broken file
+    is caught at startup. The files are checked for edits at most every
+    `reload_interval` seconds (None disables this), and a reload that fails validation
+    keeps the templates already loaded.
+    """
+
+    def __init__(self, directory: str = TEMPLATE_DIR, reload_interval: Optional[float] = DEFAULT_RELOAD_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._templates, self._mtimes = self._load()
+        self._checked_at = time.monotonic()
+        self.reloads = 0
+
+    def _paths(self) -> List[str]:
+        names = [f"{name}.txt" for name in TEMPLATE_FIELDS] + list(EXAMPLE_FILES.values())
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _load(self) -> Tuple[Dict[str, PromptTemplate], Dict[str, int]]:
+        mtimes = {path: os.stat(path).st_mtime_ns for path in self._paths()}
+        examples = {}
+        for field, filename in EXAMPLE_FILES.items():
+            try:
+                with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                raise ValueError(f"Failed to load prompt examples {filename}: {e}")
+            if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+                raise ValueError(f"Prompt examples {filename} must be a JSON list of objects")
+            examples[field] = render_examples(entries)
+
+        templates = {}
+        for name, fields in TEMPLATE_FIELDS.items():
+            with open(os.path.join(self.directory, f"{name}.txt"), "r", encoding="utf-8") as f:
+                template = PromptTemplate(name, f.read())
+            unexpected = template.fields - set(fields) - set(examples)
+            missing = set(fields) - template.fields
+            if unexpected or missing:
+                raise ValueError(
+                    f"Template {name}: unexpected placeholders {sorted(unexpected)}, missing {sorted(missing)}"
+                )
+            templates[name] = template.bind(**{field: examples[field] for field in template.fields & set(examples)})
+        return templates, mtimes
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if self.reload_interval is None or now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                mtimes = {path: os.stat(path).st_mtime_ns for path in self._paths()}
+                if mtimes == self._mtimes:
+                    return
+                # remembered before loading so a broken edit is reported once, not on every check
+                self._mtimes = mtimes
+                self._templates, self._mtimes = self._load()
+                self.reloads += 1
+            except (OSError, ValueError) as e:
+                print(f"Warning: keeping the loaded prompt templates, reload failed: {e}")
+
+    def get(self, name: str) -> PromptTemplate:
+        """Returns a loaded template, picking up edits to the files first."""
+        self._reload_if_changed()
+        return self._templates[name]
+
+    def render(self, name: str, **values: str) -> str:
+        """Renders a template by name."""
+        return self.get(name).render(**values)
+
+
+TEMPLATES = TemplateRegistry()
@@ -0,0 +1,285 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+DEFAULT_CALL_TIMEOUT = 30.0  # seconds allowed for one attempt
+DEFAULT_CALL_DEADLINE = 60.0  # seconds allowed for a call, retries and backoff included
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_BASE_DELAY = 0.5
+DEFAULT_RETRY_MAX_DELAY = 8.0
+DEFAULT_BREAKER_FAILURE_RATIO = 0.5  # share of recent attempts failing that opens the breaker
+DEFAULT_BREAKER_WINDOW = 20  # recent attempts the ratio is taken over
+DEFAULT_BREAKER_MIN_CALLS = 10
+DEFAULT_BREAKER_RESET = 30.0  # seconds the breaker stays open before letting a probe through
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_LATENCY_WINDOW = 200
+
+# status codes of API errors worth another attempt: rate limits, overload and server faults
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+T = TypeVar("T")
+
+
+class ModelUnavailableError(Exception):
+    """The model could not answer in time: the breaker is open, or the attempts or the deadline ran out."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Returns True for timeouts, connection failures and API errors with a retryable status code."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, "code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    # connection and read failures below the SDK; httpx is already loaded by then
+    import httpx
+
+    return isinstance(error, httpx.TransportError)
+
+
+def _describe(error: BaseException) -> str:
+    if isinstance(error, TimeoutError):
+        return "timed out"
+    return str(error) or type(error).__name__
+
+
+class CircuitBreaker:
+    """
+    Stops calling the model once `failure_ratio` of the last `window` attempts failed.
+
+    A ratio rather than a run of consecutive failures, since under concurrency a few
+    fast errors can land together while the successes are still in flight. The ratio
+    is only judged after `min_calls` attempts. While open, calls fail at once. After
+    `reset_timeout` seconds one call is let through as a probe (half-open): if it
+    succeeds the breaker closes, if it fails the breaker opens again. A probe that
+    never reports back, for example because it was cancelled, is replaced by another
+    one `reset_timeout` seconds later.
+    """
+
+    def __init__(self, failure_ratio: float = DEFAULT_BREAKER_FAILURE_RATIO,
+                 reset_timeout: float = DEFAULT_BREAKER_RESET, window: int = DEFAULT_BREAKER_WINDOW,
+                 min_calls: int = DEFAULT_BREAKER_MIN_CALLS, clock: Callable[[], float] = time.monotonic):
+        self.failure_ratio = failure_ratio
+        self.reset_timeout = reset_timeout
+        self.min_calls = min_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True for a failed attempt
+        self.state = "closed"
+        self._opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Raises ModelUnavailableError if the breaker is open and it is not time for a probe."""
+        with self._lock:
+            if self.state == "closed":
+                return
+            waited = self._clock() - self._opened_at
+            if waited < self.reset_timeout:
+                self.rejected += 1
+                raise ModelUnavailableError(
+                    "Model temporarily unavailable (circuit open)", retry_after=self.reset_timeout - waited
+                )
+            # let this call through as the probe and hold back the others for another period
+            self.state = "half-open"
+            self._opened_at = self._clock()
+
+    def record_success(self):
+        with self._lock:
+            if self.state == "closed":
+                self._outcomes.append(False)
+            elif self.state == "half-open":
+                self.state = "closed"
+                self._outcomes.clear()
+            # calls started before the breaker opened say nothing about the model now
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == "closed":
+                self._outcomes.append(True)
+                failures = sum(self._outcomes)
+                if len(self._outcomes) < self.min_calls or failures < self.failure_ratio * len(self._outcomes):
+                    return
+            elif self.state == "open":
+                return
+            self.state = "open"
+            self._opened_at = self._clock()
+            self.opens += 1
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe, or 0 while the breaker is closed."""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+
+class LatencyWindow:
+    """The latencies of the most recent attempts of one operation."""
+
+    def __init__(self, size: int = DEFAULT_LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        """Returns the q-quantile of the window, or None with fewer than `min_samples` samples."""
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientCaller:
+    """
+    Runs model calls with a per-attempt timeout, an overall deadline, jittered
+    exponential retry of retryable errors and a circuit breaker.
+
+    An attempt is a coroutine function that makes one fresh call, so a retried chat
+    message is rebuilt from the stored history rather than from a half-updated chat.
+    Errors that are not retryable (a bad request, a missing session) are raised as
+    they are. Once the attempts, the deadline or the breaker stop a call, it raises
+    ModelUnavailableError, which the API turns into a 503.
+
+    With a `hedge_quantile`, a hedged call starts a second identical attempt when the
+    first has run longer than that quantile of recent latencies, and returns whichever
+    answers first. Only idempotent calls should be hedged.
+    """
+
+    def __init__(self, timeout: Optional[float] = DEFAULT_CALL_TIMEOUT,
+                 deadline: Optional[float] = DEFAULT_CALL_DEADLINE, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 retry_base_delay: float = DEFAULT_RETRY_BASE_DELAY, retry_max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+                 breaker: Optional[CircuitBreaker] = None, hedge_quantile: Optional[float] = None,
+                 hedge_min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.breaker = breaker
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self._windows: Dict[str, LatencyWindow] = {}
+        self.counts = {"calls": 0, "retries": 0, "timeouts": 0, "failures": 0, "hedges": 0, "hedge_wins": 0}
+
+    def window(self, operation: str) -> LatencyWindow:
+        window = self._windows.get(operation)
+        if window is None:
+            window = self._windows[operation] = LatencyWindow()
+        return window
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before retrying after the given attempt number."""
+        return min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+    async def call(self, operation: str, attempt: Callable[[], Awaitable[T]], retry: bool = True,
+                   hedge: bool = False) -> T:
+        """
+        Runs `attempt` until it succeeds, fails with an error that is not retryable, or
+        runs out of attempts or time.
+
+        Args:
+            operation: Name of the call, used for its latency window.
+            attempt: Coroutine function making one call.
+            retry: False for callers that retry on their own; the call still gets the
+                timeout and the breaker.
+            hedge: Hedge the attempts, if hedging is configured.
+
+        Returns:
+            The result of the first successful attempt.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline if self.deadline is not None else None
+        attempts = self.max_attempts if retry else 1
+        self.counts["calls"] += 1
+        for number in range(1, attempts + 1):
+            if self.breaker is not None:
+                self.breaker.before_call()
+            timeout = self.timeout
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            try:
+                if timeout is not None and timeout <= 0:
+                    raise TimeoutError()
+                result = await asyncio.wait_for(self._attempt(operation, attempt, hedge), timeout)
+            except Exception as e:
+                if isinstance(e, TimeoutError):
+                    self.counts["timeouts"] += 1
+                if not is_retryable(e):
+                    # the model answered, so this says nothing about its health
+                    if self.breaker is not None:
+                        self.breaker.record_success()
+                    raise
+                if self.breaker is not None:
+                    self.breaker.record_failure()
+                delay = self.backoff(number)
+                if number == attempts or (deadline is not None and loop.time() + delay >= deadline):
+                    self.counts["failures"] += 1
+                    raise ModelUnavailableError(
+                        f"Model call {operation} failed after {number} attempt(s): {_describe(e)}",
+                        retry_after=self.breaker.retry_after() if self.breaker is not None else None,
+                    ) from e
+                self.counts["retries"] += 1
+                await asyncio.sleep(delay)
+            else:
+                if self.breaker is not None:
+                    self.breaker.record_success()
+                return result
+
+    async def _attempt(self, operation: str, attempt: Callable[[], Awaitable[T]], hedge: bool) -> T:
+        window = self.window(operation)
+        delay = None
+        if hedge and self.hedge_quantile:
+            delay = window.quantile(self.hedge_quantile, self.hedge_min_samples)
+        began = time.perf_counter()
+        if delay is None:
+            result = await attempt()
+            window.observe(time.perf_counter() - began)
+            return result
+
+        primary = asyncio.ensure_future(attempt())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.counts["hedges"] += 1
+                tasks.append(asyncio.ensure_future(attempt()))
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                if winner is not None:
+                    if winner is not primary:
+                        self.counts["hedge_wins"] += 1
+                    return winner.result()
+            raise error
+        finally:
+            # an abandoned primary is observed at the time it was given up, which keeps
+            # slow calls in the window instead of only the hedges that beat them
+            window.observe(time.perf_counter() - began)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict:
+        """Returns the call counters and the breaker state."""
+        stats = dict(self.counts)
+        if self.breaker is not None:
+            stats.update(breaker_state=self.breaker.state, breaker_opens=self.breaker.opens,
+                         breaker_rejected=self.breaker.rejected)
+        return stats
@@ -0,0 +1,130 @@
+import hashlib
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from utils.cache import LRUCache
+from utils.sqlite import SQLiteDatabase
+
+DEFAULT_RESPONSE_CACHE_SIZE = 1024
+DEFAULT_RESPONSE_TTL = 24 * 60 * 60  # seconds
+DEFAULT_PURGE_INTERVAL = 10 * 60  # seconds between deletions of expired SQLite rows
+
+class ResponseCache:
+    """
+    Content-addressed cache of Gemini responses, keyed on the model name and a hash of the prompt.
+
+    Responses live in an in-memory LRU tier and, when a `path` is given, in a SQLite tier
+    that survives restarts and is shared by worker processes. A response may be tagged
+    with the user it was generated for so that it can be dropped when their data changes.
+    The per-user index only holds the keys in the memory tier, and expired SQLite rows
+    are deleted by a put at most every `purge_interval` seconds.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_RESPONSE_CACHE_SIZE, ttl: float = DEFAULT_RESPONSE_TTL,
+                 path: Optional[str] = None, purge_interval: float = DEFAULT_PURGE_INTERVAL):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._memory = LRUCache(maxsize=maxsize, ttl=ttl, on_remove=self._forget)
+        self._user_keys: Dict[str, Set[str]] = {}
+        self._key_users: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self._next_purge = time.monotonic() + purge_interval
+        self._db = None
+        if path:
+            self._db = SQLiteDatabase(path, [
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, user_id TEXT, response TEXT NOT NULL, created_at REAL NOT NULL)",
+                "CREATE INDEX IF NOT EXISTS responses_user_id ON responses (user_id)",
+                "CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)",
+            ], name="Response cache")
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str) -> str:
+        """Returns the cache key for a prompt sent to a model."""
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model_name: str, prompt: str) -> Optional[str]:
+        """Returns the cached response for the prompt, or None on a miss."""
+        key = self.make_key(model_name, prompt)
+        response = self._memory.get(key)
+        if response is not None or self._db is None:
+            return response
+        with self._lock:
+            row = self._db.fetchone(
+                "SELECT response, user_id FROM responses WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl),
+            )
+            if row is None:
+                return None
+            response, user_id = row
+            self._tag(key, user_id)
+            self.disk_hits += 1
+        self._memory.set(key, response)
+        return response
+
+    def put(self, model_name: str, prompt: str, response: str, user_id: Optional[str] = None):
+        """Caches the response to a prompt, optionally tagged with the user it belongs to."""
+        key = self.make_key(model_name, prompt)
+        with self._lock:
+            # tagged before the memory tier holds the key, so its eviction always finds the tag
+            self._tag(key, user_id)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, user_id, response, created_at) VALUES (?, ?, ?, ?)",
+                    (key, user_id, response, time.time()),
+                )
+        self._memory.set(key, response)
+        if self._db is not None and time.monotonic() >= self._next_purge:
+            self.purge_expired()
+
+    def invalidate_user(self, user_id: str):
+        """Drops every response tagged with the user; intended as a DatabaseManager change listener."""
+        with self._lock:
+            keys = self._user_keys.pop(user_id, set())
+            for key in keys:
+                self._key_users.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses WHERE user_id = ?", (user_id,))
+        for key in keys:
+            self._memory.pop(key)
+
+    def purge_expired(self) -> int:
+        """Drops every expired response from both tiers and returns how many SQLite rows were deleted."""
+        self._memory.purge_expired()
+        if self._db is None:
+            return 0
+        self._next_purge = time.monotonic() + self.purge_interval
+        return self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+
+    def _tag(self, key: str, user_id: Optional[str]):
+        """Records the user a cached key belongs to; the caller holds the lock."""
+        previous = self._key_users.pop(key, None)
+        if previous is not None and previous != user_id:
+            self._untag(key, previous)
+        if user_id is not None:
+            self._key_users[key] = user_id
+            self._user_keys.setdefault(user_id, set()).add(key)
+
+    def _untag(self, key: str, user_id: str):
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+    def _forget(self, key: str):
+        """Drops an evicted or expired key from the per-user index; the memory tier's removal callback."""
+        with self._lock:
+            user_id = self._key_users.pop(key, None)
+            if user_id is not None:
+                self._untag(key, user_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the cache size and counters; `hits` includes the `disk_hits` served by SQLite."""
+        stats = self._memory.stats()
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        stats["disk_hits"] = self.disk_hits
+        return stats
@@ -0,0 +1,133 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+from utils.cache import LRUCache
+from utils.sqlite import SQLiteDatabase
+
+DEFAULT_SESSION_TTL = 2 * 60 * 60  # seconds a chat may sit idle before it is evicted
+DEFAULT_MAX_SESSIONS = 10000
+
+class SessionStore(ABC):
+    """
+    Registry of chat sessions keyed by session ID.
+
+    A session is stored as a JSON-serialisable record (the chat history plus any
+    metadata such as the owning user), so any worker process can rehydrate the chat
+    from it. Sessions idle for longer than the TTL, or pushed out by the size bound,
+    are evicted.
+
+    Implementations may block on I/O, so async callers should run them in a thread.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Returns the session record, or None if it does not exist or has expired."""
+
+    @abstractmethod
+    def put(self, session_id: str, record: Dict):
+        """Creates or replaces the session record and refreshes its TTL."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Removes the session and returns whether it existed."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Returns the live session count and the number of sessions evicted so far."""
+
+
+class InMemorySessionStore(SessionStore):
+    """Per-process session store with LRU and TTL eviction."""
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_SESSION_TTL):
+        self._sessions = LRUCache(maxsize=max_sessions, ttl=ttl)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        return self._sessions.get(session_id)
+
+    def put(self, session_id: str, record: Dict):
+        self._sessions.set(session_id, record)
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id) is not None
+
+    def stats(self) -> Dict[str, int]:
+        self._sessions.purge_expired()
+        cache_stats = self._sessions.stats()
+        return {
+            "live_sessions": cache_stats["size"],
+            "evicted_sessions": cache_stats["evictions"] + cache_stats["expirations"],
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store backed by a SQLite file that several worker processes can share.
+
+    Eviction is by least recently updated session, and the eviction counter lives in
+    the database so every worker reports the same figure.
+    """
+
+    def __init__(self, path: str, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_SESSION_TTL):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._db = SQLiteDatabase(path, [
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            "session_id TEXT PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS chat_sessions_updated_at ON chat_sessions (updated_at)",
+            "CREATE TABLE IF NOT EXISTS chat_session_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+            "INSERT OR IGNORE INTO chat_session_stats VALUES ('evicted_sessions', 0)",
+        ], name="Session store")
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._db.locked() as conn:
+            row = conn.execute(
+                "SELECT record, updated_at FROM chat_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            record, updated_at = row
+            if updated_at < time.time() - self.ttl:
+                self._evict(conn, "DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+                return None
+        return json.loads(record)
+
+    def put(self, session_id: str, record: Dict):
+        payload = json.dumps(record)
+        now = time.time()
+        with self._db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, record, updated_at) VALUES (?, ?, ?)",
+                (session_id, payload, now),
+            )
+            self._evict(conn, "DELETE FROM chat_sessions WHERE updated_at < ?", (now - self.ttl,))
+            self._evict(
+                conn,
+                "DELETE FROM chat_sessions WHERE session_id IN "
+                "(SELECT session_id FROM chat_sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+
+    def delete(self, session_id: str) -> bool:
+        return self._db.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._db.locked() as conn:
+            live = conn.execute(
+                "SELECT COUNT(*) FROM chat_sessions WHERE updated_at >= ?", (time.time() - self.ttl,)
+            ).fetchone()[0]
+            evicted = conn.execute(
+                "SELECT value FROM chat_session_stats WHERE name = 'evicted_sessions'"
+            ).fetchone()[0]
+        return {"live_sessions": live, "evicted_sessions": evicted}
+
+    def _evict(self, conn, statement: str, params: tuple):
+        """Runs a DELETE that evicts sessions and adds the removed rows to the shared counter."""
+        removed = conn.execute(statement, params).rowcount
+        if removed > 0:
+            conn.execute(
+                "UPDATE chat_session_stats SET value = value + ? WHERE name = 'evicted_sessions'", (removed,)
+            )
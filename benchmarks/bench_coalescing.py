@@ -0,0 +1,135 @@
+"""
+Shows what request coalescing and the per-user rate limit do to a burst of requests.
+
+Coalescing: each of `--users` users sends `--duplicates` identical /get_correlations/
+requests at once, as a double-submitted form or several open tabs do. The run is made
+with every request computed on its own and with identical requests sharing one
+computation, and reports the latency and the Firestore round trips and model calls
+the burst cost.
+
+Rate limit: one user sends `--burst` /get_single_response/ requests at once against a
+quota of `--rate` a minute in bursts of `--bucket`, queueing for up to `--max-wait`
+seconds. It reports how many were answered at once, after queueing, or refused with
+a 429.
+
+    python -m benchmarks.bench_coalescing --users 20 --duplicates 5 --burst 30
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import date
+
+import httpx
+
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.fake_gemini import FakeGenaiClient
+from benchmarks.synthetic import make_entries
+from utils.single_flight import SingleFlight
+
+
+class Uncoalesced(SingleFlight):
+    """Computes every request on its own, as without coalescing."""
+
+    async def do(self, key, compute):
+        self.leaders += 1
+        return await compute()
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def build_services(api, args, days: int = 0, users: int = 0, **overrides):
+    from db.database_manager import DatabaseManager
+
+    firestore = FakeFirestore()
+    db_manager = DatabaseManager(db=firestore)
+    for index in range(users):
+        db_manager.add_journal_entries_bulk(f"user-{index}", make_entries(days, end=date(2024, 12, 31)))
+    firestore.latency = args.firestore_latency
+    genai = FakeGenaiClient(latency=args.gemini_latency)
+    # the persona queue is kept out of the working tree, and the rate limit is off unless given
+    settings = api.Settings(**{"persona_queue_db": os.path.join(tempfile.mkdtemp(), "persona_jobs.db"),
+                               "user_rate_per_minute": 0, "user_rate_quotas": {}, **overrides})
+    return api.Services(firestore_client=firestore, genai_client=genai, settings=settings), firestore, genai
+
+
+async def timed_post(client: httpx.AsyncClient, path: str, body: dict):
+    began = time.perf_counter()
+    response = await client.post(path, json=body)
+    return response.status_code, time.perf_counter() - began
+
+
+async def run_duplicates(api, args, coalescer: SingleFlight) -> dict:
+    services, firestore, genai = build_services(api, args, days=args.days, users=args.users)
+    services.coalescer = coalescer
+    app = api.create_app(services)
+    body = {"start_date": "2024-01-01", "end_date": "2024-12-31"}
+    firestore.reset_counters()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        results = await asyncio.gather(*(
+            timed_post(client, "/get_correlations/", dict(body, user_id=f"user-{index}"))
+            for index in range(args.users) for _ in range(args.duplicates)
+        ))
+    assert all(status == 200 for status, _ in results), Counter(status for status, _ in results)
+    latencies = [seconds for _, seconds in results]
+    return {"p50": percentile(latencies, 0.5), "max": max(latencies),
+            "round_trips": firestore.round_trips, "model_calls": genai.backend.calls}
+
+
+async def run_burst(api, args) -> Counter:
+    services, _, _ = build_services(api, args, user_rate_per_minute=args.rate, user_rate_burst=args.bucket,
+                                    user_rate_max_wait=args.max_wait)
+    app = api.create_app(services)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=args.max_wait + 30) as client:
+        results = await asyncio.gather(*(
+            timed_post(client, "/get_single_response/", {"message": f"question {number}", "user_id": "bursty"})
+            for number in range(args.burst)
+        ))
+    outcomes = Counter()
+    for status, seconds in results:
+        if status == 429:
+            outcomes["refused (429)"] += 1
+        elif seconds > args.gemini_latency + 0.5:
+            outcomes["answered after queueing"] += 1
+        else:
+            outcomes["answered at once"] += 1
+    return outcomes
+
+
+async def run_all(args):
+    import main as api
+
+    print(f"{args.users} users x {args.duplicates} identical /get_correlations/ requests")
+    print(f"{'':<12} {'p50 ms':>8} {'max ms':>8} {'round trips':>11} {'model calls':>11}")
+    for name, coalescer in (("separate", Uncoalesced()), ("coalesced", SingleFlight())):
+        result = await run_duplicates(api, args, coalescer)
+        print(f"{name:<12} {result['p50'] * 1000:8.0f} {result['max'] * 1000:8.0f} "
+              f"{result['round_trips']:11d} {result['model_calls']:11d}")
+
+    print(f"\n{args.burst} requests at once from one user, quota {args.rate:g}/min in bursts of {args.bucket}")
+    for outcome, count in sorted((await run_burst(api, args)).items()):
+        print(f"  {outcome:<24} {count:4d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duplicates", type=int, default=5, help="Identical requests each user sends at once")
+    parser.add_argument("--days", type=int, default=365, help="Entries in each user's history")
+    parser.add_argument("--firestore-latency", type=float, default=0.02, help="Seconds per Firestore round trip")
+    parser.add_argument("--gemini-latency", type=float, default=0.3, help="Seconds per model call")
+    parser.add_argument("--burst", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=60, help="Requests a minute the bursting user is allowed")
+    parser.add_argument("--bucket", type=int, default=10, help="Requests the user may make at once")
+    parser.add_argument("--max-wait", type=float, default=5.0, help="Seconds a request may queue for its turn")
+    asyncio.run(run_all(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Times the local correlation engine across history lengths.
+
+    python -m benchmarks.bench_correlations --sizes 14 90 365 3000
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import make_entries
+from utils.correlation_engine import find_correlations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[14, 90, 365, 3000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        entries = make_entries(size)
+        began = time.perf_counter()
+        for _ in range(args.repeat):
+            findings = find_correlations(entries)
+        elapsed = (time.perf_counter() - began) / args.repeat
+        print(f"{size:6d} entries  {elapsed * 1000:8.2f} ms  {len(findings)} findings")
+
+
+if __name__ == "__main__":
+    main()
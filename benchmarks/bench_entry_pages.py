@@ -0,0 +1,76 @@
+"""
+Compares reading a user's whole history as full documents with paged, projected reads.
+
+The full read is get_user_journal_entries, which returns every document with its
+journal text. The paged reads go through iter_user_journal_entries `--page-size`
+entries per query, once with whole documents and once with only the fields the
+correlations use, into an EntryStore. For each it reports the payload size (the JSON
+size of what Firestore returned), the peak memory while reading and the Firestore
+round trips. Each journal is padded to `--journal-chars` characters of its own text,
+as real entries are. Times are left out: the fake scans the whole collection for
+every page, where Firestore seeks its index, so they would measure the fake.
+
+    python -m benchmarks.bench_entry_pages --days 10000 --page-size 500
+"""
+import argparse
+import json
+import tracemalloc
+from datetime import date
+
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.synthetic import make_entries
+from db.database_manager import DatabaseManager
+from utils.correlation_engine import FIELDS, find_correlations
+from utils.entry_store import EntryStore
+
+
+def measure(fake_db: FakeFirestore, read):
+    """Returns what `read()` returns, its peak traced memory and the round trips it made."""
+    fake_db.reset_counters()
+    tracemalloc.start()
+    value = read()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return value, peak, fake_db.round_trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=10000, help="Entries in the user's history")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--journal-chars", type=int, default=2000, help="Length of each entry's journal text")
+    args = parser.parse_args()
+
+    fake_db = FakeFirestore()
+    db_manager = DatabaseManager(db=fake_db)
+    user_id = "bench-user"
+    entries = make_entries(args.days, end=date(2024, 12, 31))
+    for entry in entries:
+        text = f"{entry['date']}: {entry['dailyJournal']} "
+        entry["dailyJournal"] = (text * (args.journal_chars // len(text) + 1))[:args.journal_chars]
+    db_manager.add_journal_entries_bulk(user_id, entries)
+    del entries
+
+    def payload_kb(fields):
+        entries = db_manager.iter_user_journal_entries(user_id, fields=fields, page_size=args.page_size)
+        return sum(len(json.dumps(entry)) for entry in entries) / 1024
+
+    reads = {
+        "full documents": (lambda: db_manager.get_user_journal_entries(user_id), None),
+        "pages, full": (lambda: EntryStore.from_entries(
+            db_manager.iter_user_journal_entries(user_id, page_size=args.page_size)), None),
+        "pages, projected": (lambda: db_manager.get_user_entry_store(
+            user_id, fields=FIELDS, page_size=args.page_size), FIELDS),
+    }
+    print(f"{'read':<18} {'payload KB':>10} {'peak KB':>9} {'round trips':>11}")
+    findings = []
+    for name, (read, fields) in reads.items():
+        value, peak, round_trips = measure(fake_db, read)
+        findings.append(find_correlations(value))
+        del value
+        print(f"{name:<18} {payload_kb(fields):10.0f} {peak / 1024:9.0f} {round_trips:11d}")
+    assert findings[0] == findings[1] == findings[2]
+
+
+if __name__ == "__main__":
+    main()
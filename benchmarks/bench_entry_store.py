@@ -0,0 +1,69 @@
+"""
+Compares journal entries held as nested dictionaries with the columnar EntryStore.
+
+For each history length it reports the memory held by the entries, the time to pick
+out a 30-day window (get_entries_by_date_range against EntryStore.slice) and the time
+to build the correlation matrix. Each entry is decoded with its own json.loads call,
+so like Firestore's doc.to_dict() no strings are shared between entries.
+
+    python -m benchmarks.bench_entry_store --sizes 365 3000 10000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.synthetic import make_entries
+from utils.correlation_engine import entries_to_matrix
+from utils.entry_store import EntryStore
+from utils.entry_utils import get_entries_by_date_range
+
+
+def measure_memory(build):
+    """Returns what `build()` returns and the bytes it still holds."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return value, held
+
+
+def time_per_call(fn, repeat: int) -> float:
+    began = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - began) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[365, 3000, 10000])
+    parser.add_argument("--window-days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} | {'dict KB':>9} {'store KB':>9} | {'filter dict ms':>14} {'slice ms':>9} | "
+          f"{'matrix dict ms':>14} {'store ms':>9}")
+    for size in args.sizes:
+        encoded = [json.dumps(entry) for entry in make_entries(size, end=date(2024, 12, 31))]
+        entries, dict_bytes = measure_memory(lambda: [json.loads(entry) for entry in encoded])
+        store, store_bytes = measure_memory(lambda: EntryStore.from_entries(json.loads(entry) for entry in encoded))
+        assert store.to_dicts() == entries
+
+        end = date(2024, 12, 31) - timedelta(days=size // 2)
+        start = (end - timedelta(days=args.window_days - 1)).isoformat()
+        end = end.isoformat()
+        assert store.slice(start, end).to_dicts() == get_entries_by_date_range(entries, start, end)
+        filter_dicts = time_per_call(lambda: get_entries_by_date_range(entries, start, end), args.repeat)
+        filter_store = time_per_call(lambda: store.slice(start, end), args.repeat)
+        matrix_dicts = time_per_call(lambda: entries_to_matrix(entries), args.repeat)
+        matrix_store = time_per_call(lambda: entries_to_matrix(store), args.repeat)
+
+        print(f"{size:>8} | {dict_bytes / 1024:9.0f} {store_bytes / 1024:9.0f} | {filter_dicts * 1000:14.3f} "
+              f"{filter_store * 1000:9.3f} | {matrix_dicts * 1000:14.3f} {matrix_store * 1000:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measures per-turn latency and prompt tokens over a long chat, with and without history compaction.
+
+Each session opens with the real start-chat prompt built from synthetic journal entries
+and then sends `--turns` messages through AsyncGemini.send_message. The fake model's
+time to answer grows with the prompt size (`--token-latency` seconds per prompt token),
+so without compaction every turn is slower and costlier than the last. Compaction runs
+in the background after a reply; the benchmark lets it finish before the next turn, as
+a user's time to read and type would, so the turn latencies exclude it.
+
+    python -m benchmarks.bench_history_compaction --turns 50 --threshold 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from ai.gemini import AsyncGemini
+from ai.history_compactor import HistoryCompactor, history_tokens
+from ai.prompt import get_initial_chat_prompt
+from benchmarks.fake_gemini import FakeGenaiClient
+from benchmarks.synthetic import make_entries
+
+
+async def run_session(args, prefix_prompt: str, compactor) -> list:
+    reply = "I hear you. " * (args.reply_chars // 12)
+    client = FakeGenaiClient(latency=args.latency, reply=lambda prompt: reply, stream_interval=0.0,
+                             prompt_token_latency=args.token_latency)
+    gemini = AsyncGemini(client=client, compactor=compactor)
+    session_id = await gemini.start_chat("bench-user")
+    await gemini.send_message(session_id, prefix_prompt)
+
+    turns = []
+    for turn in range(1, args.turns + 1):
+        tokens_before = client.backend.prompt_tokens
+        began = time.perf_counter()
+        await gemini.send_message(session_id, f"Turn {turn}: " + "today I noticed how I felt. " * 8)
+        latency = time.perf_counter() - began
+        await gemini.join_compactions()
+        turns.append({
+            "latency": latency,
+            "prompt_tokens": client.backend.prompt_tokens - tokens_before,
+            "history_tokens": history_tokens(await gemini.get_session_history(session_id)),
+        })
+    return turns
+
+
+async def run(args) -> None:
+    prefix_prompt = get_initial_chat_prompt({}, make_entries(args.entries), max_entry_tokens=args.entry_tokens)
+    full = await run_session(args, prefix_prompt, None)
+    compactor = HistoryCompactor(args.threshold, keep_recent_turns=args.keep_turns)
+    compacted = await run_session(args, prefix_prompt, compactor)
+
+    print(f"{'turn':>4} | {'full ms':>8} {'prompt tok':>10} | {'compact ms':>10} {'prompt tok':>10} {'history tok':>11}")
+    for turn in range(args.turns):
+        if turn % args.every and turn != args.turns - 1:
+            continue
+        a, b = full[turn], compacted[turn]
+        print(f"{turn + 1:>4} | {a['latency'] * 1000:8.1f} {a['prompt_tokens']:>10} | "
+              f"{b['latency'] * 1000:10.1f} {b['prompt_tokens']:>10} {b['history_tokens']:>11}")
+
+    for name, turns in (("full history", full), ("compacted", compacted)):
+        latencies = [turn["latency"] for turn in turns]
+        print(f"{name:>13}: median {statistics.median(latencies) * 1000:7.1f} ms, "
+              f"last {latencies[-1] * 1000:7.1f} ms, prompt tokens {sum(t['prompt_tokens'] for t in turns):>9}")
+    print(f"compactions: {compactor.compactions}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--entries", type=int, default=90, help="Synthetic journal entries in the opening prompt")
+    parser.add_argument("--entry-tokens", type=int, default=4000, help="Token budget for the journal entries")
+    parser.add_argument("--threshold", type=int, default=2000,
+                        help="Compaction threshold in estimated tokens after the opening prompt")
+    parser.add_argument("--keep-turns", type=int, default=6, help="Recent turns kept verbatim")
+    parser.add_argument("--reply-chars", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake fixed latency per call in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.00002, help="Fake seconds per prompt token")
+    parser.add_argument("--every", type=int, default=5, help="Print every Nth turn")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
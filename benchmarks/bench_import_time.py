@@ -0,0 +1,100 @@
+"""
+Measures how long the API process takes to import main.py, to catch startup regressions.
+
+Each run starts a fresh interpreter with `python -c "import main"` and records the
+wall-clock time; one further run with `-X importtime` reports the cumulative import
+time of main and the slowest packages it pulled in. The Gemini and Firestore SDKs
+and NumPy are meant to load on first use, so the run fails if main imports any of
+them, or if the median wall-clock time exceeds the budget:
+
+    python -m benchmarks.bench_import_time --runs 5 --budget-ms 1000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFERRED_MODULES = ("google.genai", "firebase_admin", "google.cloud.firestore", "numpy")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    Parses `-X importtime` output.
+
+    Args:
+        stderr: The interpreter's standard error.
+
+    Returns:
+        (module, self microseconds, cumulative microseconds) for every import, in the
+        order the imports finished.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def import_main(workdir: str, importtime: bool = False) -> Tuple[float, str]:
+    """Imports main in a fresh interpreter and returns the wall-clock seconds and its standard error."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, PERSONA_QUEUE_DB=os.path.join(workdir, "persona_jobs.db"))
+    flags = ["-X", "importtime"] if importtime else []
+    began = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *flags, "-c", "import main"], cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - began
+    if result.returncode != 0:
+        raise SystemExit(f"import main failed:\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr
+
+
+def top_level_costs(imports: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Sums cumulative import time by top-level package, counting each package once."""
+    costs: Dict[str, int] = {}
+    for name, _, cumulative in imports:
+        package = name.split(".")[0]
+        costs[package] = max(costs.get(package, 0), cumulative)
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="Fail if the median run is slower")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level packages to list")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        wall = [import_main(workdir)[0] for _ in range(args.runs)]
+        imports = parse_importtime(import_main(workdir, importtime=True)[1])
+    main_us = next(cumulative for name, _, cumulative in imports if name == "main")
+
+    print(f"interpreter start + import main: median {statistics.median(wall) * 1000:7.1f} ms "
+          f"(min {min(wall) * 1000:.1f}, max {max(wall) * 1000:.1f})")
+    print(f"import main (cumulative):        {main_us / 1000:7.1f} ms")
+    print("slowest top-level packages:")
+    for package, cumulative in sorted(top_level_costs(imports).items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:<30} {cumulative / 1000:8.1f} ms")
+
+    imported = {name for name, _, _ in imports}
+    eager = [module for module in DEFERRED_MODULES if any(name == module or name.startswith(module + ".") for name in imported)]
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup but meant to load on first use: {', '.join(eager)}")
+        failed = True
+    if statistics.median(wall) * 1000 > args.budget_ms:
+        print(f"FAIL: median startup exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
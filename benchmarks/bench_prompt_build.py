@@ -0,0 +1,70 @@
+"""
+Compares build time and size of the start-chat journal block across history lengths.
+
+"legacy" is the previous recursive `+=` renderer that inlined every entry; "budgeted"
+is ai.prompt_builder with the default token budget, and "summaries" adds the
+summaries of the weekly rollups for the weeks left out.
+
+    python -m benchmarks.bench_prompt_build --sizes 30 365 1000 3000
+"""
+import argparse
+import time
+
+from ai.prompt_builder import DEFAULT_ENTRY_TOKEN_BUDGET, build_journal_entries_block, estimate_tokens, rollup_summaries
+from benchmarks.synthetic import make_entries
+from db.rollups import WEEKLY, build_rollup, period_keys
+
+
+def legacy_map_dict_to_string(data: dict, indent: int = 0) -> str:
+    result = ""
+    indent_str = "  " * indent
+    for key, value in data.items():
+        if isinstance(value, dict):
+            result += f"{indent_str}{key}:\n{legacy_map_dict_to_string(value, indent + 1)}"
+        else:
+            result += f"{indent_str}{key}: {value}\n"
+    return result
+
+
+def legacy_entries_block(entries) -> str:
+    journal_entries_str = ""
+    for entry in entries:
+        journal_entries_str += legacy_map_dict_to_string(entry)
+    return journal_entries_str
+
+
+def timed(fn, repeat: int):
+    began = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - began) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 365, 1000, 3000])
+    parser.add_argument("--budget", type=int, default=DEFAULT_ENTRY_TOKEN_BUDGET, help="Token budget")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'variant':>10} {'ms':>9} {'chars':>9} {'~tokens':>9}")
+    for size in args.sizes:
+        entries = make_entries(size)
+        weeks = {}
+        for entry in entries:
+            weeks.setdefault(dict(period_keys(entry["date"]))[WEEKLY], []).append(entry)
+        summaries = rollup_summaries([build_rollup(period, week) for period, week in weeks.items()])
+        variants = {
+            "legacy": lambda: legacy_entries_block(entries),
+            "budgeted": lambda: build_journal_entries_block(entries, max_tokens=args.budget),
+            "summaries": lambda: build_journal_entries_block(
+                entries, max_tokens=args.budget, weekly_summaries=summaries
+            ),
+        }
+        for name, fn in variants.items():
+            seconds, block = timed(fn, args.repeat)
+            print(f"{size:8d} {name:>10} {seconds * 1000:9.2f} {len(block):9d} {estimate_tokens(block):9d}")
+
+
+if __name__ == "__main__":
+    main()
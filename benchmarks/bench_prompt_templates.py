@@ -0,0 +1,60 @@
+"""
+Microbenchmarks for rendering the prompt templates in ai/templates.
+
+For every template it compares the precompiled render (static text split once,
+few-shot examples bound at load) with formatting the raw file text on each call. For
+the chain-of-thought prompt it also times the old per-call path, which opened and
+parsed the example file on every request. Finally it times a hot-reload check.
+
+    python -m benchmarks.bench_prompt_templates --repeat 20000
+"""
+import argparse
+import json
+import os
+import time
+
+from ai.prompt_templates import EXAMPLE_FILES, TEMPLATE_DIR, TEMPLATE_FIELDS, TEMPLATES, render_examples
+
+
+def per_call_us(fn, repeat: int) -> float:
+    began = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - began) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--value-chars", type=int, default=2000, help="Size of each filled-in value")
+    args = parser.parse_args()
+
+    examples_path = os.path.join(TEMPLATE_DIR, EXAMPLE_FILES["examples"])
+    value = "x" * args.value_chars
+    print(f"{'template':<22} {'precompiled us':>14} {'format per call us':>18}")
+    for name, fields in TEMPLATE_FIELDS.items():
+        with open(os.path.join(TEMPLATE_DIR, f"{name}.txt"), encoding="utf-8") as f:
+            raw = f.read()
+        values = {field: value for field in fields}
+        template = TEMPLATES.get(name)
+
+        def format_per_call():
+            extra = {}
+            if "{examples}" in raw:
+                with open(examples_path, encoding="utf-8") as f:
+                    extra["examples"] = render_examples(json.load(f))
+            return raw.format(**values, **extra)
+
+        assert template.render(**values) == format_per_call()
+        print(f"{name:<22} {per_call_us(lambda: template.render(**values), args.repeat):14.2f} "
+              f"{per_call_us(format_per_call, args.repeat // 10):18.2f}")
+
+    reload_interval = TEMPLATES.reload_interval
+    TEMPLATES.reload_interval = 0  # check the files on every call
+    print(f"{'registry get with an mtime check':<41} {per_call_us(lambda: TEMPLATES.get('initial_chat'), args.repeat // 10):.2f} us")
+    TEMPLATES.reload_interval = reload_interval
+    print(f"{'registry get between checks':<41} {per_call_us(lambda: TEMPLATES.get('initial_chat'), args.repeat):.2f} us")
+
+
+if __name__ == "__main__":
+    main()
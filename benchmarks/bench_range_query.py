@@ -0,0 +1,61 @@
+"""
+Compares the full-stream + Python filter path against the server-side range query.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_range_query --days 1500 --window 14
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from benchmarks.fake_firestore import FakeFirestore
+from db.database_manager import DatabaseManager
+from utils.entry_utils import get_entries_by_date_range
+
+
+def seed(db_manager: DatabaseManager, user_id: str, days: int) -> date:
+    """Writes one entry per day ending today and returns the first date."""
+    first = date.today() - timedelta(days=days - 1)
+    for offset in range(days):
+        day = (first + timedelta(days=offset)).isoformat()
+        db_manager.add_journal_entry(user_id, {"date": day, "sleep": {"hours": 7}, "dailyJournal": "..."})
+    return first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=1500, help="Number of stored entries")
+    parser.add_argument("--window", type=int, default=14, help="Size of the requested range in days")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    fake_db = FakeFirestore()
+    db_manager = DatabaseManager(db=fake_db)
+    user_id = "bench-user"
+    seed(db_manager, user_id, args.days)
+    end = date.today()
+    start = end - timedelta(days=args.window - 1)
+
+    fake_db.reset_counters()
+    began = time.perf_counter()
+    for _ in range(args.repeat):
+        entries = db_manager.get_user_journal_entries(user_id)
+        legacy = get_entries_by_date_range(entries, start.isoformat(), end.isoformat())
+    legacy_time = (time.perf_counter() - began) / args.repeat
+    legacy_reads = fake_db.reads // args.repeat
+
+    fake_db.reset_counters()
+    began = time.perf_counter()
+    for _ in range(args.repeat):
+        ranged = db_manager.get_user_journal_entries_in_range(user_id, start.isoformat(), end.isoformat())
+    ranged_time = (time.perf_counter() - began) / args.repeat
+    ranged_reads = fake_db.reads // args.repeat
+
+    assert sorted(e["date"] for e in legacy) == [e["date"] for e in ranged]
+    print(f"stream + filter: {legacy_reads:6d} reads  {legacy_time * 1000:8.2f} ms")
+    print(f"range query:     {ranged_reads:6d} reads  {ranged_time * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
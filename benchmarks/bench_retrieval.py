@@ -0,0 +1,127 @@
+"""
+Compares the start-chat prompt built from the whole journal history with retrieval mode,
+and exact with approximate search of the entry index.
+
+For each history length in `--days`, a user's entries are written to a FakeFirestore
+and the /start_chat/ prompt is built both ways. Whole-history mode reads every entry
+and inlines the newest that fit the token budget; retrieval mode reads the
+`--recent` latest entries and the `--k` older ones the index finds most related to
+them. It reports the prompt tokens, the Firestore documents read per chat, and in
+retrieval mode the one-off cost of building the user's index, whose read fetches
+only the journal text of each entry. Journals get `--extra-words` words drawn from a
+Zipf-distributed vocabulary, so entries differ as real ones do.
+
+The search table times `--searches` queries against one index of each size, exact
+and approximate, and reports the approximate search's recall of the exact top k.
+
+    python -m benchmarks.bench_retrieval --days 30 365 3000 --index-sizes 10000 100000
+"""
+import argparse
+import statistics
+import time
+from datetime import date
+
+import numpy as np
+
+from ai.embeddings import HashingEmbedder
+from ai.entry_retriever import EntryRetriever
+from ai.prompt import get_initial_chat_prompt
+from ai.prompt_builder import DEFAULT_RECENT_ENTRIES, DEFAULT_RETRIEVED_ENTRIES, estimate_tokens
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.synthetic import make_entries
+from db.database_manager import DatabaseManager
+from utils.vector_index import VectorIndex
+
+
+def journal_texts(count: int, extra_words: int, seed: int = 0):
+    """Returns `count` journal texts, each a synthetic entry's journal plus words from a Zipf vocabulary."""
+    rng = np.random.default_rng(seed)
+    entries = make_entries(count, end=date(2024, 12, 31), seed=seed)
+    words = rng.zipf(1.3, size=(count, extra_words)) % 5000
+    return [f"{entry['dailyJournal']} {' '.join(f'topic{word}' for word in row)}"
+            for entry, row in zip(entries, words)]
+
+
+def measure(fake_db: FakeFirestore, read):
+    """Returns what `read()` returns and the documents it read."""
+    fake_db.reset_counters()
+    value = read()
+    return value, fake_db.reads
+
+
+def compare_prompts(args):
+    print(f"{'days':>6} {'mode':<10} {'prompt tokens':>13} {'docs read':>9} {'index build ms':>14}")
+    for days in args.days:
+        fake_db = FakeFirestore()
+        db_manager = DatabaseManager(db=fake_db)
+        user_id = "bench-user"
+        entries = make_entries(days, end=date(2024, 12, 31))
+        for entry, text in zip(entries, journal_texts(days, args.extra_words)):
+            entry["dailyJournal"] = text
+        db_manager.add_journal_entries_bulk(user_id, entries)
+        del entries
+
+        def whole_history():
+            context = db_manager.get_user_context(user_id)
+            return get_initial_chat_prompt(context.persona, context.journal_entries)
+
+        prompt, reads = measure(fake_db, whole_history)
+        print(f"{days:6d} {'whole':<10} {estimate_tokens(prompt):13d} {reads:9d}")
+
+        retriever = EntryRetriever(db_manager)
+
+        def retrieval():
+            context = db_manager.get_user_context(user_id, recent_entries=args.recent)
+            recent_text = "\n".join(entry.get("dailyJournal") or "" for entry in context.journal_entries)
+            dates = retriever.search(user_id, recent_text, args.k,
+                                     exclude=[entry["date"] for entry in context.journal_entries])
+            return get_initial_chat_prompt(context.persona, context.journal_entries,
+                                           relevant_entries=db_manager.get_journal_entries_by_date(user_id, dates))
+
+        began = time.perf_counter()
+        measure(fake_db, lambda: retriever.search(user_id, "warm up", 1))
+        build_ms = (time.perf_counter() - began) * 1000
+        prompt, reads = measure(fake_db, retrieval)
+        print(f"{days:6d} {'retrieval':<10} {estimate_tokens(prompt):13d} {reads:9d} {build_ms:14.0f}")
+
+
+def compare_search(args):
+    embed = HashingEmbedder()
+    queries = embed(journal_texts(args.searches, args.extra_words, seed=1))
+    print(f"\n{'vectors':>8} {'exact ms':>9} {'approx ms':>10} {'recall@' + str(args.k):>9}")
+    for size in args.index_sizes:
+        texts = journal_texts(size, args.extra_words)
+        ids = [str(number) for number in range(size)]
+        exact, approximate = VectorIndex(), VectorIndex(approximate=True)
+        for start in range(0, size, 1000):
+            vectors = embed(texts[start:start + 1000])
+            exact.add(ids[start:start + 1000], vectors)
+            approximate.add(ids[start:start + 1000], vectors)
+        timings = {"exact": [], "approximate": []}
+        hits = 0
+        for query in queries:
+            results = {}
+            for name, index in (("exact", exact), ("approximate", approximate)):
+                began = time.perf_counter()
+                results[name] = {item_id for item_id, _ in index.search(query, args.k)}
+                timings[name].append(time.perf_counter() - began)
+            hits += len(results["exact"] & results["approximate"]) / max(1, len(results["exact"]))
+        print(f"{size:8d} {statistics.median(timings['exact']) * 1000:9.2f} "
+              f"{statistics.median(timings['approximate']) * 1000:10.2f} {hits / len(queries):9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365, 3000])
+    parser.add_argument("--recent", type=int, default=DEFAULT_RECENT_ENTRIES)
+    parser.add_argument("--k", type=int, default=DEFAULT_RETRIEVED_ENTRIES)
+    parser.add_argument("--extra-words", type=int, default=30, help="Vocabulary words added to each journal")
+    parser.add_argument("--index-sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--searches", type=int, default=100)
+    args = parser.parse_args()
+    compare_prompts(args)
+    compare_search(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures time-to-first-token for streamed chat replies against a fake streaming backend.
+
+Each turn is sent once through AsyncGemini.send_message (the reply is only visible when
+complete) and once through send_message_stream, and the history written back to the
+session store is checked to hold the full streamed reply.
+
+    python -m benchmarks.bench_stream_ttft --latency 0.3 --interval 0.05 --reply-chars 800
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from ai.gemini import AsyncGemini
+from benchmarks.fake_gemini import FakeGenaiClient
+
+
+async def run(args) -> None:
+    reply = "x" * args.reply_chars
+    client = FakeGenaiClient(latency=args.latency, reply=lambda prompt: reply, stream_interval=args.interval)
+    gemini = AsyncGemini(client=client)
+
+    blocking, first_token, streamed_total = [], [], []
+    for turn in range(args.turns):
+        session_id = await gemini.start_chat()
+        began = time.perf_counter()
+        await gemini.send_message(session_id, f"turn {turn}")
+        blocking.append(time.perf_counter() - began)
+
+        session_id = await gemini.start_chat()
+        began = time.perf_counter()
+        first = None
+        received = []
+        async for chunk in gemini.send_message_stream(session_id, f"turn {turn}"):
+            if first is None:
+                first = time.perf_counter() - began
+            received.append(chunk)
+        streamed_total.append(time.perf_counter() - began)
+        first_token.append(first)
+
+        history = gemini.sessions.get(session_id)["history"]
+        assert "".join(received) == reply
+        assert history[-1]["parts"][0]["text"] == reply, "streamed reply was not recorded in the session"
+
+    print(f"send_message        visible after {statistics.median(blocking) * 1000:8.1f} ms (median)")
+    print(f"send_message_stream first token   {statistics.median(first_token) * 1000:8.1f} ms (median)")
+    print(f"send_message_stream complete      {statistics.median(streamed_total) * 1000:8.1f} ms (median)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake time to first chunk in seconds")
+    parser.add_argument("--interval", type=float, default=0.05, help="Fake delay between chunks in seconds")
+    parser.add_argument("--reply-chars", type=int, default=800)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+import copy
+import pickle
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import Aborted
+from google.cloud.firestore_v1 import DELETE_FIELD, Increment, Maximum, Minimum
+
+from benchmarks.latency import Latency, sample_latency
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+}
+
+_MISSING = object()
+_DOCUMENT_ID = "__name__"  # FieldPath.document_id()
+
+
+def _decode(value):
+    """Returns a fresh copy of a stored value, strings included, like a document decoded off the wire."""
+    return pickle.loads(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def _project(data: Optional[Dict], field_paths: Optional[List[str]]) -> Optional[Dict]:
+    """Returns a fresh copy of the document keeping only the given dotted field paths."""
+    if data is None or field_paths is None:
+        return _decode(data)
+    projected: Dict = {}
+    for field_path in field_paths:
+        value = _get_field(data, field_path)
+        if value is _MISSING:
+            continue
+        target = projected
+        parts = field_path.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return _decode(projected)
+
+
+def _transformed(current, value):
+    """Returns what a written value stores over `current`, applying Increment, Maximum and Minimum."""
+    number = current if isinstance(current, (int, float)) and not isinstance(current, bool) else None
+    if isinstance(value, Increment):
+        return value.value if number is None else number + value.value
+    if isinstance(value, Maximum):
+        return value.value if number is None else max(number, value.value)
+    if isinstance(value, Minimum):
+        return value.value if number is None else min(number, value.value)
+    if isinstance(value, dict):
+        return {key: _transformed(_MISSING, item) for key, item in value.items() if item is not DELETE_FIELD}
+    return copy.deepcopy(value)
+
+
+def _merge(target: Dict, data: Dict):
+    """Merges `data` into a stored document the way set(merge=True) does, map by map down to the leaves."""
+    for key, value in data.items():
+        if value is DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = _transformed(target.get(key, _MISSING), value)
+
+
+def _get_field(data: Dict, field_path: str):
+    """Resolves a dotted field path (e.g. 'sleep.hours') against a document dict."""
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _order_value(doc_id: str, data: Dict, field_path: str):
+    """Resolves an order_by field, where '__name__' (FieldPath.document_id()) is the document ID."""
+    return doc_id if field_path == _DOCUMENT_ID else _get_field(data, field_path)
+
+
+class FakeFirestore:
+    """
+    An in-memory stand-in for the parts of the Firestore client used by DatabaseManager.
+
+    Every document returned from `get()` or `stream()` counts as one read, so callers can
+    compare how many documents a query touched. An optional `latency` (seconds, or a
+    distribution from benchmarks.latency) is slept once per round trip to approximate
+    network cost. Writes are applied atomically per document, batch or transaction,
+    field transforms (Increment, Maximum, Minimum, DELETE_FIELD) included, and every
+    document keeps a version so transactions can detect conflicting writes.
+    """
+
+    def __init__(self, latency: Latency = 0.0):
+        self._collections: Dict[Tuple[str, ...], Dict[str, Dict]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.round_trips = 0
+
+    def collection(self, name: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self, (name,))
+
+    def batch(self) -> "FakeWriteBatch":
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> "FakeTransaction":
+        return FakeTransaction(self, max_attempts, read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        """Fetches several documents in one round trip, like Client.get_all."""
+        self._round_trip()
+        for reference in references:
+            data = reference._read(transaction)
+            if data is not None:
+                self.reads += 1
+            yield FakeDocumentSnapshot(reference, _project(data, field_paths))
+
+    def reset_counters(self):
+        self.reads = 0
+        self.writes = 0
+        self.round_trips = 0
+
+    def _round_trip(self):
+        self.round_trips += 1
+        delay = sample_latency(self.latency)
+        if delay:
+            time.sleep(delay)
+
+    def _docs(self, path: Tuple[str, ...]) -> Dict[str, Dict]:
+        return self._collections.setdefault(path, {})
+
+    def _changed(self, path: str):
+        self._versions[path] = self._versions.get(path, 0) + 1
+        self.writes += 1
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[Dict]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str):
+        value = _get_field(self._data or {}, field_path)
+        return None if value is _MISSING else value
+
+
+class FakeDocumentReference:
+    def __init__(self, client: FakeFirestore, parent: Tuple[str, ...], doc_id: str):
+        self._client = client
+        self._parent = parent
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._parent + (self.id,))
+
+    def collection(self, name: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._client, self._parent + (self.id, name))
+
+    def get(self, field_paths=None, transaction=None) -> FakeDocumentSnapshot:
+        self._client._round_trip()
+        data = self._read(transaction)
+        if data is not None:
+            self._client.reads += 1
+        return FakeDocumentSnapshot(self, _project(data, field_paths))
+
+    def set(self, data: Dict, merge: bool = False):
+        self._client._round_trip()
+        self._write(data, merge)
+
+    def update(self, data: Dict):
+        self._client._round_trip()
+        self._update(data)
+
+    def delete(self):
+        self._client._round_trip()
+        self._delete()
+
+    def _read(self, transaction: Optional["FakeTransaction"] = None) -> Optional[Dict]:
+        with self._client._lock:
+            if transaction is not None:
+                transaction._observe(self.path)
+            return self._client._docs(self._parent).get(self.id)
+
+    def _write(self, data: Dict, merge: bool):
+        with self._client._lock:
+            docs = self._client._docs(self._parent)
+            if merge and self.id in docs:
+                _merge(docs[self.id], data)
+            else:
+                docs[self.id] = _transformed(_MISSING, data)
+            self._client._changed(self.path)
+
+    def _update(self, data: Dict):
+        """Replaces the given (dotted) fields, like DocumentReference.update."""
+        with self._client._lock:
+            document = self._client._docs(self._parent).get(self.id)
+            if document is None:
+                raise KeyError(f"No document to update: {self.path}")
+            for field_path, value in data.items():
+                *parents, name = field_path.split(".")
+                target = document
+                for part in parents:
+                    target = target.setdefault(part, {})
+                if value is DELETE_FIELD:
+                    target.pop(name, None)
+                else:
+                    target[name] = _transformed(target.get(name, _MISSING), value)
+            self._client._changed(self.path)
+
+    def _delete(self):
+        with self._client._lock:
+            self._client._docs(self._parent).pop(self.id, None)
+            self._client._changed(self.path)
+
+
+class FakeWriteBatch:
+    """Buffers writes and applies them in a single round trip on commit()."""
+
+    def __init__(self, client: FakeFirestore):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference: FakeDocumentReference, data: Dict, merge: bool = False):
+        self._writes.append(lambda: reference._write(data, merge))
+
+    def update(self, reference: FakeDocumentReference, data: Dict):
+        self._writes.append(lambda: reference._update(data))
+
+    def delete(self, reference: FakeDocumentReference):
+        self._writes.append(reference._delete)
+
+    def commit(self):
+        if len(self._writes) > 500:
+            raise ValueError("maximum 500 writes allowed per request")
+        self._client._round_trip()
+        with self._client._lock:
+            for write in self._writes:
+                write()
+        self._writes = []
+
+
+class FakeTransaction(FakeWriteBatch):
+    """
+    A transaction for google.cloud.firestore_v1.transactional, with optimistic concurrency.
+
+    Reads made with the transaction record the version of every document they return.
+    On commit the buffered writes are applied at once if none of those documents has
+    changed since, and Aborted is raised otherwise, so `transactional` runs the
+    function again, up to `max_attempts` times.
+    """
+
+    def __init__(self, client: FakeFirestore, max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._read_versions: Dict[str, int] = {}
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _observe(self, path: str):
+        self._read_versions.setdefault(path, self._client._versions.get(path, 0))
+
+    def _clean_up(self):
+        self._writes = []
+        self._read_versions = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = object()
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self) -> list:
+        if len(self._writes) > 500:
+            raise ValueError("maximum 500 writes allowed per request")
+        self._client._round_trip()
+        with self._client._lock:
+            for path, version in self._read_versions.items():
+                if self._client._versions.get(path, 0) != version:
+                    raise Aborted(f"Transaction aborted: {path} was written concurrently")
+            for write in self._writes:
+                write()
+        self._clean_up()
+        return []
+
+
+class FakeQuery:
+    def __init__(self, client: FakeFirestore, path: Tuple[str, ...]):
+        self._client = client
+        self._path = path
+        self._filters: List[Tuple[str, str, object]] = []
+        self._order: List[Tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._projection: Optional[List[str]] = None
+        self._start_after: Optional[Dict] = None
+
+    def _copy(self) -> "FakeQuery":
+        query = FakeQuery(self._client, self._path)
+        query._filters = list(self._filters)
+        query._order = list(self._order)
+        query._limit = self._limit
+        query._projection = self._projection
+        query._start_after = self._start_after
+        return query
+
+    def select(self, field_paths) -> "FakeQuery":
+        query = self._copy()
+        query._projection = list(field_paths)
+        return query
+
+    def where(self, field_path: str = None, op_string: str = None, value=None, *, filter=None) -> "FakeQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        query = self._copy()
+        query._filters.append((field_path, op_string, value))
+        return query
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "FakeQuery":
+        query = self._copy()
+        query._order.append((field_path, direction))
+        return query
+
+    def start_after(self, document_fields) -> "FakeQuery":
+        """Starts after the given values of the order_by fields (a dict or a snapshot); ascending orders only."""
+        query = self._copy()
+        if isinstance(document_fields, FakeDocumentSnapshot):
+            document_fields = dict(document_fields.to_dict() or {}, **{_DOCUMENT_ID: document_fields.id})
+        query._start_after = document_fields
+        return query
+
+    def limit(self, count: int) -> "FakeQuery":
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def _matches(self, data: Dict) -> bool:
+        for field_path, op_string, value in self._filters:
+            field_value = _get_field(data, field_path)
+            if field_value is _MISSING or not _OPERATORS[op_string](field_value, value):
+                return False
+        return True
+
+    def _results(self) -> List[Tuple[str, Dict]]:
+        docs = [
+            (doc_id, data) for doc_id, data in self._client._docs(self._path).items()
+            if self._matches(data)
+            and all(_order_value(doc_id, data, field) is not _MISSING for field, _ in self._order)
+        ]
+        docs.sort(key=lambda item: item[0])
+        for field_path, direction in reversed(self._order):
+            docs.sort(key=lambda item: _order_value(*item, field_path), reverse=direction == "DESCENDING")
+        if self._start_after is not None:
+            cursor = tuple(_get_field(self._start_after, field) if field != _DOCUMENT_ID else self._start_after[field]
+                           for field, _ in self._order)
+            docs = [item for item in docs if tuple(_order_value(*item, field) for field, _ in self._order) > cursor]
+        if self._limit is not None:
+            docs = docs[: self._limit]
+        return docs
+
+    def stream(self, transaction: Optional[FakeTransaction] = None):
+        self._client._round_trip()
+        parent = FakeCollectionReference(self._client, self._path)
+        with self._client._lock:
+            results = self._results()
+            if transaction is not None:
+                for doc_id, _ in results:
+                    transaction._observe(parent.document(doc_id).path)
+        for doc_id, data in results:
+            self._client.reads += 1
+            yield FakeDocumentSnapshot(parent.document(doc_id), _project(data, self._projection))
+
+    def get(self, transaction: Optional[FakeTransaction] = None) -> List[FakeDocumentSnapshot]:
+        return list(self.stream(transaction))
+
+
+class FakeCollectionReference(FakeQuery):
+    @property
+    def id(self) -> str:
+        return self._path[-1]
+
+    def document(self, doc_id: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self._client, self._path, doc_id)
@@ -0,0 +1,232 @@
+import asyncio
+import random
+import time
+from typing import List, Optional
+
+from google.genai import errors, types
+
+from ai.embeddings import HashingEmbedder
+from ai.prompt_builder import estimate_tokens
+from benchmarks.latency import Latency, sample_latency
+
+
+class FakeResponse:
+    """The subset of GenerateContentResponse read by ai.gemini."""
+
+    def __init__(self, text: str, usage_metadata: Optional[types.GenerateContentResponseUsageMetadata] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+_ERROR_STATUS = {400: "INVALID_ARGUMENT", 429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE",
+                 504: "DEADLINE_EXCEEDED"}
+
+
+def _user_content(message) -> types.Content:
+    if isinstance(message, types.Content):
+        return message
+    return types.Content(role="user", parts=[types.Part(text=str(message))])
+
+
+def _model_content(text: str) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
+def _embed(contents: List[str]) -> types.EmbedContentResponse:
+    """Embeds texts locally by hashing their words, so related texts still get related vectors."""
+    return types.EmbedContentResponse(
+        embeddings=[types.ContentEmbedding(values=row.tolist()) for row in HashingEmbedder(256)(contents)]
+    )
+
+
+def _count_tokens(contents) -> int:
+    if isinstance(contents, str):
+        return estimate_tokens(contents)
+    if isinstance(contents, types.Content):
+        return sum(estimate_tokens(part.text or "") for part in contents.parts)
+    return sum(_count_tokens(content) for content in contents)
+
+
+class FakeBackend:
+    """
+    Shared behaviour for the fake clients: a per-call latency and a canned reply.
+
+    `reply` is called with the prompt text and returns the model's answer. Streaming
+    calls deliver the first chunk after `latency` (seconds, or a distribution from
+    benchmarks.latency sampled per call) and each further chunk of
+    `stream_chunk_chars` characters after `stream_interval`. Each prompt token (the
+    whole chat history plus the new message) adds `prompt_token_latency` seconds before
+    the first chunk, and token counts are reported in the response's usage metadata
+    and summed in `prompt_tokens`.
+
+    Faults are injected per call: with probability `error_rate` the call fails at once
+    with the SDK's API error for `error_code` (a 503 by default), and otherwise with
+    probability `stall_rate` its reply is held back an extra `stall_seconds`. The
+    rates can be changed between calls, for example to end a simulated outage, and
+    `seed` makes the faults repeatable.
+    """
+
+    def __init__(self, latency: Latency = 0.5, reply=None, stream_interval: float = 0.05,
+                 stream_chunk_chars: int = 16, prompt_token_latency: float = 0.0, error_rate: float = 0.0,
+                 error_code: int = 503, stall_rate: float = 0.0, stall_seconds: float = 30.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.reply = reply or (lambda prompt: f"echo: {prompt[:40]}")
+        self.stream_interval = stream_interval
+        self.stream_chunk_chars = stream_chunk_chars
+        self.prompt_token_latency = prompt_token_latency
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.errors = 0
+        self.stalls = 0
+
+    def fault(self) -> float:
+        """Raises the injected API error for one call, or returns its extra stall in seconds."""
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            status = _ERROR_STATUS.get(self.error_code, "UNKNOWN")
+            body = {"error": {"code": self.error_code, "message": "injected fault", "status": status}}
+            raise (errors.ServerError if self.error_code >= 500 else errors.ClientError)(self.error_code, body)
+        if self.stall_rate and self.random.random() < self.stall_rate:
+            self.stalls += 1
+            return self.stall_seconds
+        return 0.0
+
+    def respond(self, contents) -> str:
+        self.calls += 1
+        if isinstance(contents, list):
+            contents = contents[-1]
+        if isinstance(contents, types.Content):
+            contents = "".join(part.text or "" for part in contents.parts)
+        return self.reply(contents)
+
+    def reply_delay(self, text: str, prompt_tokens: int = 0) -> float:
+        """Seconds until a non-streamed reply of this length would be complete."""
+        chunks = max(1, -(-len(text) // self.stream_chunk_chars))
+        return self.first_chunk_delay(prompt_tokens) + (chunks - 1) * self.stream_interval
+
+    def first_chunk_delay(self, prompt_tokens: int = 0) -> float:
+        """Seconds until the first chunk of a reply to a prompt of this size."""
+        return sample_latency(self.latency) + prompt_tokens * self.prompt_token_latency
+
+    def usage(self, prompt_tokens: int, text: str) -> types.GenerateContentResponseUsageMetadata:
+        """Records and returns the token counts of one call."""
+        self.prompt_tokens += prompt_tokens
+        return types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens, candidates_token_count=estimate_tokens(text)
+        )
+
+
+class FakeChat:
+    def __init__(self, backend: FakeBackend, history: Optional[List[types.Content]] = None):
+        self._backend = backend
+        self._history = list(history or [])
+
+    def send_message(self, message, config=None) -> FakeResponse:
+        text = self._backend.respond(message)
+        stall = self._backend.fault()
+        prompt_tokens = self._prompt_tokens(message)
+        time.sleep(stall + self._backend.reply_delay(text, prompt_tokens))
+        return self._record(message, text, prompt_tokens)
+
+    def _prompt_tokens(self, message) -> int:
+        return _count_tokens(self._history + [_user_content(message)])
+
+    def _record(self, message, text: str, prompt_tokens: int) -> FakeResponse:
+        self._history.extend([_user_content(message), _model_content(text)])
+        return FakeResponse(text, self._backend.usage(prompt_tokens, text))
+
+    def get_history(self, curated: bool = False) -> List[types.Content]:
+        return list(self._history)
+
+
+class FakeAsyncChat(FakeChat):
+    async def send_message(self, message, config=None) -> FakeResponse:
+        text = self._backend.respond(message)
+        stall = self._backend.fault()
+        prompt_tokens = self._prompt_tokens(message)
+        await asyncio.sleep(stall + self._backend.reply_delay(text, prompt_tokens))
+        return self._record(message, text, prompt_tokens)
+
+    async def send_message_stream(self, message, config=None):
+        backend = self._backend
+
+        async def stream():
+            text = backend.respond(message)
+            stall = backend.fault()
+            prompt_tokens = self._prompt_tokens(message)
+            size = backend.stream_chunk_chars
+            chunks = [text[start:start + size] for start in range(0, len(text), size)] or [""]
+            await asyncio.sleep(stall + backend.first_chunk_delay(prompt_tokens))
+            for index, chunk in enumerate(chunks):
+                if index:
+                    await asyncio.sleep(backend.stream_interval)
+                # like the real API, only the final chunk carries the usage counts
+                last = index == len(chunks) - 1
+                yield FakeResponse(chunk, backend.usage(prompt_tokens, text) if last else None)
+            self._history.extend([_user_content(message), _model_content(text)])
+
+        return stream()
+
+
+class _FakeChats:
+    def __init__(self, backend: FakeBackend, chat_class):
+        self._backend = backend
+        self._chat_class = chat_class
+
+    def create(self, model: str, config=None, history=None):
+        return self._chat_class(self._backend, history)
+
+
+class _FakeModels:
+    def __init__(self, backend: FakeBackend):
+        self._backend = backend
+
+    def generate_content(self, model: str, contents, config=None) -> FakeResponse:
+        text = self._backend.respond(contents)
+        stall = self._backend.fault()
+        prompt_tokens = _count_tokens(contents)
+        time.sleep(stall + self._backend.reply_delay(text, prompt_tokens))
+        return FakeResponse(text, self._backend.usage(prompt_tokens, text))
+
+    def embed_content(self, model: str, contents: List[str], config=None) -> types.EmbedContentResponse:
+        self._backend.calls += 1
+        time.sleep(self._backend.fault() + self._backend.first_chunk_delay())
+        return _embed(contents)
+
+
+class _FakeAsyncModels(_FakeModels):
+    async def generate_content(self, model: str, contents, config=None) -> FakeResponse:
+        text = self._backend.respond(contents)
+        stall = self._backend.fault()
+        prompt_tokens = _count_tokens(contents)
+        await asyncio.sleep(stall + self._backend.reply_delay(text, prompt_tokens))
+        return FakeResponse(text, self._backend.usage(prompt_tokens, text))
+
+    async def embed_content(self, model: str, contents: List[str], config=None) -> types.EmbedContentResponse:
+        self._backend.calls += 1
+        await asyncio.sleep(self._backend.fault() + self._backend.first_chunk_delay())
+        return _embed(contents)
+
+
+class _FakeAio:
+    def __init__(self, backend: FakeBackend):
+        self.chats = _FakeChats(backend, FakeAsyncChat)
+        self.models = _FakeAsyncModels(backend)
+
+
+class FakeGenaiClient:
+    """Drop-in replacement for `genai.Client` that never touches the network."""
+
+    def __init__(self, latency: Latency = 0.5, reply=None, stream_interval: float = 0.05,
+                 prompt_token_latency: float = 0.0, **faults):
+        """`faults` are FakeBackend's error and stall settings."""
+        self.backend = FakeBackend(latency, reply, stream_interval, prompt_token_latency=prompt_token_latency, **faults)
+        self.chats = _FakeChats(self.backend, FakeChat)
+        self.models = _FakeModels(self.backend)
+        self.aio = _FakeAio(self.backend)
@@ -0,0 +1,57 @@
+import math
+import random
+from typing import Callable, Optional, Union
+
+# A latency is a fixed number of seconds or a function returning one sample per call.
+Latency = Union[float, Callable[[], float]]
+
+_Z99 = 2.3263  # standard normal quantile at 0.99
+
+
+def sample_latency(latency: Latency) -> float:
+    """Returns the seconds to wait for one call."""
+    return latency() if callable(latency) else latency
+
+
+def uniform(low: float, high: float, seed: Optional[int] = None) -> Callable[[], float]:
+    """Latencies spread evenly between `low` and `high` seconds."""
+    rng = random.Random(seed)
+    return lambda: rng.uniform(low, high)
+
+
+def lognormal(median: float, p99: float, seed: Optional[int] = None) -> Callable[[], float]:
+    """
+    Latencies with a long right tail, as network and model calls have, fitted so
+    half of the samples are under `median` seconds and 99% under `p99`.
+    """
+    if median <= 0 or p99 < median:
+        raise ValueError("lognormal latency needs 0 < median <= p99")
+    rng = random.Random(seed)
+    mu = math.log(median)
+    sigma = math.log(p99 / median) / _Z99
+    return lambda: rng.lognormvariate(mu, sigma)
+
+
+def parse_latency(spec: str, seed: Optional[int] = None) -> Latency:
+    """
+    Parses a latency given on the command line.
+
+    Args:
+        spec: Seconds ('0.05'), 'uniform:LOW:HIGH' or 'lognormal:MEDIAN:P99'.
+        seed: Seeds the random distributions, for repeatable runs.
+
+    Returns:
+        The latency.
+    """
+    kind, _, rest = spec.partition(":")
+    try:
+        if not rest:
+            return float(kind)
+        values = [float(value) for value in rest.split(":")]
+        if kind == "uniform" and len(values) == 2:
+            return uniform(*values, seed=seed)
+        if kind == "lognormal" and len(values) == 2:
+            return lognormal(*values, seed=seed)
+    except ValueError as e:
+        raise ValueError(f"Invalid latency {spec!r}: {e}")
+    raise ValueError(f"Invalid latency {spec!r}: expected seconds, uniform:LOW:HIGH or lognormal:MEDIAN:P99")
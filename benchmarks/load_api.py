@@ -0,0 +1,263 @@
+"""
+Load test of the API endpoints against in-memory fakes of Firestore and Gemini.
+
+Builds the app with `main.create_app` around a FakeFirestore and a FakeGenaiClient,
+so the real DatabaseManager and AsyncGemini code runs with only the network replaced
+by sleeps drawn from the given latency distributions (see benchmarks.latency). After
+seeding `--users` users with `--days` days of entries each, every endpoint is driven
+in turn with `--requests` requests, `--concurrency` at a time, and its throughput and
+p50/p95/p99 latency are reported.
+
+Save a baseline and compare later runs against it; a comparison exits with status 1
+when an endpoint's p95 latency or throughput got worse by more than `--tolerance`:
+
+    python -m benchmarks.load_api --gemini-latency lognormal:0.3:1.5 --save-baseline load_baseline.json
+    python -m benchmarks.load_api --gemini-latency lognormal:0.3:1.5 --compare load_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+import httpx
+
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.fake_gemini import FakeGenaiClient
+from benchmarks.latency import parse_latency
+from benchmarks.synthetic import make_entries, make_entry
+
+FIRST_DAY = date(2024, 1, 1)
+REPLY = ("It sounds like the last few days have been demanding. You mentioned sleeping badly after late "
+         "work nights; what tends to happen on the evenings before a better night's sleep?")
+# the closing prompt asks for the persona JSON, which the persona workers validate
+PERSONA_REPLY = json.dumps({"userProfile": {
+    "userId": "load-user", "presentingSymptoms": ["poor sleep"], "observedPatterns": ["late work nights"],
+    "observedMood": {"overallTrend": "stable", "recentFluctuations": "mild"},
+    "observedBehavior": {"avoidance": "low", "concentration": "variable"},
+    "currentGoals": [{"goal": "sleep by 11pm", "progress": "started"}], "keyThemes": ["work"],
+    "significantEvents": [], "suggestedAssignments": [{"assignment": "sleep diary", "completed": False}],
+}})
+
+
+def fake_reply(prompt: str) -> str:
+    return PERSONA_REPLY if "updating a user's profile" in prompt else REPLY
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+class LoadScenario:
+    """The requests of each endpoint, and the users and chat sessions they share."""
+
+    def __init__(self, user_ids: List[str], days: int, window_days: int, seed: int):
+        self.user_ids = user_ids
+        self.days = days
+        self.window_days = window_days
+        self.rng = random.Random(seed)
+        self.sessions: List[str] = []
+
+    def user(self) -> str:
+        return self.rng.choice(self.user_ids)
+
+    def endpoints(self) -> Dict[str, Callable]:
+        """The request builders in the order they run; each sends request `number` and returns the response."""
+        return {
+            "/health": lambda client, number: client.get("/health"),
+            "/add_entries/": self.add_entries,
+            "/start_chat/": self.start_chat,
+            "/send_message/": self.send_message,
+            "/send_message_stream/": self.send_message_stream,
+            "/get_single_response/": lambda client, number: client.post(
+                "/get_single_response/", json={"message": f"Suggest a wind-down routine, variant {number}"}
+            ),
+            "/get_correlations/": self.get_correlations,
+            "/get_insights/": lambda client, number: client.post("/get_insights/", json={"user_id": self.user()}),
+            "/end_chat/": self.end_chat,
+        }
+
+    async def add_entries(self, client: httpx.AsyncClient, number: int) -> httpx.Response:
+        # each request adds a new day after the seeded history
+        day = FIRST_DAY + timedelta(days=self.days + number)
+        entry = make_entry(day, self.rng)
+        return await client.post("/add_entries/", json={"user_id": self.user(), "journal_entries": [entry]})
+
+    async def start_chat(self, client: httpx.AsyncClient, number: int) -> httpx.Response:
+        response = await client.post("/start_chat/", json={"user_id": self.user()})
+        if response.status_code == 200:
+            self.sessions.append(response.json()["session_id"])
+        return response
+
+    def _session(self, number: int) -> str:
+        if not self.sessions:
+            raise RuntimeError("No chat sessions; /start_chat/ must run first")
+        return self.sessions[number % len(self.sessions)]
+
+    async def send_message(self, client: httpx.AsyncClient, number: int) -> httpx.Response:
+        return await client.post("/send_message/", json={
+            "session_id": self._session(number), "message": "I slept badly again and work was stressful.",
+        })
+
+    async def send_message_stream(self, client: httpx.AsyncClient, number: int) -> httpx.Response:
+        response = await client.post("/send_message_stream/", json={
+            "session_id": self._session(number), "message": "What could I try tonight?",
+        })
+        if "event: error" in response.text:
+            response.status_code = 502
+        return response
+
+    async def get_correlations(self, client: httpx.AsyncClient, number: int) -> httpx.Response:
+        start = FIRST_DAY + timedelta(days=self.rng.randrange(max(1, self.days - self.window_days)))
+        end = start + timedelta(days=self.window_days - 1)
+        return await client.post("/get_correlations/", json={
+            "user_id": self.user(), "start_date": start.isoformat(), "end_date": end.isoformat(),
+        })
+
+    async def end_chat(self, client: httpx.AsyncClient, number: int) -> httpx.Response:
+        # each session is ended once; ending more than were started reports 404s
+        session_id = self.sessions[number] if number < len(self.sessions) else "no-such-session"
+        return await client.post("/end_chat/", json={"user_id": self.user(), "session_id": session_id})
+
+
+async def run_endpoint(client: httpx.AsyncClient, send: Callable, requests: int, concurrency: int) -> Dict:
+    """Sends `requests` requests, `concurrency` at a time, and returns throughput and latency percentiles in ms."""
+    latencies = []
+    errors = 0
+    numbers = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for number in numbers:
+            began = time.perf_counter()
+            try:
+                response = await send(client, number)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - began)
+            errors += failed
+
+    began = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - began
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run_load_test(args) -> Dict[str, Dict]:
+    import main as api
+    from db.database_manager import DatabaseManager
+
+    firestore = FakeFirestore()
+    db_manager = DatabaseManager(db=firestore)
+    user_ids = [f"load-user-{index}" for index in range(args.users)]
+    for user_id in user_ids:
+        db_manager.update_user_data(user_id, {"user_persona": {"userId": user_id}})
+        db_manager.add_journal_entries_bulk(user_id, make_entries(args.days, end=FIRST_DAY + timedelta(days=args.days - 1)))
+        db_manager.store_insights_report(user_id, {"entryCount": args.days, "findings": [], "summary": REPLY})
+    firestore.latency = parse_latency(args.firestore_latency, args.seed)
+
+    genai = FakeGenaiClient(latency=parse_latency(args.gemini_latency, args.seed), reply=fake_reply,
+                            stream_interval=args.stream_interval)
+    # configured from the environment, but with the persona queue kept out of the working tree
+    settings = api.Settings(persona_queue_db=os.path.join(tempfile.mkdtemp(), "persona_jobs.db"))
+    services = api.Services(firestore_client=firestore, genai_client=genai, settings=settings)
+    app = api.create_app(services)
+    scenario = LoadScenario(user_ids, args.days, args.window_days, args.seed)
+    endpoints = scenario.endpoints()
+    selected = args.endpoints or list(endpoints)
+    unknown = set(selected) - set(endpoints)
+    if unknown:
+        raise ValueError(f"Unknown endpoints {sorted(unknown)}; choose from {list(endpoints)}")
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+            for endpoint in endpoints:
+                if endpoint not in selected and not (endpoint == "/start_chat/" and _needs_sessions(selected)):
+                    continue
+                stats = await run_endpoint(client, endpoints[endpoint], args.requests, args.concurrency)
+                if endpoint in selected:
+                    results[endpoint] = stats
+                    print(f"{endpoint:<24} {stats['requests']:>6} {stats['errors']:>6} {stats['rps']:>8.1f} "
+                          f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+    return results
+
+
+def _needs_sessions(endpoints: List[str]) -> bool:
+    return any(endpoint in endpoints for endpoint in ("/send_message/", "/send_message_stream/", "/end_chat/"))
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Prints each endpoint against the baseline and returns the endpoints that regressed."""
+    print(f"\n{'endpoint':<24} {'base p95':>9} {'p95':>9} {'change':>7} {'base rps':>9} {'rps':>8} {'change':>7}")
+    regressed = []
+    for endpoint, stats in results.items():
+        base = baseline.get(endpoint)
+        if base is None:
+            print(f"{endpoint:<24} (not in baseline)")
+            continue
+        p95_change = stats["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        rps_change = stats["rps"] / base["rps"] - 1 if base["rps"] else 0.0
+        worse = p95_change > tolerance or rps_change < -tolerance or stats["errors"] > base["errors"]
+        if worse:
+            regressed.append(endpoint)
+        print(f"{endpoint:<24} {base['p95_ms']:9.1f} {stats['p95_ms']:9.1f} {p95_change:+7.0%} "
+              f"{base['rps']:9.1f} {stats['rps']:8.1f} {rps_change:+7.0%}{'  REGRESSION' if worse else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=120, help="Days of seeded entries per user")
+    parser.add_argument("--window-days", type=int, default=30, help="Date range of each correlation request")
+    parser.add_argument("--firestore-latency", default="lognormal:0.01:0.05",
+                        help="Seconds per Firestore round trip: SECONDS, uniform:LOW:HIGH or lognormal:MEDIAN:P99")
+    parser.add_argument("--gemini-latency", default="lognormal:0.2:1.0", help="Seconds to the first reply chunk, as above")
+    parser.add_argument("--stream-interval", type=float, default=0.01, help="Seconds between streamed reply chunks")
+    parser.add_argument("--endpoints", nargs="+", help="Endpoints to drive (default: all)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", help="Write the results and settings to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare the results with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative worsening before a regression")
+    args = parser.parse_args()
+
+    # the settings that shape the results; a run over fewer endpoints still compares
+    settings = {key: value for key, value in vars(args).items()
+                if key not in ("endpoints", "save_baseline", "compare", "tolerance")}
+    print(f"{'endpoint':<24} {'reqs':>6} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    results = asyncio.run(run_load_test(args))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+        print(f"\nbaseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != settings:
+            print("\nWarning: the baseline was recorded with different settings:", baseline.get("settings"))
+        regressed = compare(results, baseline["results"], args.tolerance)
+        if regressed:
+            print(f"\n{len(regressed)} endpoint(s) regressed beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
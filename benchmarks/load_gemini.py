@@ -0,0 +1,64 @@
+"""
+Load test for the Gemini wrappers against a fake model backend.
+
+Fires `--users` concurrent generate_content calls through the blocking Gemini client
+(called directly from coroutines, as the endpoints used to) and through AsyncGemini,
+while a heartbeat coroutine stands in for /health and records how long the event
+loop was stalled.
+
+    python -m benchmarks.load_gemini --users 32 --latency 0.2 --max-in-flight 16
+"""
+import argparse
+import asyncio
+import time
+
+from ai.gemini import AsyncGemini, Gemini
+from benchmarks.fake_gemini import FakeGenaiClient
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Returns the worst observed delay between scheduled wake-ups of the event loop."""
+    worst = 0.0
+    while not stop.is_set():
+        began = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - began - interval)
+    return worst
+
+
+async def run(client, users: int) -> dict:
+    async def call(i: int):
+        result = client.generate_content(f"request {i}")
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0)
+    began = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(users)))
+    elapsed = time.perf_counter() - began
+    stop.set()
+    stall = await monitor
+    return {"elapsed": elapsed, "rps": users / elapsed, "max_loop_stall": stall}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=32, help="Concurrent requests")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake model latency in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    args = parser.parse_args()
+
+    blocking = Gemini(client=FakeGenaiClient(latency=args.latency))
+    non_blocking = AsyncGemini(client=FakeGenaiClient(latency=args.latency), max_in_flight=args.max_in_flight)
+
+    for name, client in (("Gemini (blocking)", blocking), ("AsyncGemini", non_blocking)):
+        stats = asyncio.run(run(client, args.users))
+        print(f"{name:20s} {stats['elapsed']:7.2f} s  {stats['rps']:8.1f} req/s  "
+              f"max loop stall {stats['max_loop_stall'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+_QUALITIES = ["poor", "fair", "good", "excellent"]
+_INTENSITIES = ["low", "moderate", "high"]
+_EXERCISE_TYPES = ["running", "yoga", "cycling", "swimming", "walking", "none"]
+_LEVELS = ["low", "moderate", "high"]
+_MOODS = ["calm", "anxious", "tired", "energized", "content", "irritable"]
+_JOURNAL_SENTENCES = [
+    "Work was busy and I felt stretched thin.",
+    "Had a long walk after dinner and felt calmer.",
+    "Slept badly and struggled to concentrate.",
+    "Caught up with a friend over coffee.",
+    "Felt anxious about money this afternoon.",
+    "Spent the evening reading instead of scrolling.",
+    "Skipped exercise and felt sluggish all day.",
+    "Cooked a proper meal and went to bed early.",
+]
+
+
+def make_entry(day: date, rng: random.Random) -> Dict:
+    """Builds one journal entry matching models.journal_entry.JournalEntry with loosely related fields."""
+    exercise = rng.choice([0, 0, 20, 30, 45, 60, 90])
+    sleep_hours = round(min(10.0, max(3.5, rng.gauss(6.5, 1.0) + exercise / 90)), 1)
+    stress = max(1, min(10, int(rng.gauss(6, 2) - (sleep_hours - 6.5))))
+    return {
+        "date": day.isoformat(),
+        "sleep": {
+            "hours": sleep_hours,
+            "quality": _QUALITIES[min(3, max(0, int((sleep_hours - 4.5) / 1.5)))],
+            "awakenings": rng.randint(0, 4),
+        },
+        "diet": {
+            "generalDiet": rng.choice(["balanced", "takeaway", "light"]),
+            "sugarConsumption": rng.choice(_LEVELS),
+            "caffeineIntake": rng.choice(_LEVELS),
+            "alcoholConsumption": rng.choice(["none", "low", "moderate"]),
+            "waterIntake": rng.choice(_LEVELS),
+        },
+        "exercise": {
+            "duration": exercise,
+            "type": "none" if exercise == 0 else rng.choice(_EXERCISE_TYPES[:-1]),
+            "intensity": "low" if exercise == 0 else rng.choice(_INTENSITIES),
+        },
+        "mood": {
+            "overall": max(1, min(10, 11 - stress + rng.randint(-1, 1))),
+            "specificMood": rng.sample(_MOODS, 2),
+            "stressLevel": stress,
+        },
+        "creativeTime": rng.choice([0, 15, 30, 60]),
+        "socialInteractions": rng.randint(0, 6),
+        "screenTime": rng.randint(60, 480),
+        "dailySpending": rng.randint(0, 150),
+        "feelingAboutFinances": rng.choice(["worried", "neutral", "comfortable"]),
+        "timeOutside": rng.choice([0, 15, 30, 60, 120]),
+        "dailyGratitude": rng.sample(["family", "sunshine", "a good book", "coffee", "my dog"], 2),
+        "dailyJournal": " ".join(rng.sample(_JOURNAL_SENTENCES, 3)),
+    }
+
+
+def make_entries(count: int, end: Optional[date] = None, seed: int = 0) -> List[Dict]:
+    """Returns `count` consecutive daily entries ending at `end` (today by default), oldest first."""
+    rng = random.Random(seed)
+    end = end or date.today()
+    first = end - timedelta(days=count - 1)
+    return [make_entry(first + timedelta(days=offset), rng) for offset in range(count)]
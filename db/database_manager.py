@@ -1,14 +1,47 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
-from typing import Dict, List, Optional
+import copy
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from google.cloud.firestore_v1 import transactional
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from db.rollups import (
+    MONTHLY, ROLLUP_COLLECTIONS, WEEKLY, apply_change, build_rollup, empty_rollup, period_keys, period_range,
+    rollup_update,
+)
 from pydantic import BaseModel
+from models.user_context import UserContext
+from utils.entry_store import EntryStore
+from utils.entry_utils import is_valid_date
+from utils.metrics import timed
+
+MAX_BATCH_WRITES = 500  # Firestore limit on operations per WriteBatch
+DEFAULT_BULK_PARALLELISM = 4
+DEFAULT_READ_PARALLELISM = 8
+DEFAULT_PAGE_SIZE = 500  # journal entries per query when reading page by page
+# attempts at a journal write transaction; entries of the same week or month contend for its rollups
+TRANSACTION_ATTEMPTS = 10
 
 class DatabaseManager:
     """Handles Firebase Firestore database operations."""
 
-    def __init__(self, service_account_key_path: str):
-        """Initializes the DatabaseManager."""
+    def __init__(self, service_account_key_path: Optional[str] = None, db=None):
+        """
+        Initializes the DatabaseManager.
+
+        An already-built Firestore client (for example one pointed at the emulator, or a
+        local stand-in) can be passed as `db` instead of a service account key path.
+        The Firebase Admin SDK is only imported (and initialized) in the latter case.
+        """
+        self._change_listeners: List[Callable[[str], None]] = []
+        self._entry_listeners: List[Callable[[str, List[Dict]], None]] = []
+        self._executor = ThreadPoolExecutor(max_workers=DEFAULT_READ_PARALLELISM, thread_name_prefix="firestore")
+        if db is not None:
+            self.db = db
+            return
         try:
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+
             cred = credentials.Certificate(service_account_key_path)
             firebase_admin.initialize_app(cred)
             self.db = firestore.client()
@@ -16,6 +49,32 @@ class DatabaseManager:
         except Exception as e:
             raise Exception(f"Database initialization failed: {e}")
 
+    def add_change_listener(self, listener: Callable[[str], None]):
+        """Registers a callback that receives the user ID whenever that user's data is written."""
+        self._change_listeners.append(listener)
+
+    def _notify_change(self, user_id: str):
+        """Tells every registered listener that the user's stored data has changed."""
+        for listener in self._change_listeners:
+            listener(user_id)
+
+    def add_entry_listener(self, listener: Callable[[str, List[Dict]], None]):
+        """Registers a callback that receives the user ID and the journal entries written for them."""
+        self._entry_listeners.append(listener)
+
+    def _notify_entries(self, user_id: str, journal_entries: List[Dict]):
+        """
+        Tells every registered entry listener which of the user's journal entries were written.
+
+        The entries are already stored, so a failing listener is logged rather than raised.
+        """
+        for listener in self._entry_listeners:
+            try:
+                listener(user_id, journal_entries)
+            except Exception as e:
+                print(f"Warning: entry listener failed for user {user_id}: {e}")
+
+    @timed("firestore")
     def get_user_data(self, user_id: str) -> Optional[Dict]:
         """Retrieves user data from Firestore."""
         try:
@@ -27,6 +86,7 @@ class DatabaseManager:
         except Exception as e:
             raise Exception(f"Failed to retrieve user data: {e}")
 
+    @timed("firestore")
     def get_user_journal_entries(self, user_id: str) -> Optional[List[Dict]]:
         """Retrieves user's journal entries from Firestore and returns a list of dictionaries."""
         try:
@@ -41,40 +101,447 @@ class DatabaseManager:
         except Exception as e:
             raise Exception(f"Failed to retrieve journal entries: {e}")
 
+    @timed("firestore")
+    def get_user_journal_entries_in_range(self, user_id: str, start_date: str, end_date: str) -> List[Dict]:
+        """
+        Retrieves the user's journal entries dated between start_date and end_date (inclusive).
+
+        The filter runs server-side on the ISO 'yyyy-mm-dd' `date` field, which sorts
+        lexicographically, so only the documents inside the range are read.
+        """
+        try:
+            return [doc.to_dict() for doc in self._journal_entries_query(user_id, start_date, end_date).stream()]
+        except Exception as e:
+            raise Exception(f"Failed to retrieve journal entries in range: {e}")
+
+    def _journal_entries_query(self, user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                               fields: Optional[List[str]] = None):
+        """
+        Builds the query for the user's journal entries in a date range, ordered by date.
+
+        Dates are compared as strings, so a bound that is not a zero-padded 'yyyy-mm-dd'
+        date would silently select the wrong entries and raises ValueError instead.
+        """
+        for bound in (start_date, end_date):
+            if bound is not None and not is_valid_date(bound):
+                raise ValueError(f"Invalid date {bound!r}, expected 'yyyy-mm-dd'")
+        query = self.db.collection("users").document(user_id).collection("journalEntries")
+        if start_date is not None:
+            query = query.where(filter=FieldFilter("date", ">=", start_date))
+        if end_date is not None:
+            query = query.where(filter=FieldFilter("date", "<=", end_date))
+        if fields is not None:
+            # the date orders the pages and keys the entries, so it is always read
+            query = query.select(["date"] + [field for field in fields if field != "date"])
+        return query.order_by("date")
+
+    @timed("firestore")
+    def get_user_journal_entries_page(self, user_id: str, page_size: int = DEFAULT_PAGE_SIZE,
+                                      start_after: Optional[str] = None, start_date: Optional[str] = None,
+                                      end_date: Optional[str] = None,
+                                      fields: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Retrieves one page of the user's journal entries, oldest first.
+
+        Args:
+            user_id: The user whose entries are read.
+            page_size: The most entries returned.
+            start_after: The token returned with the previous page, or None for the first page.
+            start_date: If given, the first 'yyyy-mm-dd' date to read.
+            end_date: If given, the last 'yyyy-mm-dd' date to read.
+            fields: Dotted field paths to read, such as 'sleep.hours'; 'date' is always
+                included. By default whole documents are read, including the free-text
+                fields that make up most of their size.
+
+        Returns:
+            The entries, and the token for the next page, which is None after the last page.
+        """
+        try:
+            query = self._journal_entries_query(user_id, start_date, end_date, fields)
+            if start_after is not None:
+                query = query.start_after({"date": start_after})
+            journal_entries = [doc.to_dict() for doc in query.limit(page_size).stream()]
+        except Exception as e:
+            raise Exception(f"Failed to retrieve journal entry page: {e}")
+        # the token is the date of the last entry, which is also its document ID
+        next_token = journal_entries[-1]["date"] if len(journal_entries) == page_size else None
+        return journal_entries, next_token
+
+    def iter_user_journal_entries(self, user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                  fields: Optional[List[str]] = None,
+                                  page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict]:
+        """
+        Yields the user's journal entries oldest first, reading them a page at a time.
+
+        At most `page_size` entries are held at once however long the history is, and
+        no query stays open while the caller works through a page. The arguments are
+        those of get_user_journal_entries_page.
+        """
+        token = None
+        while True:
+            journal_entries, token = self.get_user_journal_entries_page(
+                user_id, page_size, token, start_date, end_date, fields
+            )
+            yield from journal_entries
+            if token is None:
+                return
+
+    @timed("firestore")
+    def get_user_entry_store(self, user_id: str, start_date: Optional[str] = None,
+                             end_date: Optional[str] = None, fields: Optional[List[str]] = None,
+                             page_size: int = DEFAULT_PAGE_SIZE) -> EntryStore:
+        """
+        Retrieves the user's journal entries into a columnar EntryStore.
+
+        Entries are read a page at a time and decoded one at a time into the store's
+        columns, so the entry dictionaries are never all held at once.
+
+        Args:
+            user_id: The user whose entries are read.
+            start_date: If given with end_date, the first 'yyyy-mm-dd' date to read.
+            end_date: If given with start_date, the last 'yyyy-mm-dd' date to read.
+            fields: Dotted field paths to read (see get_user_journal_entries_page); by
+                default whole entries are read.
+            page_size: The entries read per query.
+
+        Returns:
+            The entries, sorted by date.
+        """
+        if start_date is None or end_date is None:
+            start_date = end_date = None
+        try:
+            return EntryStore.from_entries(
+                self.iter_user_journal_entries(user_id, start_date, end_date, fields, page_size)
+            )
+        except Exception as e:
+            raise Exception(f"Failed to retrieve journal entry store: {e}")
+
+    @timed("firestore")
+    def get_recent_journal_entries(self, user_id: str, count: int) -> List[Dict]:
+        """Retrieves the user's `count` latest journal entries, newest first."""
+        try:
+            query = (
+                self.db.collection("users").document(user_id).collection("journalEntries")
+                .order_by("date", direction="DESCENDING")
+                .limit(count)
+            )
+            return [doc.to_dict() for doc in query.stream()]
+        except Exception as e:
+            raise Exception(f"Failed to retrieve recent journal entries: {e}")
+
+    @timed("firestore")
+    def get_journal_entries_by_date(self, user_id: str, dates: List[str]) -> List[Dict]:
+        """
+        Retrieves the user's journal entries for the given dates in one round trip.
+
+        Returns:
+            The entries in the order of `dates`, leaving out dates with no entry.
+        """
+        if not dates:
+            return []
+        try:
+            entries_ref = self.db.collection("users").document(user_id).collection("journalEntries")
+            snapshots = {
+                snapshot.id: snapshot.to_dict()
+                for snapshot in self.db.get_all([entries_ref.document(date) for date in dates])
+                if snapshot.exists
+            }
+        except Exception as e:
+            raise Exception(f"Failed to retrieve journal entries by date: {e}")
+        return [snapshots[date] for date in dates if date in snapshots]
+
+    @timed("firestore")
     def update_user_data(self, user_id: str, data: Dict):
         """Updates user data in Firestore."""
         try:
             self.db.collection("users").document(user_id).set(data)
+            self._notify_change(user_id)
         except Exception as e:
             raise Exception(f"Failed to update user data: {e}")
 
+    @timed("firestore")
     def add_journal_entry(self, user_id: str, journal_entry: Dict):
-        """Adds a single journal entry to a user's collection in Firestore."""
+        """
+        Adds a single journal entry to a user's collection in Firestore.
+
+        The entry and the weekly and monthly rollups it falls in are written in one
+        transaction, so concurrent writes cannot lose rollup updates and a failure leaves
+        neither written.
+        """
         try:
-            user_ref = self.db.collection("users").document(user_id)
-            user_ref.collection("journalEntries").document(journal_entry["date"]).set(journal_entry)
+            self._commit_journal_entries(user_id, [journal_entry])
         except Exception as e:
             raise Exception(f"Failed to add journal entry: {e}")
+        self._notify_change(user_id)
+        self._notify_entries(user_id, [journal_entry])
+
+    @timed("firestore")
+    def add_journal_entries_bulk(self, user_id: str, journal_entries: List[Dict],
+                                 max_parallel_batches: int = DEFAULT_BULK_PARALLELISM) -> List[Dict]:
+        """
+        Adds many journal entries to a user's collection in transactions of up to 500 writes.
+
+        Each transaction writes a chunk of entries together with the weekly and monthly
+        rollups they fall in, and up to `max_parallel_batches` chunks are committed
+        concurrently. When several entries share a date only the last one is written, as
+        with repeated add_journal_entry calls. A chunk commits atomically, so if it fails
+        every entry in it is reported and none of them is counted in the rollups.
+
+        Returns:
+            A list of {"date": ..., "error": ...} dictionaries for the entries that were
+            not written; empty when everything succeeded.
+        """
+        entries_by_date = {entry["date"]: entry for entry in journal_entries}
+        entries = list(entries_by_date.values())
+        if not entries:
+            return []
+        # each chunk's entries and the rollup documents they touch must fit in one commit
+        chunks: List[List[Dict]] = []
+        chunk_periods: set = set()
+        for entry in sorted(entries, key=lambda entry: entry["date"]):
+            periods = set(period_keys(entry["date"]))
+            if not chunks or len(chunks[-1]) + 1 + len(chunk_periods | periods) > MAX_BATCH_WRITES:
+                chunks.append([])
+                chunk_periods = set()
+            chunks[-1].append(entry)
+            chunk_periods |= periods
+
+        failures = []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel_batches, len(chunks)))) as executor:
+            futures = {executor.submit(self._commit_journal_entries, user_id, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.extend(
+                        {"date": entry["date"], "error": f"Failed to add journal entry: {e}"}
+                        for entry in futures[future]
+                    )
+        if len(failures) < len(entries):
+            failed_dates = {failure["date"] for failure in failures}
+            self._notify_change(user_id)
+            self._notify_entries(user_id, [entry for entry in entries if entry["date"] not in failed_dates])
+        return failures
 
+    def _commit_journal_entries(self, user_id: str, journal_entries: List[Dict]):
+        """
+        Writes journal entries and applies them to the user's rollups in one transaction.
+
+        The transaction reads what each date held before and the rollup documents of the
+        periods involved, then writes the entries and, per period, Increment transforms
+        for the counts and sums with the new min and max. A period whose min or max can
+        no longer be maintained incrementally is rebuilt from its entries, read in the
+        same transaction. A concurrent write to any document read makes Firestore run the
+        transaction again, up to TRANSACTION_ATTEMPTS times.
+        """
+        user_ref = self.db.collection("users").document(user_id)
+        entries_ref = user_ref.collection("journalEntries")
+
+        @transactional
+        def commit(transaction):
+            entry_refs = [entries_ref.document(entry["date"]) for entry in journal_entries]
+            old_entries = {
+                snapshot.id: snapshot.to_dict()
+                for snapshot in self.db.get_all(entry_refs, transaction=transaction) if snapshot.exists
+            }
+            changes_by_period: Dict[Tuple[str, str], List[Tuple[Optional[Dict], Dict]]] = {}
+            for entry in journal_entries:
+                for period_key in period_keys(entry["date"]):
+                    changes_by_period.setdefault(period_key, []).append((old_entries.get(entry["date"]), entry))
+            rollup_refs = {key: user_ref.collection(key[0]).document(key[1]) for key in changes_by_period}
+            stored = {
+                snapshot.reference.path: snapshot.to_dict()
+                for snapshot in self.db.get_all(list(rollup_refs.values()), transaction=transaction)
+                if snapshot.exists
+            }
+
+            rollup_writes = []
+            for (collection, period), period_changes in changes_by_period.items():
+                rollup_ref = rollup_refs[(collection, period)]
+                before = {**empty_rollup(period), **stored.get(rollup_ref.path, {})}
+                rollup = copy.deepcopy(before)
+                exact = True
+                for old_entry, new_entry in period_changes:
+                    exact = apply_change(rollup, old_entry, new_entry) and exact
+                if exact:
+                    rollup_writes.append((rollup_ref, rollup_update(before, rollup), True))
+                    continue
+                period_entries = {
+                    doc.id: doc.to_dict() for doc in self._journal_entries_query(
+                        user_id, *period_range(collection, period)
+                    ).stream(transaction=transaction)
+                }
+                period_entries.update((new_entry["date"], new_entry) for _, new_entry in period_changes)
+                rollup_writes.append((rollup_ref, build_rollup(period, period_entries.values()), False))
+
+            # Firestore transactions must do every read before the first write
+            for entry_ref, entry in zip(entry_refs, journal_entries):
+                transaction.set(entry_ref, entry)
+            for rollup_ref, data, merge in rollup_writes:
+                transaction.set(rollup_ref, data, merge=merge)
+
+        commit(self.db.transaction(max_attempts=TRANSACTION_ATTEMPTS))
+
+    def _write_rollups(self, user_ref, rollups: Dict[Tuple[str, str], Dict]):
+        """Writes rollup documents in batches of at most 500."""
+        items = list(rollups.items())
+        for start in range(0, len(items), MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for (collection, period), rollup in items[start:start + MAX_BATCH_WRITES]:
+                batch.set(user_ref.collection(collection).document(period), rollup)
+            batch.commit()
+
+    @timed("firestore")
+    def rebuild_user_rollups(self, user_id: str) -> int:
+        """
+        Recomputes every weekly and monthly rollup of a user from their journal entries.
+
+        Rollup documents for periods that no longer have entries are deleted.
+
+        Returns:
+            The number of rollup documents written.
+        """
+        try:
+            entries_by_period: Dict[Tuple[str, str], List[Dict]] = {}
+            for entry in self.get_user_journal_entries(user_id) or []:
+                for period_key in period_keys(entry["date"]):
+                    entries_by_period.setdefault(period_key, []).append(entry)
+            rollups = {key: build_rollup(key[1], entries) for key, entries in entries_by_period.items()}
+
+            user_ref = self.db.collection("users").document(user_id)
+            self._write_rollups(user_ref, rollups)
+            for collection in ROLLUP_COLLECTIONS:
+                for doc in user_ref.collection(collection).select([]).stream():
+                    if (collection, doc.id) not in rollups:
+                        doc.reference.delete()
+            return len(rollups)
+        except Exception as e:
+            raise Exception(f"Failed to rebuild rollups: {e}")
+
+    @timed("firestore")
+    def get_user_rollups(self, user_id: str, granularity: str, start_period: Optional[str] = None,
+                         end_period: Optional[str] = None) -> List[Dict]:
+        """
+        Retrieves the user's rollup documents for a range of periods (inclusive).
+
+        Args:
+            user_id: The user to read.
+            granularity: "week" (periods like '2024-W05') or "month" (periods like '2024-01').
+            start_period: If given, the first period to return.
+            end_period: If given, the last period to return.
+
+        Returns:
+            The rollup documents in period order.
+        """
+        collections = {"week": WEEKLY, "month": MONTHLY}
+        if granularity not in collections:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        try:
+            query = self.db.collection("users").document(user_id).collection(collections[granularity])
+            if start_period is not None:
+                query = query.where(filter=FieldFilter("period", ">=", start_period))
+            if end_period is not None:
+                query = query.where(filter=FieldFilter("period", "<=", end_period))
+            return [doc.to_dict() for doc in query.order_by("period").stream()]
+        except Exception as e:
+            raise Exception(f"Failed to retrieve rollups: {e}")
+
+    @timed("firestore")
+    def get_user_ids_page(self, page_size: int = DEFAULT_PAGE_SIZE,
+                          start_after: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """
+        Retrieves one page of the IDs in the users collection, in ID order, without reading the documents' contents.
+
+        Args:
+            page_size: The most IDs returned.
+            start_after: The token returned with the previous page, or None for the first page.
+
+        Returns:
+            The IDs, and the token for the next page, which is None after the last page.
+        """
+        try:
+            query = self.db.collection("users").select([]).order_by(FieldPath.document_id())
+            if start_after is not None:
+                query = query.start_after({FieldPath.document_id(): start_after})
+            user_ids = [doc.id for doc in query.limit(page_size).stream()]
+        except Exception as e:
+            raise Exception(f"Failed to list users: {e}")
+        next_token = user_ids[-1] if len(user_ids) == page_size else None
+        return user_ids, next_token
+
+    def iter_user_ids(self, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[str]:
+        """Yields the IDs in the users collection, reading them a page at a time."""
+        token = None
+        while True:
+            user_ids, token = self.get_user_ids_page(page_size, token)
+            yield from user_ids
+            if token is None:
+                return
+
+    @timed("firestore")
+    def store_insights_report(self, user_id: str, report: Dict):
+        """Stores the user's latest correlation report, replacing the previous one."""
+        try:
+            self.db.collection("users").document(user_id).collection("insights").document("correlations").set(report)
+        except Exception as e:
+            raise Exception(f"Failed to store insights report: {e}")
+
+    @timed("firestore")
+    def get_insights_report(self, user_id: str) -> Optional[Dict]:
+        """Retrieves the user's latest correlation report, or None if none has been generated."""
+        try:
+            doc = self.db.collection("users").document(user_id).collection("insights").document("correlations").get()
+            return doc.to_dict() if doc.exists else None
+        except Exception as e:
+            raise Exception(f"Failed to retrieve insights report: {e}")
+
+    @timed("firestore")
     def get_user_persona(self, user_id: str) -> Optional[Dict]:
         """Retrieves user persona data from Firestore and returns a dictionary."""
         try:
-            doc = self.db.collection("users").document(user_id).get() #assuming your user collection is called 'users'
-            if doc.exists:
-                data = doc.to_dict()
-                if "user_persona" in data and data["user_persona"] is not None:
-                    return data["user_persona"]
-                else:
-                    return None
-            else:
-                return None
+            data = self.get_user_data(user_id)
+            return data.get("user_persona") if data else None
         except Exception as e:
             raise Exception(f"Failed to retrieve user persona: {e}")
 
+    @timed("firestore")
+    def get_user_context(self, user_id: str, recent_entries: Optional[int] = None,
+                         weekly_rollups: bool = False) -> UserContext:
+        """
+        Retrieves the user document and the user's journal entries concurrently.
+
+        Callers that need the profile, persona and entries together should use this
+        instead of separate get_user_data / get_user_persona / get_user_journal_entries
+        calls, which would read the user document more than once and one after another.
+        With `recent_entries`, only that many of the latest entries are read, newest first.
+        With `weekly_rollups`, every weekly rollup of the user is read alongside them.
+        """
+        try:
+            profile_future = self._executor.submit(self.get_user_data, user_id)
+            if recent_entries is None:
+                entries_future = self._executor.submit(self.get_user_journal_entries, user_id)
+            else:
+                entries_future = self._executor.submit(self.get_recent_journal_entries, user_id, recent_entries)
+            rollups_future = self._executor.submit(self.get_user_rollups, user_id, "week") if weekly_rollups else None
+            profile = profile_future.result()
+            journal_entries = entries_future.result() or []
+            rollups = rollups_future.result() if rollups_future is not None else []
+        except Exception as e:
+            raise Exception(f"Failed to retrieve user context: {e}")
+        return UserContext(
+            user_id=user_id,
+            profile=profile,
+            persona=profile.get("user_persona") if profile else None,
+            journal_entries=journal_entries,
+            weekly_rollups=rollups,
+        )
+
+    @timed("firestore")
     def store_user_persona(self, user_persona: Dict, user_id: str):
         """Stores user persona data within the User document in Firestore."""
         try:
             user_ref = self.db.collection("users").document(user_id) #assuming your user collection is called 'users'
             user_ref.update({"user_persona": user_persona}) #store the user persona as a dictionary
+            self._notify_change(user_id)
         except Exception as e:
             raise Exception(f"Failed to store user persona: {e}")
\ No newline at end of file
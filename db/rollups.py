@@ -0,0 +1,195 @@
+"""
+Weekly and monthly rollups of the numeric journal fields.
+
+Each rollup document holds, per field, the sum, count, min and max of the values in
+its period, so averages and ranges over months can be read from a handful of
+documents instead of every entry. DatabaseManager keeps them up to date on write, in
+the same transaction as the entries; this module holds the arithmetic and a command
+to rebuild them for existing users:
+
+    python -m db.rollups --service-account serviceAccountKey.json [--user USER_ID ...]
+"""
+import argparse
+import calendar
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from google.cloud.firestore_v1 import DELETE_FIELD, Increment
+
+from models.journal_entry import NUMERIC_FIELDS
+
+WEEKLY = "weeklyRollups"
+MONTHLY = "monthlyRollups"
+ROLLUP_COLLECTIONS = (WEEKLY, MONTHLY)
+
+
+def stat_name(field: str) -> str:
+    """Returns the rollup key for a dotted field path (Firestore map keys cannot contain dots)."""
+    return field.replace(".", "_")
+
+
+def numeric_values(journal_entry: Optional[Dict]) -> Dict[str, float]:
+    """
+    Extracts the numeric fields of a journal entry.
+
+    Args:
+        journal_entry: A journal entry dictionary, or None.
+
+    Returns:
+        A dictionary from rollup key to value, skipping missing and non-numeric fields.
+    """
+    values = {}
+    if not journal_entry:
+        return values
+    for field in NUMERIC_FIELDS:
+        value = journal_entry
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[stat_name(field)] = value
+    return values
+
+
+def period_keys(date_str: str) -> List[Tuple[str, str]]:
+    """
+    Returns the rollup documents a 'yyyy-mm-dd' date contributes to.
+
+    Args:
+        date_str: The entry date.
+
+    Returns:
+        (collection, period) pairs, e.g. [("weeklyRollups", "2024-W05"), ("monthlyRollups", "2024-01")].
+    """
+    day = date.fromisoformat(date_str)
+    year, week, _ = day.isocalendar()
+    return [(WEEKLY, f"{year}-W{week:02d}"), (MONTHLY, f"{day.year}-{day.month:02d}")]
+
+
+def period_range(collection: str, period: str) -> Tuple[str, str]:
+    """Returns the first and last 'yyyy-mm-dd' dates covered by a rollup period."""
+    if collection == WEEKLY:
+        year, week = period.split("-W")
+        first = date.fromisocalendar(int(year), int(week), 1)
+        return first.isoformat(), (first + timedelta(days=6)).isoformat()
+    year, month = (int(part) for part in period.split("-"))
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, 1).isoformat(), date(year, month, last_day).isoformat()
+
+
+def empty_rollup(period: str) -> Dict:
+    """Returns a rollup document with no entries in it."""
+    return {"period": period, "entryCount": 0, "fields": {}}
+
+
+def build_rollup(period: str, journal_entries: Iterable[Dict]) -> Dict:
+    """
+    Computes a rollup document from scratch.
+
+    Args:
+        period: The period key the entries belong to.
+        journal_entries: The journal entries dated inside the period.
+
+    Returns:
+        The rollup document.
+    """
+    rollup = empty_rollup(period)
+    for entry in journal_entries:
+        apply_change(rollup, None, entry)
+    return rollup
+
+
+def apply_change(rollup: Dict, old_entry: Optional[Dict], new_entry: Optional[Dict]) -> bool:
+    """
+    Updates a rollup in place for an entry being created, overwritten or removed.
+
+    The old entry's values are subtracted and the new entry's added, so writing the same
+    entry twice leaves the rollup unchanged. Sums and counts always update incrementally;
+    a min or max cannot be recovered once the value holding it is removed, so that case
+    is reported and the caller should rebuild the period.
+
+    Args:
+        rollup: The rollup document to update.
+        old_entry: The entry previously stored for the date, or None.
+        new_entry: The entry now stored for the date, or None if it was removed.
+
+    Returns:
+        True if the rollup is exact, False if it must be rebuilt from its entries.
+    """
+    exact = True
+    old_values = numeric_values(old_entry)
+    new_values = numeric_values(new_entry)
+    rollup["entryCount"] += (new_entry is not None) - (old_entry is not None)
+    fields = rollup["fields"]
+    for name in old_values.keys() | new_values.keys():
+        old_value = old_values.get(name)
+        new_value = new_values.get(name)
+        if old_value == new_value:
+            continue
+        stats = fields.setdefault(name, {"sum": 0, "count": 0, "min": None, "max": None})
+        if old_value is not None:
+            stats["sum"] -= old_value
+            stats["count"] -= 1
+            if old_value == stats["min"] or old_value == stats["max"]:
+                exact = False
+        if new_value is not None:
+            stats["sum"] += new_value
+            stats["count"] += 1
+            stats["min"] = new_value if stats["min"] is None else min(stats["min"], new_value)
+            stats["max"] = new_value if stats["max"] is None else max(stats["max"], new_value)
+        if stats["count"] <= 0:
+            del fields[name]
+    return exact
+
+
+def rollup_update(before: Dict, after: Dict) -> Dict:
+    """
+    Returns the set(merge=True) data that turns a stored rollup into an updated one.
+
+    Counts and sums are written as Increment transforms, so they add up correctly
+    whatever else is applied to the document; min and max are written as values, which
+    is only safe when `before` was read in the same transaction. Fields left with no
+    values are deleted.
+
+    Args:
+        before: The rollup document as stored, or an empty rollup if there is none.
+        after: The same rollup with the changes applied (see apply_change).
+
+    Returns:
+        The merge data for the rollup document.
+    """
+    update = {"period": after["period"], "entryCount": Increment(after["entryCount"] - before["entryCount"])}
+    fields = {}
+    for name in before["fields"].keys() | after["fields"].keys():
+        old_stats = before["fields"].get(name, {"sum": 0, "count": 0})
+        new_stats = after["fields"].get(name)
+        if new_stats is None:
+            fields[name] = DELETE_FIELD
+        elif new_stats != old_stats:
+            fields[name] = {
+                "sum": Increment(new_stats["sum"] - old_stats["sum"]),
+                "count": Increment(new_stats["count"] - old_stats["count"]),
+                "min": new_stats["min"],
+                "max": new_stats["max"],
+            }
+    if fields:
+        update["fields"] = fields
+    return update
+
+
+def main():
+    from db.database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Rebuild weekly and monthly journal rollups.")
+    parser.add_argument("--service-account", default="serviceAccountKey.json", help="Firebase service account key")
+    parser.add_argument("--user", action="append", dest="users", help="User ID to rebuild (default: every user)")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.service_account)
+    user_ids = args.users or db_manager.iter_user_ids()
+    for user_id in user_ids:
+        written = db_manager.rebuild_user_rollups(user_id)
+        print(f"{user_id}: {written} rollup documents")
+
+
+if __name__ == "__main__":
+    main()
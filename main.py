@@ -1,19 +1,496 @@
+import asyncio
 import json
+import math
+import os
+import threading
+import time
 import traceback
-from typing import Dict, List
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from ai.gemini import Gemini
-from ai.prompt import get_correlation_prompt_cot, get_initial_chat_prompt
-from db.database_manager import DatabaseManager
-from key import getKey
-from utils.entry_utils import get_entries_by_date_range
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Dict, List, Mapping, Optional, Tuple
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from ai.context_cache import DEFAULT_PROMPT_CACHE_SIZE, PromptContextCache
+from ai.history_compactor import DEFAULT_KEEP_RECENT_TURNS, HistoryCompactor
+from ai.persona_jobs import DEFAULT_PERSONA_WORKERS, PersonaJobQueue, PersonaUpdater
+from ai.resilience import (
+    DEFAULT_BREAKER_FAILURE_RATIO, DEFAULT_BREAKER_RESET, DEFAULT_CALL_DEADLINE, DEFAULT_CALL_TIMEOUT, DEFAULT_MAX_ATTEMPTS,
+    CircuitBreaker, ModelUnavailableError, ResilientCaller,
+)
+from ai.response_cache import DEFAULT_RESPONSE_CACHE_SIZE, DEFAULT_RESPONSE_TTL, ResponseCache
+from ai.session_store import DEFAULT_MAX_SESSIONS, DEFAULT_SESSION_TTL, InMemorySessionStore, SQLiteSessionStore
+from ai.prompt import (
+    get_correlation_findings_prompt, get_correlation_prompt_cot, get_initial_chat_prompt, get_relevant_entries_prompt,
+)
+from ai.prompt_builder import (
+    DEFAULT_ENTRY_TOKEN_BUDGET, DEFAULT_RECENT_ENTRIES, DEFAULT_WEEKLY_SUMMARIES, rollup_summaries,
+)
+from models.journal_entry import JournalEntry
+from utils.entry_utils import is_valid_date
+from utils.metrics import REGISTRY, REQUEST_SECONDS, Registry
+from utils.rate_limiter import (
+    DEFAULT_BURST, DEFAULT_MAX_WAIT, Quota, RateLimitExceeded, TokenBucketLimiter,
+)
+from utils.single_flight import SingleFlight
+
+# The Gemini and Firestore SDKs (and NumPy) take most of a second to import, so the
+# modules that need them are imported when their client is first used, not here.
 
 SERVICE_ACCOUNT_KEY_PATH = "serviceAccountKey.json"
 
-app = FastAPI()
-db_manager = DatabaseManager(SERVICE_ACCOUNT_KEY_PATH)
-gemini_client = Gemini(getKey())
+
+class Settings:
+    """
+    The configuration of one app, read from environment variables when it is created.
+
+    Services read their settings when they are built rather than when this module is
+    imported, so apps in one process can be configured independently. Keyword
+    arguments override the environment, e.g. `Settings(retrieved_entries=3)`.
+    """
+
+    def __init__(self, env: Optional[Mapping[str, str]] = None, **overrides):
+        env = os.environ if env is None else env
+        # upper bound on concurrent model calls per worker process (default ai.gemini.DEFAULT_MAX_IN_FLIGHT)
+        self.gemini_max_in_flight = int(env["GEMINI_MAX_IN_FLIGHT"]) if env.get("GEMINI_MAX_IN_FLIGHT") else None
+        # set CHAT_SESSION_DB to a SQLite path to share chat sessions between worker processes
+        self.chat_session_db = env.get("CHAT_SESSION_DB")
+        self.chat_session_ttl = float(env.get("CHAT_SESSION_TTL", DEFAULT_SESSION_TTL))
+        self.max_chat_sessions = int(env.get("MAX_CHAT_SESSIONS", DEFAULT_MAX_SESSIONS))
+        # token budget for the journal entries inlined into the start-chat prompt
+        self.prompt_entry_token_budget = int(env.get("PROMPT_ENTRY_TOKEN_BUDGET", DEFAULT_ENTRY_TOKEN_BUDGET))
+        # set to 1 to stand in for the weeks of entries over that budget with summaries of
+        # their weekly rollups, instead of only counting them
+        self.prompt_weekly_summaries = env.get("PROMPT_WEEKLY_SUMMARIES", str(int(DEFAULT_WEEKLY_SUMMARIES))) == "1"
+        self.prompt_cache_size = int(env.get("PROMPT_CACHE_SIZE", DEFAULT_PROMPT_CACHE_SIZE))
+        # invalidation is per process, so with several workers a write only clears the
+        # cache of the worker that handled it; the TTL bounds how stale the others get
+        self.prompt_cache_ttl = float(env.get("PROMPT_CACHE_TTL", 300))
+        self.response_cache_size = int(env.get("RESPONSE_CACHE_SIZE", DEFAULT_RESPONSE_CACHE_SIZE))
+        self.response_cache_ttl = float(env.get("RESPONSE_CACHE_TTL", DEFAULT_RESPONSE_TTL))
+        # optional SQLite path for a response cache tier that survives restarts
+        self.response_cache_db = env.get("RESPONSE_CACHE_DB")
+        # once a chat's history after its opening prompt is estimated above this many tokens,
+        # older turns are rolled into a summary in the background; 0 keeps full histories
+        self.history_compaction_tokens = int(env.get("HISTORY_COMPACTION_TOKENS", 0))
+        self.history_keep_recent_turns = int(env.get("HISTORY_KEEP_RECENT_TURNS", DEFAULT_KEEP_RECENT_TURNS))
+        # persona updates for finished chats are queued here and run by background workers
+        self.persona_queue_db = env.get("PERSONA_QUEUE_DB", "persona_jobs.db")
+        self.persona_workers = int(env.get("PERSONA_WORKERS", DEFAULT_PERSONA_WORKERS))
+        # seconds one model call attempt may take, and a call including its retries
+        self.gemini_call_timeout = float(env.get("GEMINI_CALL_TIMEOUT", DEFAULT_CALL_TIMEOUT))
+        self.gemini_call_deadline = float(env.get("GEMINI_CALL_DEADLINE", DEFAULT_CALL_DEADLINE))
+        self.gemini_max_attempts = int(env.get("GEMINI_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+        # share of recent attempts failing that stops model calls for GEMINI_BREAKER_RESET seconds
+        self.gemini_breaker_failure_ratio = float(
+            env.get("GEMINI_BREAKER_FAILURE_RATIO", DEFAULT_BREAKER_FAILURE_RATIO)
+        )
+        self.gemini_breaker_reset = float(env.get("GEMINI_BREAKER_RESET", DEFAULT_BREAKER_RESET))
+        # hedge generate_content calls that run past this quantile of recent latencies
+        # (e.g. 0.95); 0 never sends a second request
+        self.gemini_hedge_quantile = float(env.get("GEMINI_HEDGE_QUANTILE", 0))
+        # model-backed requests each user may make per minute, and how many may come at once;
+        # 0, the default, turns the limit off. A request over the quota queues for up to
+        # USER_RATE_MAX_WAIT seconds before it is refused with a 429
+        self.user_rate_per_minute = float(env.get("USER_RATE_PER_MINUTE", 0))
+        self.user_rate_burst = int(env.get("USER_RATE_BURST", DEFAULT_BURST))
+        self.user_rate_max_wait = float(env.get("USER_RATE_MAX_WAIT", DEFAULT_MAX_WAIT))
+        # per-user quotas as JSON, e.g. {"user-1": [120, 20]} for 120 a minute in bursts of 20
+        self.user_rate_quotas = {
+            user_id: Quota(*quota) for user_id, quota in json.loads(env.get("USER_RATE_QUOTAS", "{}")).items()
+        }
+        # retrieval mode: start chats with the RECENT_ENTRIES latest journal entries plus the
+        # RETRIEVED_ENTRIES older ones most related to them, and add up to RETRIEVED_ENTRIES
+        # related entries to each message; 0 puts the whole history (within the token budget)
+        # into the start-chat prompt instead
+        self.retrieved_entries = int(env.get("RETRIEVED_ENTRIES", 0))
+        self.recent_entries = int(env.get("RECENT_ENTRIES", DEFAULT_RECENT_ENTRIES))
+        # Gemini embedding model for the entry index, e.g. text-embedding-004; by default
+        # entries are embedded locally by hashing their words
+        self.embedding_model = env.get("EMBEDDING_MODEL")
+        self.entry_index_users = int(env.get("ENTRY_INDEX_USERS", 256))
+        self.entry_index_ttl = float(env.get("ENTRY_INDEX_TTL", 3600))
+        # set ENTRY_INDEX_APPROXIMATE=1 to search long histories by hyperplane signatures first
+        self.entry_index_approximate = env.get("ENTRY_INDEX_APPROXIMATE") == "1"
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise TypeError(f"Unknown setting: {name}")
+            setattr(self, name, value)
+
+
+class Services:
+    """
+    The clients, caches and background workers shared by the endpoints of one app.
+
+    The prompt cache, model call policy, rate limiter and request coalescer are cheap
+    and built with the app. The session store, response cache and persona job queue,
+    which may create SQLite files, are opened by `open` when the app starts, so
+    importing the app touches no files.
+    The Firestore and Gemini clients, and the journal entry index of retrieval mode,
+    are built on first use, which is when their SDKs and NumPy are imported, so the
+    process starts serving without them. Prebuilt SDK clients
+    (for example the fakes in benchmarks/) can be passed in for tests and load runs,
+    and without `settings` the configuration is read from the environment.
+    """
+
+    def __init__(self, firestore_client=None, genai_client=None, settings: Optional[Settings] = None):
+        self.settings = settings = settings if settings is not None else Settings()
+        self._firestore_client = firestore_client
+        self._genai_client = genai_client
+        self._lock = threading.Lock()
+        self._db_manager = None
+        self._gemini_client = None
+        self._entry_retriever = None
+        self._session_store = None
+        self._response_cache = None
+        self._persona_queue = None
+        self.prompt_cache = PromptContextCache(maxsize=settings.prompt_cache_size, ttl=settings.prompt_cache_ttl)
+        self.history_compactor = None
+        if settings.history_compaction_tokens > 0:
+            self.history_compactor = HistoryCompactor(
+                settings.history_compaction_tokens, keep_recent_turns=settings.history_keep_recent_turns
+            )
+        self.model_calls = ResilientCaller(
+            timeout=settings.gemini_call_timeout,
+            deadline=settings.gemini_call_deadline,
+            max_attempts=settings.gemini_max_attempts,
+            breaker=CircuitBreaker(settings.gemini_breaker_failure_ratio, settings.gemini_breaker_reset),
+            hedge_quantile=settings.gemini_hedge_quantile or None,
+        )
+        self.rate_limiter = None
+        if settings.user_rate_per_minute > 0 or settings.user_rate_quotas:
+            self.rate_limiter = TokenBucketLimiter(
+                Quota(settings.user_rate_per_minute, settings.user_rate_burst),
+                overrides=settings.user_rate_quotas, max_wait=settings.user_rate_max_wait,
+            )
+        self.coalescer = SingleFlight()
+        # this app's gauges and counters, rendered after the process-wide histograms
+        self.metrics = Registry(parent=REGISTRY)
+        self.persona_updater: Optional[PersonaUpdater] = None
+        self._persona_lock = asyncio.Lock()
+
+    def open(self):
+        """
+        Opens the session store, response cache and persona job queue, creating their
+        SQLite files if they are configured. The app's startup runs it off the event
+        loop; it is also run on first use, for apps served without their lifespan.
+        """
+        if self._persona_queue is None:
+            with self._lock:
+                if self._persona_queue is None:
+                    settings = self.settings
+                    if settings.chat_session_db:
+                        self._session_store = SQLiteSessionStore(
+                            settings.chat_session_db, max_sessions=settings.max_chat_sessions,
+                            ttl=settings.chat_session_ttl,
+                        )
+                    else:
+                        self._session_store = InMemorySessionStore(
+                            max_sessions=settings.max_chat_sessions, ttl=settings.chat_session_ttl
+                        )
+                    self._response_cache = ResponseCache(
+                        maxsize=settings.response_cache_size, ttl=settings.response_cache_ttl,
+                        path=settings.response_cache_db,
+                    )
+                    self._persona_queue = PersonaJobQueue(settings.persona_queue_db)
+
+    @property
+    def session_store(self):
+        """The chat session store."""
+        self.open()
+        return self._session_store
+
+    @property
+    def response_cache(self):
+        """The cache of model responses."""
+        self.open()
+        return self._response_cache
+
+    @property
+    def persona_queue(self) -> PersonaJobQueue:
+        """The queue of persona update jobs."""
+        self.open()
+        return self._persona_queue
+
+    @property
+    def db_manager(self):
+        """The DatabaseManager, initializing Firebase on first use."""
+        if self._db_manager is None:
+            # opened before taking the lock, which opening takes too
+            self.open()
+            with self._lock:
+                if self._db_manager is None:
+                    from db.database_manager import DatabaseManager
+
+                    if self._firestore_client is not None:
+                        db_manager = DatabaseManager(db=self._firestore_client)
+                    else:
+                        db_manager = DatabaseManager(SERVICE_ACCOUNT_KEY_PATH)
+                    db_manager.add_change_listener(self.prompt_cache.invalidate)
+                    db_manager.add_change_listener(self._response_cache.invalidate_user)
+                    self._db_manager = db_manager
+        return self._db_manager
+
+    @property
+    def gemini_client(self):
+        """The AsyncGemini client, importing the Gemini SDK on first use."""
+        if self._gemini_client is None:
+            self.open()
+            with self._lock:
+                if self._gemini_client is None:
+                    from ai.gemini import DEFAULT_MAX_IN_FLIGHT, AsyncGemini, load_api_key
+
+                    api_key = None if self._genai_client is not None else load_api_key()
+                    self._gemini_client = AsyncGemini(
+                        api_key,
+                        max_in_flight=self.settings.gemini_max_in_flight or DEFAULT_MAX_IN_FLIGHT,
+                        client=self._genai_client,
+                        session_store=self._session_store,
+                        response_cache=self._response_cache,
+                        compactor=self.history_compactor,
+                        resilience=self.model_calls,
+                        coalescer=self.coalescer,
+                    )
+        return self._gemini_client
+
+    async def get_entry_retriever(self):
+        """
+        The EntryRetriever of retrieval mode, built off the event loop on first use; None
+        unless retrieved_entries is set. With an embedding_model, its embedder makes its model
+        calls on this event loop through the Gemini client.
+        """
+        if self.settings.retrieved_entries <= 0:
+            return None
+        if self._entry_retriever is None:
+            await run_in_threadpool(self._build_entry_retriever, asyncio.get_running_loop())
+        return self._entry_retriever
+
+    def _build_entry_retriever(self, loop: asyncio.AbstractEventLoop):
+        if self._entry_retriever is None:
+            # resolved before taking the lock, which building them takes too
+            db_manager = self.db_manager
+            embed = None
+            if self.settings.embedding_model:
+                from ai.embeddings import GeminiEmbedder
+
+                embed = GeminiEmbedder(self.gemini_client, loop, self.settings.embedding_model)
+            with self._lock:
+                if self._entry_retriever is None:
+                    from ai.entry_retriever import EntryRetriever
+
+                    entry_retriever = EntryRetriever(
+                        db_manager, embed, max_users=self.settings.entry_index_users,
+                        ttl=self.settings.entry_index_ttl, approximate=self.settings.entry_index_approximate,
+                    )
+                    db_manager.add_entry_listener(entry_retriever.entries_written)
+                    self._entry_retriever = entry_retriever
+
+    async def start_persona_updater(self) -> bool:
+        """
+        Starts the persona workers if they are not running yet.
+
+        The clients the workers need are built off the event loop. A failure is logged
+        rather than raised, since queued jobs are kept until a later start succeeds.
+
+        Returns:
+            True if the workers are running.
+        """
+        async with self._persona_lock:
+            if self.persona_updater is not None:
+                return True
+            try:
+                db_manager = await run_in_threadpool(lambda: self.db_manager)
+                gemini_client = await run_in_threadpool(lambda: self.gemini_client)
+            except Exception as e:
+                print(f"Warning: persona workers not started: {e}")
+                return False
+            self.persona_updater = PersonaUpdater(
+                self.persona_queue, db_manager, gemini_client, workers=self.settings.persona_workers
+            )
+            self.persona_updater.start()
+            return True
+
+    async def close(self):
+        """
+        Lets running history compactions and entry index updates finish and stops the
+        persona workers; their unfinished jobs stay in the queue.
+        """
+        if self._gemini_client is not None:
+            await self._gemini_client.join_compactions()
+        if self._entry_retriever is not None:
+            await run_in_threadpool(self._entry_retriever.close)
+        if self.persona_updater is not None:
+            await self.persona_updater.stop()
+            self.persona_updater = None
+
+
+def get_services(request: Request) -> Services:
+    return request.app.state.services
+
+# FastAPI runs plain-function dependencies in its threadpool, so building a client on
+# first use does not block the event loop
+def get_db_manager(services: Services = Depends(get_services)):
+    return services.db_manager
+
+def get_gemini_client(services: Services = Depends(get_services)):
+    return services.gemini_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    services: Services = app.state.services
+    await run_in_threadpool(services.open)
+    # resume persona jobs left by a previous process in the background, so startup
+    # does not wait for the clients to be built
+    queued = await run_in_threadpool(services.persona_queue.stats)
+    resume = None
+    if queued["pending"] or queued["running"]:
+        resume = asyncio.create_task(services.start_persona_updater())
+    yield
+    if resume is not None:
+        await resume
+    await services.close()
+
+
+def register_metrics(services: Services):
+    """
+    Exports the session, cache, persona queue, model call, rate limit and coalescing
+    counters alongside the request and stage histograms.
+    """
+    metrics = services.metrics
+    metrics.gauge_callback(
+        "chat_sessions_live", "Chat sessions currently held by the session store.",
+        lambda: [({}, services.session_store.stats()["live_sessions"])],
+    )
+    metrics.counter_callback(
+        "chat_sessions_evicted_total", "Chat sessions evicted for idleness or capacity.",
+        lambda: [({}, services.session_store.stats()["evicted_sessions"])],
+    )
+
+    def cache_samples(field: str):
+        return [({"cache": "prompt"}, services.prompt_cache.stats()[field]),
+                ({"cache": "response"}, services.response_cache.stats()[field])]
+
+    metrics.counter_callback("cache_hits_total", "Cache lookups that found an entry.", lambda: cache_samples("hits"))
+    metrics.counter_callback("cache_misses_total", "Cache lookups that found nothing.", lambda: cache_samples("misses"))
+    metrics.counter_callback("cache_evictions_total", "Entries evicted to respect the size bound.", lambda: cache_samples("evictions"))
+    metrics.gauge_callback("cache_entries", "Entries currently cached.", lambda: cache_samples("size"))
+    metrics.counter_callback(
+        "chat_history_compactions_total", "Chat histories rolled into a summary.",
+        lambda: [({}, services.history_compactor.compactions if services.history_compactor is not None else 0)],
+    )
+    metrics.gauge_callback(
+        "persona_jobs", "Persona update jobs in the queue by status.",
+        lambda: [({"status": status}, count) for status, count in services.persona_queue.stats().items()],
+    )
+    metrics.counter_callback(
+        "model_call_events_total", "Model calls, and the retries, timeouts, failures and hedges among them.",
+        lambda: [({"event": event}, count) for event, count in services.model_calls.counts.items()],
+    )
+    metrics.gauge_callback(
+        "model_circuit_open", "1 while the model circuit breaker holds calls back.",
+        lambda: [({}, int(services.model_calls.breaker.state != "closed"))],
+    )
+    if services.rate_limiter is not None:
+        metrics.counter_callback(
+            "rate_limit_requests_total", "Rate-limited requests admitted, queued before admission, or rejected.",
+            lambda: [({"outcome": outcome}, services.rate_limiter.stats()[outcome])
+                     for outcome in ("admitted", "queued", "rejected")],
+        )
+    metrics.counter_callback(
+        "coalesced_requests_total", "Requests that started a computation (leader) or shared a running one (joined).",
+        lambda: [({"role": "leader"}, services.coalescer.leaders), ({"role": "joined"}, services.coalescer.joined)],
+    )
+
+
+async def record_request_latency(request: Request, call_next):
+    """Records the latency of every request under its route template."""
+    began = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - began,
+            endpoint=route.path if route is not None else "unmatched",
+            method=request.method,
+            status=str(status),
+        )
+
+
+router = APIRouter()
+
+def model_unavailable(error: ModelUnavailableError) -> HTTPException:
+    """A 503 telling the client when the model is worth trying again."""
+    headers = None
+    if error.retry_after:
+        headers = {"Retry-After": str(max(1, round(error.retry_after)))}
+    return HTTPException(status_code=503, detail=str(error), headers=headers)
+
+async def throttle(services: Services, key: str):
+    """Waits for the key's rate limit, raising a 429 with Retry-After if the wait would be too long."""
+    if services.rate_limiter is None:
+        return
+    try:
+        await services.rate_limiter.acquire(key)
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+
+async def session_user(gemini_client, session_id: str) -> str:
+    """The key a chat session's messages are rate limited under: its user, or the session itself."""
+    try:
+        return await gemini_client.get_session_user_id(session_id) or session_id
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+
+async def add_relevant_entries(services: Services, gemini_client, session_id: str,
+                               message: str) -> Tuple[str, List[str]]:
+    """
+    In retrieval mode, adds the user's entries most related to a message that the chat has not seen yet.
+
+    Returns:
+        The message to send, and the dates of the entries added to it, which are to be
+        recorded as shown once the message has been answered.
+    """
+    entry_retriever = await services.get_entry_retriever()
+    if entry_retriever is None:
+        return message, []
+    user_id = await gemini_client.get_session_user_id(session_id)
+    if not user_id:
+        return message, []
+    dates = await run_in_threadpool(
+        entry_retriever.search, user_id, message, services.settings.retrieved_entries,
+        await gemini_client.get_shown_entries(session_id),
+    )
+    if not dates:
+        return message, []
+    journal_entries = await run_in_threadpool(services.db_manager.get_journal_entries_by_date, user_id, dates)
+    return get_relevant_entries_prompt(message, journal_entries), dates
+
+def create_app(services: Optional[Services] = None, settings: Optional[Settings] = None) -> FastAPI:
+    """
+    Builds the API app.
+
+    Args:
+        services: The clients and caches to serve with; by default they are configured
+            from `settings`, with the Firestore and Gemini clients built on first use.
+        settings: The configuration of the default services; read from the environment
+            when not given. Ignored if `services` is given, since they carry their own.
+
+    Returns:
+        The FastAPI application.
+    """
+    app = FastAPI(lifespan=lifespan)
+    app.state.services = services if services is not None else Services(settings=settings)
+    register_metrics(app.state.services)
+    app.middleware("http")(record_request_latency)
+    app.include_router(router)
+    return app
 
 # genAI endpoints
 class StartChatRequest(BaseModel):
@@ -29,65 +506,151 @@ class SendMessageRequest(BaseModel):
 
 class SingleMessageRequest(BaseModel):
     message: str
+    user_id: Optional[str] = None  # rate limits the request under the user; anonymous requests are not limited
 
 class CorrelationRequest(BaseModel):
     user_id: str
     start_date: str
     end_date: str
+    stats_only: bool = False  # return the computed correlations without asking Gemini to phrase them
+
+class InsightsRequest(BaseModel):
+    user_id: str
 
 
 # Chat endpoints
-@app.post("/start_chat/")
-async def start_chat(request: StartChatRequest):
+@router.post("/start_chat/")
+async def start_chat(request: StartChatRequest, services: Services = Depends(get_services),
+                     gemini_client=Depends(get_gemini_client), db_manager=Depends(get_db_manager)):
     """Starts a new chat session."""
+    await throttle(services, request.user_id)
     try:
-        session_id = gemini_client.start_chat()
-        # get the users journal entries using the user_id
-        journal_entries = db_manager.get_user_journal_entries(request.user_id)
-        # get user persona
-        user_persona = db_manager.get_user_persona(request.user_id)
-
-        # prompt chat with the journal entries to set context
-        prefix_prompt = get_initial_chat_prompt(user_persona, journal_entries)
-        gemini_client.send_message(session_id, prefix_prompt)
+        session_id = await gemini_client.start_chat(request.user_id)
+        entry_retriever = await services.get_entry_retriever()
+        settings = services.settings
+
+        def build_prefix_prompt() -> Tuple[str, List[str]]:
+            if entry_retriever is None:
+                # get the users persona and journal entries in one concurrent read
+                weekly = settings.prompt_weekly_summaries
+                context = db_manager.get_user_context(request.user_id, weekly_rollups=weekly)
+                return get_initial_chat_prompt(
+                    context.persona, context.journal_entries, max_entry_tokens=settings.prompt_entry_token_budget,
+                    weekly_summaries=rollup_summaries(context.weekly_rollups) if weekly else None,
+                ), []
+            # retrieval mode: read only the latest entries, and find the older ones most
+            # related to them in the user's entry index
+            context = db_manager.get_user_context(request.user_id, recent_entries=settings.recent_entries)
+            recent_text = "\n".join(entry.get("dailyJournal") or "" for entry in context.journal_entries)
+            dates = entry_retriever.search(
+                request.user_id, recent_text, settings.retrieved_entries,
+                exclude=[entry.get("date") for entry in context.journal_entries],
+            )
+            prompt = get_initial_chat_prompt(
+                context.persona, context.journal_entries, max_entry_tokens=settings.prompt_entry_token_budget,
+                relevant_entries=db_manager.get_journal_entries_by_date(request.user_id, dates),
+            )
+            # the entries in the opening prompt are not added to the chat's messages again
+            return prompt, [entry["date"] for entry in context.journal_entries] + dates
+
+        # prompt chat with the journal entries to set context, reusing the last render
+        # while the user's data is unchanged
+        prefix_prompt, shown_entries = await run_in_threadpool(
+            services.prompt_cache.get_or_build, request.user_id, build_prefix_prompt
+        )
+        await gemini_client.send_message(session_id, prefix_prompt, shown_entries)
         return {"session_id": session_id}
+    except ModelUnavailableError as e:
+        raise model_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/send_message/")
-async def send_message(request: SendMessageRequest):
+@router.post("/send_message/")
+async def send_message(request: SendMessageRequest, services: Services = Depends(get_services),
+                       gemini_client=Depends(get_gemini_client)):
     """Sends a message to an existing chat session."""
+    await throttle(services, await session_user(gemini_client, request.session_id))
     try:
-        response = gemini_client.send_message(request.session_id, request.message)
+        message, shown_entries = await add_relevant_entries(services, gemini_client, request.session_id, request.message)
+        response = await gemini_client.send_message(request.session_id, message, shown_entries)
         return {"response": response}
+    except ModelUnavailableError as e:
+        raise model_unavailable(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def format_sse(data: str, event: str = None) -> str:
+    """Formats a server-sent event, splitting multi-line data over several data fields."""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+@router.post("/send_message_stream/")
+async def send_message_stream(request: SendMessageRequest, services: Services = Depends(get_services),
+                              gemini_client=Depends(get_gemini_client)):
+    """Sends a message to an existing chat session and streams the reply as server-sent events."""
+    await throttle(services, await session_user(gemini_client, request.session_id))
+    try:
+        message, shown_entries = await add_relevant_entries(services, gemini_client, request.session_id, request.message)
+        chunks = gemini_client.send_message_stream(request.session_id, message, shown_entries)
+        # wait for the first chunk before answering, so a model that cannot be reached
+        # is reported with a status code rather than as an event in a 200 response
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except ModelUnavailableError as e:
+        raise model_unavailable(e)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/get_single_response/")
-async def get_single_response(request: SingleMessageRequest):
+    async def events():
+        try:
+            if first is not None:
+                yield format_sse(first)
+            async for chunk in chunks:
+                yield format_sse(chunk)
+            yield format_sse("", event="done")
+        except Exception as e:
+            yield format_sse(str(e), event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.post("/get_single_response/")
+async def get_single_response(request: SingleMessageRequest, services: Services = Depends(get_services),
+                              gemini_client=Depends(get_gemini_client)):
     """Sends a message to an existing chat session."""
+    # only a call that reaches the model counts against the user's rate limit; anonymous
+    # calls are not limited here, since behind a proxy they would all share one address
+    limit = partial(throttle, services, request.user_id) if request.user_id else None
     try:
-        response = gemini_client.generate_content(request.message)
+        response = await gemini_client.generate_content(request.message, throttle=limit)
         return {"response": response}
+    except HTTPException:
+        raise
+    except ModelUnavailableError as e:
+        raise model_unavailable(e)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/end_chat/")
-async def end_chat(request: EndChatRequest):
-    """Ends an existing chat session."""
+@router.post("/end_chat/")
+async def end_chat(request: EndChatRequest, services: Services = Depends(get_services),
+                   gemini_client=Depends(get_gemini_client)):
+    """Ends an existing chat session and queues an update of the user's persona."""
     try:
-        # send the closing prompt to gemini and update the user personal in firebase
-        # TODO: fix this later
-        # current_user_persona = db_manager.get_user_persona(request.user_id)
-        # closing_prompt = getClosingChatPrompt(current_user_persona)
-        # new_persona_json = gemini_client.send_message(request.session_id, closing_prompt)
-        # data = json.loads(new_persona_json) # this fails!!
-        # db_manager.store_user_persona(data["userProfile"], request.user_id)
-        gemini_client.end_chat(request.session_id)
+        # the persona is refreshed from the conversation in the background, so the
+        # client does not wait on the model; only the initial prompt and its reply
+        # carry nothing new about the user
+        history = await gemini_client.get_session_history(request.session_id)
+        if len(history) > 2:
+            await run_in_threadpool(services.persona_queue.enqueue, request.user_id, history)
+            await services.start_persona_updater()
+        await gemini_client.end_chat(request.session_id)
         return {"message": "Chat session ended successfully"}
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
@@ -96,24 +659,66 @@ async def end_chat(request: EndChatRequest):
 
 
 # Correlation/Insights endpoints
-@app.post("/get_correlations/")
-async def get_correlations(request: CorrelationRequest):
-    try:
-        # Fetch journal entries within the specified date range for the user
-        entries = db_manager.get_user_journal_entries(request.user_id)
+@router.post("/get_correlations/")
+async def get_correlations(request: CorrelationRequest, services: Services = Depends(get_services),
+                           gemini_client=Depends(get_gemini_client), db_manager=Depends(get_db_manager)):
+    from utils.correlation_engine import FIELDS, find_correlations
 
-        #Filter the journal entries by date range, using the helper function.
-        filtered_entries = get_entries_by_date_range(entries, request.start_date, request.end_date)
-        print(filtered_entries)
-        # Create prompt
-        prompt = get_correlation_prompt_cot(filtered_entries)
+    if not is_valid_date(request.start_date) or not is_valid_date(request.end_date):
+        raise HTTPException(status_code=400, detail="Dates must be in 'yyyy-mm-dd' format")
 
-        # Fetch response
-        response = gemini_client.generate_content(prompt)
+    async def correlate():
+        # Fetch only the journal entries within the specified date range for the user,
+        # and only the fields the correlations use, page by page straight into columns
+        entry_store = await run_in_threadpool(
+            db_manager.get_user_entry_store, request.user_id, request.start_date, request.end_date, FIELDS
+        )
+        # Compute the correlations locally; Gemini only phrases the strongest ones
+        findings = find_correlations(entry_store)
+        if request.stats_only:
+            return {"correlations": findings}
+
+        # Create prompt, falling back to the raw entries when there is too little numeric data
+        if findings:
+            prompt = get_correlation_findings_prompt(findings)
+        else:
+            # the fallback shows the model whole entries, journal text included
+            entry_store = await run_in_threadpool(
+                db_manager.get_user_entry_store, request.user_id, request.start_date, request.end_date
+            )
+            prompt = get_correlation_prompt_cot(entry_store.to_dicts())
+
+        # Fetch response, reusing the cached one if nothing in the range has changed;
+        # only a call that reaches the model counts against the rate limit
+        response = await gemini_client.generate_content(
+            prompt, user_id=request.user_id, throttle=partial(throttle, services, request.user_id)
+        )
         return response
 
+    try:
+        # identical requests arriving together (a double-submitted form, several open
+        # tabs) share one read of the entries and one model call
+        return await services.coalescer.do(
+            ("get_correlations", request.user_id, request.start_date, request.end_date, request.stats_only), correlate
+        )
+    except HTTPException:
+        raise
+    except ModelUnavailableError as e:
+        raise model_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/get_insights/")
+async def get_insights(request: InsightsRequest, db_manager=Depends(get_db_manager)):
+    """Returns the user's latest correlation report, as written by the nightly `python -m ai.insights_job`."""
+    try:
+        report = await run_in_threadpool(db_manager.get_insights_report, request.user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if report is None:
+        raise HTTPException(status_code=404, detail="No insights report for this user yet")
+    return report
 
 
 # function to add mock data to firebase
@@ -122,8 +727,8 @@ class UserData(BaseModel):
     user_id: str
     user_data: Dict
 
-@app.post("/add_user/")
-async def add_user(user_data: UserData):
+@router.post("/add_user/")
+async def add_user(user_data: UserData, db_manager=Depends(get_db_manager)):
     """Adds a user to Firestore."""
     try:
         db_manager.add_user(user_data.user_id, user_data.user_data)
@@ -132,8 +737,8 @@ async def add_user(user_data: UserData):
         raise HTTPException(status_code=500, detail=str(e))
 
 # add list of entries for a given user
-@app.post("/add_entries/")
-async def add_entries(data: Dict):
+@router.post("/add_entries/")
+async def add_entries(data: Dict, db_manager=Depends(get_db_manager)):
     """Adds a list of entries to a user's collection in Firestore."""
     try:
         user_id = data.get("user_id")
@@ -142,22 +747,61 @@ async def add_entries(data: Dict):
         if not user_id or not entries or not isinstance(entries, list):
             raise HTTPException(status_code=400, detail="Invalid request format")
 
-        for entry in entries:
-            date = entry.get("date")
-            entry_data = entry
-
-            if not date or not isinstance(entry_data, dict):
-                raise HTTPException(status_code=400, detail="Invalid entry format")
-
-            db_manager.add_journal_entry(user_id, entry_data)
+        # validate the whole payload before anything is written
+        validated_entries = []
+        invalid_entries = []
+        for index, entry in enumerate(entries):
+            try:
+                validated_entry = JournalEntry.model_validate(entry).model_dump()
+            except ValidationError as e:
+                date = entry.get("date") if isinstance(entry, dict) else None
+                invalid_entries.append({"index": index, "date": date, "error": str(e)})
+                continue
+            # entries are keyed, range-queried and rolled up by their date string
+            if not is_valid_date(validated_entry["date"]):
+                invalid_entries.append({"index": index, "date": validated_entry["date"],
+                                        "error": "date must be in 'yyyy-mm-dd' format"})
+                continue
+            validated_entries.append(validated_entry)
+        if invalid_entries:
+            raise HTTPException(status_code=400, detail={"message": "Invalid entry format", "entries": invalid_entries})
 
+        failed_entries = await run_in_threadpool(db_manager.add_journal_entries_bulk, user_id, validated_entries)
+        if failed_entries:
+            return JSONResponse(
+                status_code=207,
+                content={"message": "Some entries could not be added", "failed_entries": failed_entries},
+            )
         return {"message": "Entries added successfully"}
     except HTTPException as http_exception:
         raise http_exception
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     """Checks if the API is running."""
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@router.get("/session_stats")
+async def session_stats(services: Services = Depends(get_services)):
+    """Reports the live chat session count and how many sessions have been evicted."""
+    return await run_in_threadpool(services.session_store.stats)
+
+@router.get("/prompt_cache_stats")
+async def prompt_cache_stats(services: Services = Depends(get_services)):
+    """Reports the size and hit/miss counters of the start-chat prompt cache."""
+    return services.prompt_cache.stats()
+
+@router.get("/response_cache_stats")
+async def response_cache_stats(services: Services = Depends(get_services)):
+    """Reports the size and hit/miss counters of the model response cache."""
+    return services.response_cache.stats()
+
+@router.get("/metrics")
+async def metrics(services: Services = Depends(get_services)):
+    """Exports request, stage, cache, session and token metrics in the Prometheus text format."""
+    # the session and queue gauges read SQLite when those stores are configured
+    return PlainTextResponse(await run_in_threadpool(services.metrics.render), media_type="text/plain; version=0.0.4")
+
+app = create_app()
@@ -1,6 +1,36 @@
 from typing import List, Optional
 from pydantic import BaseModel, Field
 
+# Numeric JournalEntry fields, as dotted paths into the entry.
+NUMERIC_FIELDS = [
+    "sleep.hours",
+    "sleep.awakenings",
+    "exercise.duration",
+    "mood.overall",
+    "mood.stressLevel",
+    "creativeTime",
+    "socialInteractions",
+    "screenTime",
+    "dailySpending",
+    "timeOutside",
+]
+
+# String JournalEntry fields that take one of a small set of values.
+CATEGORICAL_FIELDS = [
+    "sleep.quality",
+    "diet.generalDiet",
+    "diet.sugarConsumption",
+    "diet.caffeineIntake",
+    "diet.alcoholConsumption",
+    "diet.waterIntake",
+    "exercise.type",
+    "exercise.intensity",
+    "feelingAboutFinances",
+]
+
+# List-of-string JournalEntry fields.
+LIST_FIELDS = ["mood.specificMood", "dailyGratitude"]
+
 class Sleep(BaseModel):
     hours: float
     quality: str
@@ -0,0 +1,10 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+class UserContext(BaseModel):
+    """Everything the chat and insight endpoints read about a user, fetched in one go."""
+    user_id: str
+    profile: Optional[Dict] = None  # the users/{user_id} document, None if it does not exist
+    persona: Optional[Dict] = None
+    journal_entries: List[Dict] = []
+    weekly_rollups: List[Dict] = []  # only read when asked for
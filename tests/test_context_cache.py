@@ -0,0 +1,44 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ai.context_cache import PromptContextCache
+
+
+def test_caches_until_invalidated():
+    cache = PromptContextCache()
+    data = {"u": "old"}
+    assert cache.get_or_build("u", lambda: data["u"]) == "old"
+    data["u"] = "new"
+    assert cache.get_or_build("u", lambda: data["u"]) == "old"
+    cache.invalidate("u")
+    assert cache.get_or_build("u", lambda: data["u"]) == "new"
+    assert cache.stats()["hits"] == 1
+
+
+def test_drops_a_prompt_built_from_data_that_changed_meanwhile():
+    cache = PromptContextCache()
+    reading = threading.Event()
+    written = threading.Event()
+
+    def slow_build():
+        reading.set()
+        written.wait()
+        return "stale"
+
+    with ThreadPoolExecutor(1) as executor:
+        building = executor.submit(cache.get_or_build, "u", slow_build)
+        reading.wait()
+        cache.invalidate("u")
+        written.set()
+        assert building.result() == "stale"
+    assert cache.get_or_build("u", lambda: "fresh") == "fresh"
+
+
+def test_keeps_no_state_for_users_once_their_prompts_are_gone():
+    cache = PromptContextCache(maxsize=10)
+    for user in range(1000):
+        cache.get_or_build(str(user), lambda: "prompt")
+        cache.invalidate(str(user))
+        cache.invalidate(f"never seen {user}")
+    assert cache.stats()["size"] == 0
+    assert not cache._versions and not cache._building
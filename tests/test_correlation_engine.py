@@ -0,0 +1,51 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from models.journal_entry import NUMERIC_FIELDS
+from utils.correlation_engine import ORDINAL_FIELDS, benjamini_hochberg, find_correlations
+
+
+def random_entries(days: int, rng: np.random.Generator) -> list:
+    """Journal entries whose fields are drawn independently of each other and of the day."""
+    entries = []
+    for day in range(days):
+        entry = {"date": (date(2024, 1, 1) + timedelta(days=day)).isoformat()}
+        for field in NUMERIC_FIELDS:
+            *sections, name = field.split(".")
+            target = entry
+            for section in sections:
+                target = target.setdefault(section, {})
+            target[name] = float(rng.normal(5, 2))
+        for field, levels in ORDINAL_FIELDS.items():
+            section, name = field.split(".")
+            entry.setdefault(section, {})[name] = list(levels)[rng.integers(len(levels))]
+        entries.append(entry)
+    return entries
+
+
+def test_benjamini_hochberg_adjusts_by_rank():
+    adjusted = benjamini_hochberg(np.array([0.01, 0.04, 0.03, 0.005]))
+    np.testing.assert_allclose(adjusted, [0.02, 0.04, 0.04, 0.02])
+
+
+def test_uncorrelated_fields_yield_almost_no_findings():
+    rng = np.random.default_rng(0)
+    windows = 100
+    findings = [find_correlations(random_entries(14, rng), top_k=1000) for _ in range(windows)]
+    # uncorrected, each window reported about 18 findings
+    assert sum(len(window) for window in findings) / windows < 0.5
+    assert sum(1 for window in findings if window) <= 0.2 * windows
+
+
+def test_planted_correlation_is_still_found():
+    rng = np.random.default_rng(1)
+    entries = random_entries(60, rng)
+    for entry in entries:
+        entry["mood"]["stressLevel"] = 10 - entry["sleep"]["hours"] + float(rng.normal(0, 0.5))
+    findings = find_correlations(entries)
+    assert any(
+        {finding["x"], finding["y"]} == {"sleep.hours", "mood.stressLevel"} and finding["lag_days"] == 0
+        and finding["direction"] == "negative"
+        for finding in findings
+    )
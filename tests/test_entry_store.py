@@ -0,0 +1,47 @@
+import random
+from datetime import date
+
+from benchmarks.synthetic import make_entries
+from utils.entry_store import EntryStore
+from utils.entry_utils import get_entries_by_date_range
+
+
+def test_round_trips_the_entries():
+    entries = make_entries(400, end=date(2024, 12, 31))
+    store = EntryStore.from_entries(iter(entries))
+    assert len(store) == len(entries)
+    assert store.to_dicts() == entries
+    assert store.to_dicts(newest_first=True) == entries[::-1]
+    assert store.dates() == [entry["date"] for entry in entries]
+
+
+def test_slice_matches_filtering_the_dictionaries():
+    entries = make_entries(400, end=date(2024, 12, 31))
+    store = EntryStore.from_entries(entries)
+    for start, end in [("2024-06-01", "2024-06-30"), ("2020-01-01", "2024-01-15"),
+                       ("2024-12-31", "2030-01-01"), ("2025-01-01", "2025-02-01")]:
+        assert store.slice(start, end).to_dicts() == get_entries_by_date_range(entries, start, end)
+    # a slice of a slice shares the category table and still converts back
+    window = store.slice("2024-03-01", "2024-08-31").slice("2024-05-01", "2024-05-31")
+    assert window.to_dicts() == get_entries_by_date_range(entries, "2024-05-01", "2024-05-31")
+
+
+def test_sorts_by_date_and_keeps_the_later_duplicate():
+    entries = make_entries(30, end=date(2024, 1, 30))
+    shuffled = entries[:]
+    random.Random(0).shuffle(shuffled)
+    rewritten = dict(entries[10], screenTime=1)
+    store = EntryStore.from_entries(shuffled + [rewritten, {"date": "not a date"}, {"mood": {"overall": 5}}])
+    assert store.to_dicts() == entries[:10] + [rewritten] + entries[11:]
+
+
+def test_keeps_values_outside_the_schema():
+    entry = {
+        "date": "2024-01-01",
+        "sleep": {"hours": 7, "quality": 3, "dreams": "vivid"},  # an int where a string belongs
+        "mood": {"specificMood": ["calm", 1]},  # a list that is not all strings
+        "exercise": None,
+        "source": "import",
+        "screenTime": True,
+    }
+    assert EntryStore.from_entries([entry]).to_dicts() == [entry]
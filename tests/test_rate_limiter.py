@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from utils.rate_limiter import Quota, RateLimitExceeded, TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_a_burst_goes_through_and_then_queues_at_the_rate():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(Quota(rate_per_minute=60, burst=3), max_wait=5, clock=clock)
+
+    assert [limiter.reserve("u") for _ in range(3)] == [0, 0, 0]
+    # an empty bucket hands out the next tokens one second apart
+    assert limiter.reserve("u") == pytest.approx(1)
+    assert limiter.reserve("u") == pytest.approx(2)
+    assert limiter.stats() == {"admitted": 5, "queued": 2, "rejected": 0, "tracked_keys": 1}
+
+    # other keys have buckets of their own
+    assert limiter.reserve("v") == 0
+
+    # the bucket refills, but never beyond the burst
+    clock.now += 60
+    assert [limiter.reserve("u") for _ in range(3)] == [0, 0, 0]
+    assert limiter.reserve("u") == pytest.approx(1)
+
+
+def test_refuses_a_request_that_would_wait_too_long():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(Quota(rate_per_minute=60, burst=1), max_wait=2, clock=clock)
+    for _ in range(3):
+        limiter.reserve("u")
+
+    with pytest.raises(RateLimitExceeded) as refused:
+        limiter.reserve("u")
+    assert refused.value.retry_after == pytest.approx(1)
+    assert limiter.rejected == 1
+
+    # a refused request takes no token, so the retry_after it was given is enough
+    clock.now += refused.value.retry_after
+    assert limiter.reserve("u") == pytest.approx(2)
+
+
+def test_refund_returns_the_token():
+    limiter = TokenBucketLimiter(Quota(rate_per_minute=60, burst=1), clock=FakeClock())
+    assert limiter.reserve("u") == 0
+    limiter.refund("u")
+    assert limiter.reserve("u") == 0
+    # refunds never fill the bucket beyond the burst
+    limiter.refund("u")
+    limiter.refund("u")
+    limiter.reserve("u")
+    assert limiter.reserve("u") == pytest.approx(1)
+
+
+def test_cancelled_acquire_gives_its_token_back():
+    limiter = TokenBucketLimiter(Quota(rate_per_minute=60, burst=1), max_wait=5, clock=FakeClock())
+
+    async def cancel_a_queued_request():
+        await limiter.acquire("u")
+        waiter = asyncio.ensure_future(limiter.acquire("u"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(cancel_a_queued_request())
+    # only the cancelled request's debt is repaid, so the next one waits for one token, not two
+    assert limiter.reserve("u") == pytest.approx(1)
+
+
+def test_overrides_and_unlimited_quotas():
+    limiter = TokenBucketLimiter(Quota(rate_per_minute=60, burst=1), max_wait=0,
+                                 overrides={"batch": Quota(rate_per_minute=0, burst=0)}, clock=FakeClock())
+    for _ in range(100):
+        assert limiter.reserve("batch") == 0
+    assert limiter.stats()["tracked_keys"] == 0
+
+    limiter.reserve("u")
+    with pytest.raises(RateLimitExceeded):
+        limiter.reserve("u")
+
+
+def test_forgets_the_least_recently_used_buckets():
+    limiter = TokenBucketLimiter(Quota(rate_per_minute=60, burst=1), max_keys=2, clock=FakeClock())
+    for key in ("a", "b", "c"):
+        limiter.reserve(key)
+    assert limiter.stats()["tracked_keys"] == 2
+    # "a" was forgotten, so it starts again with a full bucket
+    assert limiter.reserve("a") == 0
+    assert limiter.reserve("c") == pytest.approx(1)
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+
+from ai.resilience import CircuitBreaker, ModelUnavailableError, ResilientCaller
+from benchmarks.fake_gemini import FakeGenaiClient
+
+
+def generate(client: FakeGenaiClient):
+    """An attempt that makes one generate_content call through the fake async client."""
+    async def attempt():
+        response = await client.aio.models.generate_content(model="fake", contents="hello")
+        return response.text
+    return attempt
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_retries_a_503_and_then_succeeds():
+    client = FakeGenaiClient(latency=0, error_rate=1.0)
+    caller = ResilientCaller(retry_base_delay=0.001)
+    attempt = generate(client)
+
+    async def outage_ends_after_one_call():
+        try:
+            return await attempt()
+        finally:
+            client.backend.error_rate = 0.0
+
+    assert asyncio.run(caller.call("generate_content", outage_ends_after_one_call)) == "echo: hello"
+    assert client.backend.errors == 1
+    assert caller.counts["retries"] == 1
+    assert caller.counts["failures"] == 0
+
+
+def test_gives_up_after_the_attempts_time_out():
+    client = FakeGenaiClient(latency=0, stall_rate=1.0, stall_seconds=10)
+    caller = ResilientCaller(timeout=0.05, max_attempts=2, retry_base_delay=0.001)
+    began = time.perf_counter()
+    with pytest.raises(ModelUnavailableError, match="timed out"):
+        asyncio.run(caller.call("generate_content", generate(client)))
+    assert time.perf_counter() - began < 1
+    assert caller.counts["timeouts"] == 2
+    assert caller.counts["failures"] == 1
+
+
+def test_breaker_opens_lets_a_probe_through_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_ratio=0.5, reset_timeout=10, window=2, min_calls=2, clock=clock)
+    caller = ResilientCaller(max_attempts=1, breaker=breaker)
+    client = FakeGenaiClient(latency=0, error_rate=1.0)
+    attempt = generate(client)
+
+    for _ in range(2):
+        with pytest.raises(ModelUnavailableError):
+            asyncio.run(caller.call("generate_content", attempt))
+    assert breaker.state == "open"
+
+    # while open, calls fail without reaching the model
+    with pytest.raises(ModelUnavailableError, match="circuit open") as rejected:
+        asyncio.run(caller.call("generate_content", attempt))
+    assert rejected.value.retry_after == 10
+    assert client.backend.calls == 2
+
+    clock.now += 10
+    client.backend.error_rate = 0.0
+    states = []
+
+    async def probe():
+        states.append(breaker.state)
+        return await attempt()
+
+    assert asyncio.run(caller.call("generate_content", probe)) == "echo: hello"
+    assert states == ["half-open"]
+    assert breaker.state == "closed"
+
+
+def test_hedge_wins_against_a_slow_primary():
+    client = FakeGenaiClient(latency=0.01, stall_seconds=5)
+    caller = ResilientCaller(hedge_quantile=0.5, hedge_min_samples=1)
+    for _ in range(5):
+        caller.window("generate_content").observe(0.02)
+    stall_rates = iter([1.0, 0.0])  # the primary stalls, the hedge does not
+    attempt = generate(client)
+
+    async def stalled_once():
+        client.backend.stall_rate = next(stall_rates)
+        return await attempt()
+
+    began = time.perf_counter()
+    assert asyncio.run(caller.call("generate_content", stalled_once, hedge=True)) == "echo: hello"
+    assert time.perf_counter() - began < 1
+    assert caller.counts["hedges"] == 1
+    assert caller.counts["hedge_wins"] == 1
+    assert client.backend.stalls == 1
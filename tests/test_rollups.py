@@ -0,0 +1,84 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.synthetic import make_entries
+from db.database_manager import DatabaseManager
+from db.rollups import apply_change, build_rollup, empty_rollup, rollup_update
+
+
+def assert_same_rollup(got: dict, want: dict):
+    """Compares rollup documents, allowing for the rounding of sums updated incrementally."""
+    assert got["period"] == want["period"]
+    assert got["entryCount"] == want["entryCount"]
+    assert got["fields"].keys() == want["fields"].keys()
+    for name, stats in want["fields"].items():
+        assert got["fields"][name]["sum"] == pytest.approx(stats["sum"]), name
+        assert {key: got["fields"][name][key] for key in ("count", "min", "max")} == \
+            {key: stats[key] for key in ("count", "min", "max")}, name
+
+
+def test_apply_change_matches_a_rebuild():
+    entries = make_entries(7, end=date(2024, 1, 7))
+    rollup = empty_rollup("2024-W01")
+    for entry in entries:
+        assert apply_change(rollup, None, entry)
+    assert_same_rollup(rollup, build_rollup("2024-W01", entries))
+
+    # writing the same entry again changes nothing
+    before = copy.deepcopy(rollup)
+    assert apply_change(rollup, entries[0], entries[0])
+    assert rollup == before
+
+    # removing an entry subtracts its values; the min or max it held cannot be recovered
+    low = min(entries, key=lambda entry: entry["sleep"]["hours"])
+    assert not apply_change(rollup, low, None)
+    assert rollup["entryCount"] == 6
+    rest = [entry for entry in entries if entry is not low]
+    assert rollup["fields"]["sleep_hours"]["sum"] == pytest.approx(sum(entry["sleep"]["hours"] for entry in rest))
+
+
+def test_rollup_update_turns_the_stored_rollup_into_the_new_one():
+    entries = make_entries(7, end=date(2024, 1, 7))
+    before = build_rollup("2024-01", entries[:4])
+    after = copy.deepcopy(before)
+    for entry in entries[4:]:
+        apply_change(after, None, entry)
+    changed = dict(entries[0], sleep=dict(entries[0]["sleep"], hours=entries[0]["sleep"]["hours"] + 1))
+    apply_change(after, entries[0], changed)
+
+    doc = FakeFirestore().collection("users").document("u").collection("monthlyRollups").document("2024-01")
+    doc.set(before)
+    doc.set(rollup_update(before, after), merge=True)
+    assert_same_rollup(doc.get().to_dict(), after)
+
+
+def test_concurrent_writes_to_one_period_are_all_counted():
+    db_manager = DatabaseManager(db=FakeFirestore(latency=0.005))
+    entries = make_entries(7, end=date(2024, 1, 7))
+    with ThreadPoolExecutor(len(entries)) as executor:
+        list(executor.map(lambda entry: db_manager.add_journal_entry("u", entry), entries))
+    assert_same_rollup(db_manager.get_user_rollups("u", "month", "2024-01", "2024-01")[0],
+                       build_rollup("2024-01", entries))
+
+    # overwriting every entry, including those holding the min and max
+    changed = [dict(entry, sleep=dict(entry["sleep"], hours=entry["sleep"]["hours"] - 1)) for entry in entries]
+    with ThreadPoolExecutor(len(changed)) as executor:
+        list(executor.map(lambda entry: db_manager.add_journal_entry("u", entry), changed))
+    assert_same_rollup(db_manager.get_user_rollups("u", "month", "2024-01", "2024-01")[0],
+                       build_rollup("2024-01", changed))
+
+
+def test_bulk_writes_keep_every_rollup_exact():
+    db_manager = DatabaseManager(db=FakeFirestore())
+    entries = make_entries(120, end=date(2024, 4, 30))
+    db_manager.add_journal_entries_bulk("u", entries[:90])
+    db_manager.add_journal_entries_bulk("u", entries[60:])
+
+    for rollup in db_manager.get_user_rollups("u", "month"):
+        in_month = [entry for entry in entries if entry["date"].startswith(rollup["period"])]
+        assert_same_rollup(rollup, build_rollup(rollup["period"], in_month))
+    assert sum(rollup["entryCount"] for rollup in db_manager.get_user_rollups("u", "week")) == len(entries)
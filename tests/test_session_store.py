@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from ai.session_store import InMemorySessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    """Builds a session store of each backend with the given bounds."""
+    def make(**bounds):
+        if request.param == "memory":
+            return InMemorySessionStore(**bounds)
+        return SQLiteSessionStore(str(tmp_path / "sessions.db"), **bounds)
+    return make
+
+
+def test_round_trips_a_session(make_store):
+    store = make_store()
+    record = {"user_id": "u", "history": [{"role": "user", "parts": [{"text": "hello"}]}]}
+    store.put("s1", record)
+    assert store.get("s1") == record
+    assert store.get("missing") is None
+
+    record["history"].append({"role": "model", "parts": [{"text": "hi"}]})
+    store.put("s1", record)
+    assert store.get("s1") == record
+
+    assert store.delete("s1")
+    assert not store.delete("s1")
+    assert store.get("s1") is None
+    assert store.stats() == {"live_sessions": 0, "evicted_sessions": 0}
+
+
+def test_evicts_idle_sessions(make_store):
+    store = make_store(ttl=0.05)
+    store.put("s1", {"history": []})
+    time.sleep(0.1)
+    assert store.get("s1") is None
+    assert store.stats() == {"live_sessions": 0, "evicted_sessions": 1}
+
+
+def test_evicts_the_least_recently_updated_beyond_the_bound(make_store):
+    store = make_store(max_sessions=2)
+    for session_id in ("s1", "s2"):
+        store.put(session_id, {"history": []})
+        time.sleep(0.01)
+    store.put("s1", {"history": ["again"]})
+    time.sleep(0.01)
+    store.put("s3", {"history": []})
+
+    assert store.get("s2") is None
+    assert store.get("s1") == {"history": ["again"]}
+    assert store.get("s3") == {"history": []}
+    assert store.stats() == {"live_sessions": 2, "evicted_sessions": 1}
+
+
+def test_sqlite_sessions_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    SQLiteSessionStore(path).put("s1", {"user_id": "u", "history": []})
+    assert SQLiteSessionStore(path).get("s1") == {"user_id": "u", "history": []}
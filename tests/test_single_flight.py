@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+        assert not flight.running("key")
+        # nothing is kept once the computation finishes
+        return results, await flight.do("key", compute)
+
+    results, later = asyncio.run(main())
+    assert results == [1] * 5
+    assert later == 2
+    assert flight.stats() == {"leaders": 2, "joined": 4, "in_flight": 0}
+
+
+def test_different_keys_compute_separately():
+    flight = SingleFlight()
+
+    async def value(result):
+        await asyncio.sleep(0.01)
+        return result
+
+    async def both():
+        return await asyncio.gather(flight.do("a", lambda: value("a")), flight.do("b", lambda: value("b")))
+
+    assert asyncio.run(both()) == ["a", "b"]
+    assert flight.stats()["leaders"] == 2
+
+
+def test_callers_share_the_exception():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("model down")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", compute) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert len(errors) == 3
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+    started = []
+
+    async def compute():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", compute))
+        second = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+        assert flight.running("key")
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+    assert started == [1]
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+class LRUCache:
+    """A thread-safe, size-bounded LRU cache with optional time-to-live and usage counters."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None,
+                 on_remove: Optional[Callable[[Hashable], None]] = None):
+        """
+        Initializes the cache.
+
+        Args:
+            maxsize: The maximum number of entries kept; the least recently used entry is
+                evicted once it is exceeded.
+            ttl: Seconds an entry stays valid after it was last set, or None to never expire.
+            on_remove: Called with the key of every entry evicted or expired, outside the
+                cache's lock; not called for pop or clear.
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_remove = on_remove
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default=None):
+        """Returns the cached value for key, or default if it is missing or expired."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+        self._removed([key])
+        return default
+
+    def set(self, key: Hashable, value):
+        """Stores value under key, evicting the least recently used entry if the cache is full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False)[0])
+                self.evictions += 1
+        self._removed(evicted)
+
+    def pop(self, key: Hashable, default=None):
+        """Removes key and returns its value, or default if it was not cached."""
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[0]
+
+    def purge_expired(self) -> int:
+        """Drops every expired entry and returns how many were removed."""
+        if self.ttl is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._data.items() if expires_at <= now]
+            for key in expired:
+                del self._data[key]
+            self.expirations += len(expired)
+        self._removed(expired)
+        return len(expired)
+
+    def _removed(self, keys):
+        if self.on_remove is not None:
+            for key in keys:
+                self.on_remove(key)
+
+    def clear(self):
+        """Removes every entry; counters are kept."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the current size and the hit, miss, eviction and expiration counters."""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
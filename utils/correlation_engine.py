@@ -0,0 +1,258 @@
+import math
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from models.journal_entry import NUMERIC_FIELDS
+from utils.entry_store import EntryStore
+from utils.metrics import timed
+
+_LEVELS = {"none": 0, "low": 1, "moderate": 2, "medium": 2, "high": 3}
+
+# Categorical fields with a natural order, mapped onto numbers so they can be correlated.
+ORDINAL_FIELDS = {
+    "sleep.quality": {"very poor": 0, "poor": 1, "fair": 2, "average": 2, "good": 3, "very good": 4, "excellent": 4},
+    "exercise.intensity": _LEVELS,
+    "diet.sugarConsumption": _LEVELS,
+    "diet.caffeineIntake": _LEVELS,
+    "diet.alcoholConsumption": _LEVELS,
+    "diet.waterIntake": _LEVELS,
+}
+
+FIELDS = NUMERIC_FIELDS + list(ORDINAL_FIELDS)
+
+DEFAULT_TOP_K = 5
+DEFAULT_MIN_SAMPLES = 7
+DEFAULT_ALPHA = 0.05
+DEFAULT_MIN_ABS_R = 0.3
+
+_erfc = np.vectorize(math.erfc, otypes=[float])
+
+
+def _field_reader(field: str):
+    """Builds a function returning an entry's value for a dotted field path as a float, or NaN."""
+    parts = field.split(".")
+    levels = ORDINAL_FIELDS.get(field)
+
+    def read(entry: Dict) -> float:
+        value = entry
+        for part in parts:
+            if not isinstance(value, dict):
+                return math.nan
+            value = value.get(part)
+        if levels is not None:
+            value = levels.get(value.strip().lower()) if isinstance(value, str) else None
+        if value is None or value is True or value is False or not isinstance(value, (int, float)):
+            return math.nan
+        return float(value)
+
+    return read
+
+
+def entries_to_matrix(journal_entries: Union[List[Dict], EntryStore],
+                      fields: Sequence[str] = FIELDS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Flattens journal entries into a columnar matrix with one row per calendar day.
+
+    Days between the first and last entry that have no entry are kept as all-NaN rows,
+    so row i + 1 is always the day after row i and lagged columns line up by shifting.
+
+    Args:
+        journal_entries: The journal entry dictionaries, in any order, or an EntryStore,
+            whose columns are copied without reading the entries one by one.
+        fields: The dotted field paths to extract, one column each.
+
+    Returns:
+        A (days,) array of date ordinals and a (days, len(fields)) float matrix with NaN
+        for missing values.
+    """
+    if isinstance(journal_entries, EntryStore):
+        return _store_to_matrix(journal_entries, fields)
+    readers = [_field_reader(field) for field in fields]
+    ordinals = []
+    rows = []
+    for entry in journal_entries:
+        try:
+            ordinal = date.fromisoformat(entry["date"]).toordinal()
+        except (KeyError, TypeError, ValueError):
+            continue
+        ordinals.append(ordinal)
+        rows.append([read(entry) for read in readers])
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(fields)))
+
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    first = int(ordinals.min())
+    matrix = np.full((int(ordinals.max()) - first + 1, len(fields)), np.nan)
+    matrix[ordinals - first] = np.asarray(rows, dtype=float)
+    return np.arange(first, first + len(matrix)), matrix
+
+
+def _store_to_matrix(store: EntryStore, fields: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    if not len(store):
+        return np.empty(0, dtype=np.int64), np.empty((0, len(fields)))
+    ordinals = np.frombuffer(store.ordinals, dtype=np.int64)
+    first = int(ordinals[0])
+    rows = ordinals - first
+    matrix = np.full((int(ordinals[-1]) - first + 1, len(fields)), np.nan)
+    for column, field in enumerate(fields):
+        if field in store.numeric:
+            matrix[rows, column] = np.frombuffer(store.numeric[field], dtype=float)
+        elif field in store.categorical:
+            # map each distinct string once, then every code through the lookup table
+            levels = ORDINAL_FIELDS.get(field, {})
+            table = np.array(
+                [math.nan] + [levels.get(value.strip().lower(), math.nan) for value in store.categories[1:]]
+            )
+            matrix[rows, column] = table[np.frombuffer(store.categorical[field], dtype=np.uint16)]
+    return np.arange(first, first + len(matrix)), matrix
+
+
+def pairwise_correlations(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the Pearson correlation of every column of `a` with every column of `b`.
+
+    Each pair uses only the rows where both values are present, computed for all pairs
+    at once with masked matrix products.
+
+    Args:
+        a: An (n, k) matrix with NaN for missing values.
+        b: An (n, m) matrix aligned row-by-row with `a`.
+
+    Returns:
+        A (k, m) matrix of correlation coefficients (NaN where undefined) and a (k, m)
+        matrix of the number of rows each coefficient is based on.
+    """
+    mask_a = (~np.isnan(a)).astype(float)
+    mask_b = (~np.isnan(b)).astype(float)
+    a0 = np.where(mask_a > 0, a, 0.0)
+    b0 = np.where(mask_b > 0, b, 0.0)
+
+    n = mask_a.T @ mask_b
+    sum_a = a0.T @ mask_b
+    sum_b = mask_a.T @ b0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = a0.T @ b0 - sum_a * sum_b / n
+        var_a = (a0 * a0).T @ mask_b - sum_a * sum_a / n
+        var_b = mask_a.T @ (b0 * b0) - sum_b * sum_b / n
+        r = cov / np.sqrt(var_a * var_b)
+    r[~np.isfinite(r)] = np.nan
+    return np.clip(r, -1.0, 1.0), n
+
+
+def correlation_p_values(r: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """
+    Two-sided p-values for correlation coefficients using the Fisher z-transform.
+
+    Args:
+        r: Correlation coefficients.
+        n: The sample size behind each coefficient.
+
+    Returns:
+        The p-values, NaN where the sample is too small (n <= 3) to test.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.arctanh(np.clip(r, -0.999999, 0.999999)) * np.sqrt(n - 3)
+        p = _erfc(np.abs(np.nan_to_num(z)) / math.sqrt(2))
+    p[(n <= 3) | np.isnan(r)] = np.nan
+    return p
+
+
+def benjamini_hochberg(p_values: np.ndarray) -> np.ndarray:
+    """
+    Adjusts p-values for multiple testing with the Benjamini-Hochberg procedure.
+
+    Keeping the tests whose adjusted p-value is below alpha bounds the expected share
+    of false discoveries among them at alpha, however many tests were run.
+
+    Args:
+        p_values: The p-values of every test in the family, in any order.
+
+    Returns:
+        The adjusted p-values, in the same order.
+    """
+    count = len(p_values)
+    if not count:
+        return np.empty(0)
+    order = np.argsort(p_values)
+    scaled = p_values[order] * count / np.arange(1, count + 1)
+    # each adjusted value is the smallest scaled value at its rank or above
+    adjusted = np.minimum.accumulate(scaled[::-1])[::-1]
+    result = np.empty(count)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+@timed("analytics")
+def find_correlations(
+    journal_entries: Optional[Union[List[Dict], EntryStore]],
+    lags: Sequence[int] = (0, 1),
+    top_k: int = DEFAULT_TOP_K,
+    min_samples: int = DEFAULT_MIN_SAMPLES,
+    alpha: float = DEFAULT_ALPHA,
+    min_abs_r: float = DEFAULT_MIN_ABS_R,
+) -> List[Dict]:
+    """
+    Finds the strongest statistically significant correlations between journal fields.
+
+    A lag of 1 pairs each day's value of one field with the next day's value of another
+    (e.g. today's exercise against tomorrow's sleep quality). At lag 0, pairs of fields
+    from the same section (such as sleep.hours and sleep.quality) are skipped because they
+    describe the same thing.
+
+    Hundreds of field pairs are tested, so by chance alone some would pass an uncorrected
+    significance test on any journal. The p-values of every pair with `min_samples` or
+    more days are therefore adjusted with benjamini_hochberg, and only pairs whose
+    adjusted p-value is below `alpha` are considered before `min_abs_r` and `top_k`.
+
+    Args:
+        journal_entries: The journal entry dictionaries, or an EntryStore, to analyse.
+        lags: The day offsets to test.
+        top_k: The maximum number of findings returned.
+        min_samples: The minimum number of paired days behind a finding.
+        alpha: The false discovery rate a finding's adjusted p-value must be below.
+        min_abs_r: The minimum absolute correlation coefficient.
+
+    Returns:
+        Findings sorted by strength, each a dictionary with the fields `x` and `y`, the
+        `lag_days` from x to y, the coefficient `r`, its `p_value` and the
+        `adjusted_p_value` it was judged by, the sample size `n` and the `direction`
+        ("positive" or "negative").
+    """
+    if not journal_entries:
+        return []
+    _, matrix = entries_to_matrix(journal_entries)
+    sections = [field.split(".")[0] for field in FIELDS]
+
+    # every testable pair across the lags forms one family of tests
+    tests = []
+    for lag in lags:
+        if lag >= len(matrix):
+            continue
+        leading = matrix[:len(matrix) - lag] if lag else matrix
+        r, n = pairwise_correlations(leading, matrix[lag:])
+        p = correlation_p_values(r, n)
+        for i, j in zip(*np.nonzero((n >= min_samples) & ~np.isnan(p))):
+            if i == j or (lag == 0 and (j < i or sections[i] == sections[j])):
+                continue
+            tests.append((lag, i, j, float(r[i, j]), float(p[i, j]), int(n[i, j])))
+    adjusted = benjamini_hochberg(np.array([test[4] for test in tests]))
+
+    findings = []
+    for (lag, i, j, r_value, p_value, samples), adjusted_p in zip(tests, adjusted):
+        if adjusted_p >= alpha or abs(r_value) < min_abs_r:
+            continue
+        findings.append({
+            "x": FIELDS[i],
+            "y": FIELDS[j],
+            "lag_days": int(lag),
+            "r": round(r_value, 3),
+            "p_value": p_value,
+            "adjusted_p_value": float(adjusted_p),
+            "n": samples,
+            "direction": "positive" if r_value > 0 else "negative",
+        })
+
+    findings.sort(key=lambda finding: abs(finding["r"]), reverse=True)
+    return findings[:top_k]
@@ -0,0 +1,222 @@
+import copy
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from models.journal_entry import CATEGORICAL_FIELDS, LIST_FIELDS, NUMERIC_FIELDS
+
+TEXT_FIELDS = ["dailyJournal"]
+_FLOAT_FIELDS = {"sleep.hours"}  # the other numeric fields are integers in JournalEntry
+_PATHS = {field: tuple(field.split(".")) for field in NUMERIC_FIELDS + CATEGORICAL_FIELDS + LIST_FIELDS + TEXT_FIELDS}
+_SECTIONS = {path[0] for path in _PATHS.values() if len(path) > 1}
+
+
+def _get(entry: Dict, path: Tuple[str, ...]):
+    value = entry
+    for part in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _set(entry: Dict, path: Tuple[str, ...], value):
+    for part in path[:-1]:
+        entry = entry.setdefault(part, {})
+    entry[path[-1]] = value
+
+
+def _leftovers(entry: Dict, stored: set) -> Optional[Dict]:
+    """Returns the parts of an entry that were not stored in a column, or None if there are none."""
+    rest = {}
+    for key, value in entry.items():
+        if key == "date" or key in stored:
+            continue
+        if key in _SECTIONS and isinstance(value, dict):
+            inner = {name: item for name, item in value.items() if f"{key}.{name}" not in stored}
+            if inner or not any(field.startswith(key + ".") for field in stored):
+                rest[key] = inner
+        else:
+            rest[key] = value
+    return rest or None
+
+
+def _pick(column, rows: Union[slice, List[int]]):
+    if isinstance(rows, slice):
+        return column[rows]
+    if isinstance(column, array):
+        return array(column.typecode, [column[index] for index in rows])
+    return [column[index] for index in rows]
+
+
+class EntryStore:
+    """
+    Columnar store of one user's journal entries, sorted by date.
+
+    Numeric fields live in array('d') columns with NaN for missing values, dates as day
+    ordinals in an array('q'), and categorical strings as 2-byte codes into a table of
+    strings shared by the store and its slices. List fields share one tuple per distinct
+    value. A store is built once per fetch, sliced by date with a binary search, and
+    turned back into dictionaries only where a caller needs them, such as a prompt.
+    Keys outside the JournalEntry schema and values of an unexpected type are kept per
+    entry, so converting back returns the same data.
+    """
+
+    def __init__(self):
+        self.ordinals = array("q")
+        self.numeric: Dict[str, array] = {field: array("d") for field in NUMERIC_FIELDS}
+        self.categorical: Dict[str, array] = {field: array("H") for field in CATEGORICAL_FIELDS}
+        self.categories: List[Optional[str]] = [None]  # code 0 means missing
+        self.lists: Dict[str, List[Optional[Tuple[str, ...]]]] = {field: [] for field in LIST_FIELDS}
+        self.text: Dict[str, List[Optional[str]]] = {field: [] for field in TEXT_FIELDS}
+        self.extras: List[Optional[Dict]] = []
+        self._category_codes: Dict[str, int] = {}
+        self._tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    @classmethod
+    def from_entries(cls, journal_entries: Iterable[Dict]) -> "EntryStore":
+        """
+        Builds a store from journal entry dictionaries.
+
+        Args:
+            journal_entries: The entries, in any order; an iterator is consumed one entry
+                at a time, so the dictionaries need not all be held at once. Entries
+                without a valid 'yyyy-mm-dd' date are skipped, and of two entries with the
+                same date the later one is kept.
+
+        Returns:
+            The store, sorted by date.
+        """
+        store = cls()
+        for entry in journal_entries:
+            store._append(entry)
+        ordinals = store.ordinals
+        if any(ordinals[index] >= ordinals[index + 1] for index in range(len(ordinals) - 1)):
+            rows = sorted(range(len(ordinals)), key=ordinals.__getitem__)
+            last_for_date = {ordinals[index]: index for index in rows}
+            store = store._subset([index for index in rows if last_for_date[ordinals[index]] == index])
+        return store
+
+    def _append(self, entry: Dict):
+        try:
+            ordinal = date.fromisoformat(entry["date"]).toordinal()
+        except (KeyError, TypeError, ValueError):
+            print(f"Warning: skipping journal entry without a valid date: {entry.get('date') if isinstance(entry, dict) else entry}")
+            return
+        self.ordinals.append(ordinal)
+        stored = set()
+        for field, column in self.numeric.items():
+            value = _get(entry, _PATHS[field])
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                column.append(value)
+                stored.add(field)
+            else:
+                column.append(math.nan)
+        for field, column in self.categorical.items():
+            value = _get(entry, _PATHS[field])
+            if isinstance(value, str):
+                column.append(self._code(value))
+                stored.add(field)
+            else:
+                column.append(0)
+        for field, column in self.lists.items():
+            value = _get(entry, _PATHS[field])
+            if isinstance(value, list) and all(isinstance(item, str) for item in value):
+                value = tuple(value)
+                column.append(self._tuples.setdefault(value, value))
+                stored.add(field)
+            else:
+                column.append(None)
+        for field, column in self.text.items():
+            value = _get(entry, _PATHS[field])
+            if isinstance(value, str):
+                column.append(value)
+                stored.add(field)
+            else:
+                column.append(None)
+        self.extras.append(_leftovers(entry, stored))
+
+    def _code(self, value: str) -> int:
+        code = self._category_codes.get(value)
+        if code is None:
+            if len(self.categories) > 0xFFFF:
+                raise ValueError("Too many distinct categorical values for a 2-byte code")
+            code = self._category_codes[value] = len(self.categories)
+            self.categories.append(value)
+        return code
+
+    def _subset(self, rows: Union[slice, List[int]]) -> "EntryStore":
+        """Returns a store holding the given rows, sharing this store's category table."""
+        subset = EntryStore()
+        subset.categories = self.categories
+        subset._category_codes = self._category_codes
+        subset._tuples = self._tuples
+        subset.ordinals = _pick(self.ordinals, rows)
+        subset.numeric = {field: _pick(column, rows) for field, column in self.numeric.items()}
+        subset.categorical = {field: _pick(column, rows) for field, column in self.categorical.items()}
+        subset.lists = {field: _pick(column, rows) for field, column in self.lists.items()}
+        subset.text = {field: _pick(column, rows) for field, column in self.text.items()}
+        subset.extras = _pick(self.extras, rows)
+        return subset
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def index_range(self, start_date: str, end_date: str) -> Tuple[int, int]:
+        """Returns the row range [lo, hi) dated between start_date and end_date (inclusive), by binary search."""
+        lo = bisect_left(self.ordinals, date.fromisoformat(start_date).toordinal())
+        hi = bisect_right(self.ordinals, date.fromisoformat(end_date).toordinal())
+        return lo, max(lo, hi)
+
+    def slice(self, start_date: str, end_date: str) -> "EntryStore":
+        """
+        Returns the entries dated between start_date and end_date (inclusive).
+
+        Args:
+            start_date: The start of the range, in 'yyyy-mm-dd' format.
+            end_date: The end of the range, in 'yyyy-mm-dd' format.
+
+        Returns:
+            A store holding the entries in the range.
+        """
+        lo, hi = self.index_range(start_date, end_date)
+        return self._subset(slice(lo, hi))
+
+    def dates(self) -> List[str]:
+        """Returns the entry dates in 'yyyy-mm-dd' format, oldest first."""
+        return [date.fromordinal(ordinal).isoformat() for ordinal in self.ordinals]
+
+    def to_dict(self, index: int) -> Dict:
+        """Rebuilds the journal entry dictionary stored at a row."""
+        entry = {"date": date.fromordinal(self.ordinals[index]).isoformat()}
+        for field, column in self.numeric.items():
+            value = column[index]
+            if not math.isnan(value):
+                _set(entry, _PATHS[field], value if field in _FLOAT_FIELDS or not value.is_integer() else int(value))
+        for field, column in self.categorical.items():
+            code = column[index]
+            if code:
+                _set(entry, _PATHS[field], self.categories[code])
+        for field, column in self.lists.items():
+            value = column[index]
+            if value is not None:
+                _set(entry, _PATHS[field], list(value))
+        for field, column in self.text.items():
+            value = column[index]
+            if value is not None:
+                _set(entry, _PATHS[field], value)
+        extras = self.extras[index]
+        if extras:
+            for key, value in copy.deepcopy(extras).items():
+                if isinstance(value, dict) and isinstance(entry.get(key), dict):
+                    entry[key].update(value)
+                else:
+                    entry[key] = value
+        return entry
+
+    def to_dicts(self, newest_first: bool = False) -> List[Dict]:
+        """Rebuilds every stored journal entry as a dictionary, oldest first unless `newest_first`."""
+        rows = range(len(self) - 1, -1, -1) if newest_first else range(len(self))
+        return [self.to_dict(index) for index in rows]
@@ -40,3 +40,21 @@ def get_entries_by_date_range(
             print(f"Warning: Invalid date format or missing date in entry: {entry}")
 
     return filtered_entries
+
+def is_valid_date(date_str: str) -> bool:
+    """
+    Checks whether a string is a calendar date in zero-padded 'yyyy-mm-dd' format.
+
+    Dates are stored and range-filtered as strings, so '2024-1-5' or '20240105' would
+    compare out of order with other dates and are rejected even though they parse.
+
+    Args:
+        date_str: The string to check.
+
+    Returns:
+        True if the string is exactly a 'yyyy-mm-dd' date, False otherwise.
+    """
+    try:
+        return date.fromisoformat(date_str).isoformat() == date_str
+    except (ValueError, TypeError):
+        return False
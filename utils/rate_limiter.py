@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional
+
+DEFAULT_RATE_PER_MINUTE = 30.0
+DEFAULT_BURST = 10
+DEFAULT_MAX_WAIT = 5.0  # seconds a request may queue for a token before it is refused
+DEFAULT_MAX_KEYS = 10000
+
+
+class Quota(NamedTuple):
+    """Requests refilled per minute, and how many can be saved up for a burst; a rate of 0 means no limit."""
+
+    rate_per_minute: float
+    burst: int
+
+
+class RateLimitExceeded(Exception):
+    """The request would have to wait longer than the limiter allows; `retry_after` is in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """
+    A token bucket per key (such as a user ID), shared by the requests of one process.
+
+    Each bucket holds up to `burst` tokens and refills at the key's rate. A request that
+    finds the bucket empty reserves the next token and waits for it, so a burst is
+    queued in arrival order and let through at the quota rather than all at once. A
+    request that would wait longer than `max_wait` seconds is refused with
+    RateLimitExceeded instead, without using a token. Quotas can be set per key in
+    `overrides`; beyond `max_keys` buckets, the least recently used is forgotten.
+    """
+
+    def __init__(self, quota: Quota = Quota(DEFAULT_RATE_PER_MINUTE, DEFAULT_BURST),
+                 overrides: Optional[Dict[str, Quota]] = None, max_wait: float = DEFAULT_MAX_WAIT,
+                 max_keys: int = DEFAULT_MAX_KEYS, clock: Callable[[], float] = time.monotonic):
+        self.quota = quota
+        self.overrides = dict(overrides or {})
+        self.max_wait = max_wait
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, refilled_at]
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def quota_for(self, key: str) -> Quota:
+        return self.overrides.get(key, self.quota)
+
+    def reserve(self, key: str, cost: float = 1.0) -> float:
+        """
+        Takes `cost` tokens from the key's bucket, going into debt if need be.
+
+        Returns:
+            The seconds the caller must wait before going ahead.
+
+        Raises:
+            RateLimitExceeded: If the wait would be longer than `max_wait`.
+        """
+        rate_per_minute, burst = self.quota_for(key)
+        if rate_per_minute <= 0:
+            return 0.0
+        rate = rate_per_minute / 60
+        with self._lock:
+            now = self._clock()
+            bucket = self._buckets.get(key)
+            tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+            wait = max(0.0, (cost - tokens) / rate)
+            if wait > self.max_wait:
+                self.rejected += 1
+                raise RateLimitExceeded(
+                    f"Rate limit of {rate_per_minute:g} requests per minute exceeded", retry_after=wait - self.max_wait
+                )
+            self._buckets[key] = [tokens - cost, now]
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            self.admitted += 1
+            if wait:
+                self.queued += 1
+        return wait
+
+    def refund(self, key: str, cost: float = 1.0):
+        """Returns tokens reserved by a request that did not go ahead."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.quota_for(key).burst, bucket[0] + cost)
+
+    async def acquire(self, key: str, cost: float = 1.0):
+        """Waits until the key may make a request; raises RateLimitExceeded if that would take too long."""
+        wait = self.reserve(key, cost)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.refund(key, cost)
+                raise
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the requests let through (including those that queued first), queued and refused."""
+        return {"admitted": self.admitted, "queued": self.queued, "rejected": self.rejected,
+                "tracked_keys": len(self._buckets)}
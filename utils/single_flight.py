@@ -0,0 +1,48 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Lets concurrent identical requests share one in-flight computation.
+
+    The first caller for a key starts the computation; callers arriving with the same
+    key while it runs wait for the same result, or the same exception. A caller that
+    is cancelled (for example because its client disconnected) stops waiting without
+    cancelling the computation for the others. Nothing is kept once it finishes, so a
+    later call computes afresh; caching results is left to the caches.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        """Returns the result of `compute()`, sharing a running call for the same key."""
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.joined += 1
+        return await asyncio.shield(task)
+
+    def running(self, key: Hashable) -> bool:
+        """Returns whether a computation for the key is in flight, which a call would join."""
+        return key in self._in_flight
+
+    def _finished(self, key: Hashable, task: asyncio.Future):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # mark the exception retrieved even if every caller stopped waiting
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the computations started, the callers that joined one, and those running now."""
+        return {"leaders": self.leaders, "joined": self.joined, "in_flight": len(self._in_flight)}
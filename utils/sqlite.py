@@ -0,0 +1,73 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence
+
+DEFAULT_BUSY_TIMEOUT = 30.0  # seconds a statement waits for another process's write lock
+
+
+class SQLiteDatabase:
+    """
+    A SQLite file shared by the threads of a process and by worker processes.
+
+    The connection runs in autocommit mode with write-ahead logging, so readers do not
+    block the writer, and waits up to `timeout` seconds for another process's write
+    lock. `schema` statements (CREATE ... IF NOT EXISTS and the like) are run on open.
+    Every statement holds the connection's lock, since the connection is shared by
+    threads; use `locked` or `transaction` to run several as one step.
+    """
+
+    def __init__(self, path: str, schema: Sequence[str] = (), name: str = "SQLite database",
+                 timeout: float = DEFAULT_BUSY_TIMEOUT):
+        """`name` describes the database in the error raised if it cannot be opened."""
+        self.path = path
+        self._lock = threading.RLock()
+        try:
+            self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in schema:
+                self._conn.execute(statement)
+        except sqlite3.Error as e:
+            raise Exception(f"{name} initialization failed: {e}")
+
+    def execute(self, statement: str, params: Sequence = ()) -> sqlite3.Cursor:
+        """Runs one statement and returns its cursor, for `rowcount` or `lastrowid`; query with fetchone or fetchall."""
+        with self._lock:
+            return self._conn.execute(statement, params)
+
+    def fetchone(self, statement: str, params: Sequence = ()) -> Optional[tuple]:
+        """Runs a query and returns its first row, or None."""
+        with self._lock:
+            return self._conn.execute(statement, params).fetchone()
+
+    def fetchall(self, statement: str, params: Sequence = ()) -> List[tuple]:
+        """Runs a query and returns all its rows."""
+        with self._lock:
+            return self._conn.execute(statement, params).fetchall()
+
+    @contextmanager
+    def locked(self) -> Iterator[sqlite3.Connection]:
+        """Holds the connection for the block, so its statements run without other threads' in between."""
+        with self._lock:
+            yield self._conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Runs the block's statements in a BEGIN IMMEDIATE transaction, which takes the
+        write lock up front so other processes cannot interleave; it is committed unless
+        the block raises.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def close(self):
+        """Closes the connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,149 @@
+import threading
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_SIGNATURE_BITS = 256
+DEFAULT_CANDIDATES = 512  # vectors re-ranked by exact cosine per approximate search, at least 4 * k
+_INITIAL_CAPACITY = 64
+
+
+class VectorIndex:
+    """
+    Vectors keyed by ID, searched by cosine similarity.
+
+    Vectors are normalized and kept in one matrix that grows by doubling, so adding one
+    costs O(dimensions) amortized and a search is a single matrix-vector product over
+    every row. Adding an ID that is already indexed replaces its vector. The dimensions
+    are taken from the first vectors added.
+
+    With `approximate=True`, each vector also gets a `signature_bits`-bit signature of
+    which side of random hyperplanes it falls on. A search then ranks every row by the
+    Hamming distance between signatures, 32 bytes a row by default instead of the whole
+    vector, and computes exact cosines only for the `candidates` closest; it can miss a
+    few of the true nearest neighbours in exchange. More bits or candidates miss fewer.
+    """
+
+    def __init__(self, approximate: bool = False, signature_bits: int = DEFAULT_SIGNATURE_BITS,
+                 candidates: int = DEFAULT_CANDIDATES, seed: int = 0):
+        if approximate and (signature_bits <= 0 or signature_bits % 64):
+            raise ValueError("signature_bits must be a positive multiple of 64")
+        self.approximate = approximate
+        self.signature_bits = signature_bits
+        self.candidates = candidates
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._signatures: Optional[np.ndarray] = None
+        self._planes: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._rows
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray):
+        """Adds or replaces the vectors for `ids`, one row of `vectors` per ID."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} IDs for {len(vectors)} vectors")
+        if not ids:
+            return
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1)
+        with self._lock:
+            if self._vectors is None:
+                self._allocate(vectors.shape[1])
+            elif vectors.shape[1] != self._vectors.shape[1]:
+                raise ValueError(f"Expected {self._vectors.shape[1]}-dimensional vectors, got {vectors.shape[1]}")
+            signatures = self._signature(vectors) if self.approximate else None
+            for position, item_id in enumerate(ids):
+                row = self._rows.get(item_id)
+                if row is None:
+                    row = len(self._ids)
+                    if row == len(self._vectors):
+                        self._grow()
+                    self._ids.append(item_id)
+                    self._rows[item_id] = row
+                self._vectors[row] = vectors[position]
+                if signatures is not None:
+                    self._signatures[row] = signatures[position]
+
+    def remove(self, item_id: str) -> bool:
+        """Removes the ID's vector, moving the last row into its place; returns whether it was indexed."""
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return False
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+                self._vectors[row] = self._vectors[last]
+                if self._signatures is not None:
+                    self._signatures[row] = self._signatures[last]
+            self._ids.pop()
+            return True
+
+    def search(self, query: np.ndarray, k: int, exclude: Collection[str] = (),
+               min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Finds the indexed vectors most similar to `query`.
+
+        Args:
+            query: The query vector; it need not be normalized.
+            k: The most results returned.
+            exclude: IDs to leave out of the results.
+            min_score: Only vectors with a cosine similarity above this are returned.
+
+        Returns:
+            (ID, cosine similarity) pairs, most similar first.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if k <= 0 or norm == 0:
+            return []
+        query = query / norm
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return []
+            rows = None
+            if self.approximate and count > self.candidates:
+                differing = np.bitwise_count(self._signatures[:count] ^ self._signature(query[None, :]))
+                distances = differing.sum(axis=1, dtype=np.int64)
+                wanted = max(self.candidates, 4 * (k + len(exclude)))
+                if wanted < count:
+                    rows = np.argpartition(distances, wanted)[:wanted]
+            if rows is None:
+                rows = np.arange(count)
+            scores = self._vectors[rows] @ query
+            excluded = [self._rows[item_id] for item_id in exclude if item_id in self._rows]
+            if excluded:
+                scores[np.isin(rows, excluded)] = -np.inf
+            top = min(k, len(scores))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            return [(self._ids[rows[position]], float(scores[position]))
+                    for position in best if scores[position] > min_score]
+
+    def _allocate(self, dimensions: int):
+        self._vectors = np.zeros((_INITIAL_CAPACITY, dimensions), dtype=np.float32)
+        if self.approximate:
+            rng = np.random.default_rng(self._seed)
+            self._planes = rng.standard_normal((self.signature_bits, dimensions)).astype(np.float32)
+            self._signatures = np.zeros((_INITIAL_CAPACITY, self.signature_bits // 64), dtype=np.uint64)
+
+    def _grow(self):
+        self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+        if self._signatures is not None:
+            self._signatures = np.concatenate([self._signatures, np.zeros_like(self._signatures)])
+
+    def _signature(self, vectors: np.ndarray) -> np.ndarray:
+        """Packs which side of each hyperplane the vectors fall on into 64-bit words, one row per vector."""
+        bits = np.packbits(vectors @ self._planes.T > 0, axis=1)
+        return np.ascontiguousarray(bits).view(np.uint64)